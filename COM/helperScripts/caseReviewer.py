@@ -0,0 +1,282 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Review the cases of a manifest one after another in one window
+#
+# Notes:
+#   - The manifest is a CSV file with the column image and either
+#       segmentation, drawn as in visualizeSegmentation.py, or moving, drawn
+#       as a checkerboard as in checkerBoardViewer.py. A name column is
+#       optional.
+#   - Cases are read on a background thread, the shown case first, then the
+#       next and previous ones, so moving on is usually immediate. Only the
+#       cases within --keep of the shown case are kept, so memory holds at
+#       most 2 * --keep + 1 cases however long the manifest is.
+#   - NIfTI files are read through niftiIO without holding the GIL (see
+#       imageReader.py), so reading ahead does not stall the window.
+#   - The camera and the window/level are kept when moving between cases.
+#       The camera is reset if its focal point is outside the next image.
+#   - Moving images are resampled onto the grid of the image if the grids
+#       differ (see checkerboardOverlay.resampleTo).
+#   - Key Bindings:
+#       Right/Left          Next/previous case
+#       Home/End            First/last case
+#       1/2                 Set the image/second image as the active layer for window/level
+#       w                   Print the window/level of both layers
+#       r                   Reset the camera
+#
+# Usage:
+#   python caseReviewer.py cases.csv
+#   python caseReviewer.py registrations.csv --keep 2
+
+# Libraries
+import argparse
+import csv
+import os
+import threading
+import vtk
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc'))
+import imageReader
+import segmentationOverlay
+import checkerboardOverlay
+
+# Setup and parse command line arguments
+parser = argparse.ArgumentParser(
+    description='Review the segmentations or registrations of a manifest in one window',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+parser.add_argument(
+    'manifest',
+    help='CSV file with the columns image and segmentation or moving, and optionally name'
+    )
+parser.add_argument('--window',
+                    default=[0, 0], type=float, nargs=2,
+                    help='The initial window of the image and the moving image. Computed from the dynamic range if zero or less')
+parser.add_argument('--level',
+                    default=[0, 0], type=float, nargs=2,
+                    help='The initial level of the image and the moving image')
+parser.add_argument('-o', '--opacity',
+                    default=float(0.25), type=float,
+                    help='The opacity of the segmentation between zero and one')
+parser.add_argument('-d', '--divisions',
+                    default=[10, 10], type=int, nargs=2,
+                    help='The spacing between checkerboard divisions in spacing units')
+parser.add_argument('-k', '--keep',
+                    default=int(1), type=int,
+                    help='Number of cases kept loaded on either side of the shown case')
+parser.add_argument('-s', '--start',
+                    default=int(1), type=int,
+                    help='Case to start at, counting from one')
+parser.add_argument('-n', '--nThreads',
+                    default=int(1), type=int,
+                    help='Number of threads for each image slice visualizer')
+args = parser.parse_args()
+
+# Check the manifest
+if not os.path.isfile(args.manifest):
+    os.sys.exit('Manifest \"{}\" does not exist. Exiting...'.format(args.manifest))
+with open(args.manifest) as f:
+    cases = list(csv.DictReader(f))
+if len(cases) == 0:
+    os.sys.exit('Manifest \"{}\" has no cases. Exiting...'.format(args.manifest))
+if 'segmentation' in cases[0]:
+    secondKey = 'segmentation'
+elif 'moving' in cases[0]:
+    secondKey = 'moving'
+else:
+    os.sys.exit('Manifest \"{}\" needs a segmentation or moving column. Exiting...'.format(args.manifest))
+for case in cases:
+    for key in ['image', secondKey]:
+        if not case.get(key):
+            os.sys.exit('Case {c} of \"{m}\" has no {k}. Exiting...'.format(c=case, m=args.manifest, k=key))
+        if not os.path.exists(case[key]):
+            os.sys.exit('Input \"{}\" does not exist. Exiting...'.format(case[key]))
+    if not case.get('name'):
+        case['name'] = os.path.basename(case[secondKey]).split('.')[0]
+
+# Check arguments
+if args.opacity > 1 or args.opacity < 0:
+    os.sys.exit('Opacity must be between zero and one. Given {o}. Exiting...'.format(o=args.opacity))
+if args.keep < 0:
+    os.sys.exit('Cannot keep a negative number of cases. Given {n}. Exiting...'.format(n=args.keep))
+if args.start < 1 or args.start > len(cases):
+    os.sys.exit('Start must be between 1 and {n}. Given {s}. Exiting...'.format(n=len(cases), s=args.start))
+if args.nThreads < 1:
+    os.sys.exit('Number of threads must be one or greater. Given {n}. Exiting...'.format(n=args.nThreads))
+
+# Cases are kept here, not in the reader cache
+imageReader.setCacheSize(0)
+
+# Functions
+def loadCase(case):
+    '''Read one case, returning a dict of its images'''
+    image = imageReader.readImage(case['image'])
+    second = imageReader.readImage(case[secondKey])
+    data = {'image': image}
+    if secondKey == 'segmentation':
+        data['second'] = second
+        source = vtk.vtkTrivialProducer()
+        source.SetOutput(second)
+        data['labels'] = segmentationOverlay.presentLabels(source)
+    else:
+        data['second'] = checkerboardOverlay.resampleTo(second, image)
+    return data
+
+def keptCases(index):
+    '''Cases kept around index, in the order they are read'''
+    kept = [index]
+    for offset in range(1, args.keep + 1):
+        kept += [i for i in (index + offset, index - offset) if 0 <= i < len(cases)]
+    return kept
+
+# Read cases in the background
+loaded = {}
+condition = threading.Condition()
+state = {'current': args.start - 1}
+
+def loader():
+    while True:
+        with condition:
+            while True:
+                todo = [i for i in keptCases(state['current']) if i not in loaded]
+                if len(todo) > 0:
+                    break
+                condition.wait()
+            index = todo[0]
+        try:
+            data = loadCase(cases[index])
+        except Exception as e:
+            # Keep reading the other cases whatever went wrong with this one
+            data = {'error': '{t}: {e}'.format(t=type(e).__name__, e=e)}
+            print('Unable to load {n}: {e}'.format(n=cases[index]['name'], e=data['error']))
+        with condition:
+            if index in keptCases(state['current']):
+                loaded[index] = data
+
+loaderThread = threading.Thread(target=loader)
+loaderThread.daemon = True
+loaderThread.start()
+
+# Create Renderer -> RenderWindow -> RenderWindowInteractor -> InteractorStyle
+renderer = vtk.vtkRenderer()
+
+caseText = vtk.vtkTextActor()
+caseText.GetTextProperty().SetFontSize(16)
+caseText.SetPosition(10, 10)
+renderer.AddViewProp(caseText)
+
+renderWindow = vtk.vtkRenderWindow()
+renderWindow.AddRenderer(renderer)
+
+interactor = vtk.vtkRenderWindowInteractor()
+interactorStyle = vtk.vtkInteractorStyleImage()
+interactorStyle.SetInteractionModeToImageSlicing()
+interactorStyle.KeyPressActivationOn()
+
+interactor.SetInteractorStyle(interactorStyle)
+interactor.SetRenderWindow(renderWindow)
+
+# The shown case
+shown = {'index': None, 'stack': None, 'properties': None}
+window = list(args.window)
+level = list(args.level)
+
+def showCase(index):
+    '''Show a case if it is loaded, otherwise say it is loading'''
+    with condition:
+        state['current'] = index
+        # Drop the cases too far away and read the ones now close
+        for i in list(loaded):
+            if i not in keptCases(index):
+                del loaded[i]
+        data = loaded.get(index)
+        condition.notify()
+
+    # Keep the window/level set on the last case
+    if shown['properties'] is not None:
+        for i, imageProperty in enumerate(shown['properties']):
+            window[i] = imageProperty.GetColorWindow()
+            level[i] = imageProperty.GetColorLevel()
+    if shown['stack'] is not None:
+        renderer.RemoveViewProp(shown['stack'])
+        shown['stack'] = None
+        shown['properties'] = None
+
+    title = '{name} ({i}/{n})'.format(name=cases[index]['name'], i=index + 1, n=len(cases))
+    shown['index'] = None
+    if data is None:
+        caseText.SetInput('{t}\nLoading...'.format(t=title))
+        interactor.Render()
+        return
+    shown['index'] = index
+    if 'error' in data:
+        caseText.SetInput('{t}\n{e}'.format(t=title, e=data['error']))
+        interactor.Render()
+        return
+
+    sources = []
+    for image in [data['image'], data['second']]:
+        source = vtk.vtkTrivialProducer()
+        source.SetOutput(image)
+        sources.append(source)
+    for i, image in enumerate([data['image'], data['second']]):
+        if window[i] <= 0:
+            window[i], level[i] = checkerboardOverlay.windowLevel(image.GetScalarRange(), window[i], level[i])
+    if secondKey == 'segmentation':
+        stack, imageProperty, segImageProperty = segmentationOverlay.overlayStack(sources[0].GetOutputPort(),
+            sources[1].GetOutputPort(), window[0], level[0], data['labels'], args.opacity, args.nThreads)
+        shown['properties'] = [imageProperty]
+    else:
+        stack, image1Property, image2Property = checkerboardOverlay.checkerboardStack(sources[0].GetOutputPort(),
+            sources[1].GetOutputPort(), window, level, args.divisions, args.nThreads)
+        shown['properties'] = [image1Property, image2Property]
+    shown['stack'] = stack
+    renderer.AddViewProp(stack)
+
+    # Keep the camera unless it is off the image
+    bounds = data['image'].GetBounds()
+    focalPoint = renderer.GetActiveCamera().GetFocalPoint()
+    if shown.get('cameraSet') is None or \
+            any([focalPoint[i] < bounds[2*i] or focalPoint[i] > bounds[2*i+1] for i in range(3)]):
+        renderer.ResetCamera(bounds)
+        shown['cameraSet'] = True
+    caseText.SetInput(title)
+    interactor.Render()
+
+# Move between cases
+def keyPress(obj, event):
+    keySym = str(interactor.GetKeySym())
+    index = state['current']
+    if keySym == 'Right':
+        showCase(min(index + 1, len(cases) - 1))
+    elif keySym == 'Left':
+        showCase(max(index - 1, 0))
+    elif keySym == 'Home':
+        showCase(0)
+    elif keySym == 'End':
+        showCase(len(cases) - 1)
+    elif str(interactor.GetKeyCode()) in ['1', '2'] and shown['stack'] is not None:
+        # Set the image or second image as the active layer (allows W/L)
+        shown['stack'].SetActiveLayer(int(interactor.GetKeyCode()))
+    elif str(interactor.GetKeyCode()) == 'w' and shown['properties'] is not None:
+        for i, imageProperty in enumerate(shown['properties']):
+            print("Image {i} W/L: {w}/{l}".format(i=i+1, w=imageProperty.GetColorWindow(), l=imageProperty.GetColorLevel()))
+
+interactor.AddObserver('KeyPressEvent', keyPress, -1.0) # Call keyPress as last observer
+
+# Show the case once it has been read
+def waitForCase(obj, event):
+    if shown['index'] != state['current']:
+        with condition:
+            ready = state['current'] in loaded
+        if ready:
+            showCase(state['current'])
+
+interactor.AddObserver('TimerEvent', waitForCase)
+
+# Initialize and go
+interactor.Initialize()
+showCase(state['current'])
+interactor.CreateRepeatingTimer(100)
+interactor.Start()
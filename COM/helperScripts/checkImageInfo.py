@@ -1,5 +1,6 @@
 # History:
 #   2017.04.03  babesler    Created
+#   2026.10.19  agent       Read through imageReader.py
 #
 # Description:
 #   Print information about an image
@@ -13,18 +14,7 @@
 # Libraries
 import argparse
 import os
-import vtk
-try:
-    import vtkbone
-    vtkboneImported = True
-    vtkbonelabImported = False
-except ImportError:
-    vtkboneImported = False
-    try:
-        import vtkbonelab
-        vtkbonelabImported = True
-    except ImportError:
-        vtkbonelabImported = False
+import imageReader
 
 # Setup and parse command line arguments
 parser = argparse.ArgumentParser(
@@ -41,23 +31,11 @@ if not os.path.exists(args.inputImage):
     os.sys.exit('Input \"{inputImage}\" does not exist. Exiting...'.format(inputImage=args.inputImage))
 
 # Read the input
-reader = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage)
-if reader is None:
-    if args.inputImage.lower().endswith('.nii'):
-        reader = vtk.vtkNIFTIImageReader()
-    elif args.inputImage.lower().endswith('.dcm'):
-        reader = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputImage.lower().endswith('.aim'):
-        reader = vtkbone.vtkboneAIMReader()
-        reader.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputImage.lower().endswith('.aim'):
-        reader = vtkbonelab.vtkbonelabAIMReader()
-        reader.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage))
-reader.SetFileName(args.inputImage)
 print('Loading {}...'.format(args.inputImage))
-reader.Update()
+try:
+    image = imageReader.readImage(args.inputImage)
+except ValueError as e:
+    os.sys.exit('{e}. Exiting...'.format(e=e))
 
 # Print information
 imageMap = {}
@@ -72,5 +50,5 @@ imageMap['Scalar Range'] = 'GetScalarRange'
 for key, value in imageMap.iteritems():
     print 'Image - {key}: {value}'.format(
             key=key,
-            value=eval('reader.GetOutput().{}()'.format(value))
+            value=eval('image.{}()'.format(value))
             )
@@ -1,6 +1,10 @@
 # History:
 #   2017.03.21  babesler    Created
 #   2017.04.25  babesler    Fixed small bug in reader2
+#   2026.10.19  agent       Open on proxies and stream full resolution slabs
+#   2026.10.19  agent       Read through imageReader.py
+#   2026.10.19  agent       Load both inputs at once
+#   2026.10.19  agent       Share the checkerboard setup through checkerboardOverlay.py
 #
 # Description:
 #   Visualize two volumes overlayed with a checherboard layout
@@ -21,6 +25,10 @@
 #       Shift + Left Click  Pan camera
 #       n                   User nearest neighbour interpolation (allows one to see pixels individually)
 #       c                   User cubic interpolation (looks visually good)
+#   - Images over --proxyVoxels are first shown from low resolution proxies
+#       stored next to them (see proxyPyramid.py). Full resolution slabs of
+#       --slabSize slices around the viewed slice are loaded in the
+#       background.
 #
 # Usage:
 #   python checkerBoardViewer.py input1.nii input2.nii
@@ -30,17 +38,10 @@ import os
 import math
 import vtk
 import argparse
-try:
-    import vtkbone
-    vtkboneImported = True
-    vtkbonelabImported = False
-except ImportError:
-    vtkboneImported = False
-    try:
-        import vtkbonelab
-        vtkbonelabImported = True
-    except ImportError:
-        vtkbonelabImported = False
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc'))
+import proxyPyramid
+import imageReader
+import checkerboardOverlay
 
 # Parse arguments
 parser = argparse.ArgumentParser(
@@ -75,6 +76,12 @@ parser.add_argument('-d', '--divisions',
 parser.add_argument('-n', '--nThreads',
                     default=int(1), type=int,
                     help='Number of threads for each image slice visualizer (default: %(default)s)')
+parser.add_argument('--proxyVoxels',
+                    default=proxyPyramid.defaultProxyVoxels, type=int,
+                    help='Largest image shown before it is fully read. Larger images open on a proxy. Zero or less always reads the full images first')
+parser.add_argument('--slabSize',
+                    default=int(64), type=int,
+                    help='Number of full resolution slices loaded around the viewed slice')
 args = parser.parse_args()
 
 # Check input arguments
@@ -87,108 +94,35 @@ for fileName in [args.inputImage1, args.inputImage2]:
 if args.nThreads < 1:
     os.sys.exit('Number of threads must be one or greater. Given {n}. Exiting...'.format(n=args.nThreads))
 
-# Read in inputs
-reader1 = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage1)
-if reader1 is None:
-    if args.inputImage1.lower().endswith('.nii'):
-        reader1 = vtk.vtkNIFTIImageReader()
-    elif args.inputImage1.lower().endswith('.dcm'):
-        reader1 = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputImage1.lower().endswith('.aim'):
-        reader1 = vtkbone.vtkboneAIMReader()
-        reader1.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputImage1.lower().endswith('.aim'):
-        reader1 = vtkbonelab.vtkbonelabAIMReader()
-        reader1.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage1))
-reader1.SetFileName(args.inputImage1)
-print('Loading {}...'.format(args.inputImage1))
-reader1.Update()
-
-reader2 = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage2)
-if reader2 is None:
-    if args.inputImage2.lower().endswith('.nii'):
-        reader2 = vtk.vtkNIFTIImageReader()
-    elif args.inputImage2.lower().endswith('.dcm'):
-        reader2 = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputImage2.lower().endswith('.aim'):
-        reader2 = vtkbone.vtkboneAIMReader()
-        reader2.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputImage2.lower().endswith('.aim'):
-        reader2 = vtkbonelab.vtkbonelabAIMReader()
-        reader2.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage2))
-reader2.SetFileName(args.inputImage2)
-print('Loading {}...'.format(args.inputImage2))
-reader2.Update()
-
-# Get scalar range for W/L and padding
-scalarRanges = [reader1.GetOutput().GetScalarRange(), reader2.GetOutput().GetScalarRange()]
+# Check slab size
+if args.slabSize < 1:
+    os.sys.exit('Slab size must be one or greater. Given {n}. Exiting...'.format(n=args.slabSize))
+
+# Read in both inputs at once
+try:
+    readers = imageReader.openImages([args.inputImage1, args.inputImage2], nThreads=args.nThreads,
+        proxyVoxels=args.proxyVoxels, slabSize=args.slabSize)
+except ValueError as e:
+    os.sys.exit('{e}. Exiting...'.format(e=e))
+reader1, reader2 = readers
+streamedImages = [reader for reader in readers if isinstance(reader, proxyPyramid.StreamedImage)]
+
+# Get scalar range for W/L and padding. A proxy knows the range of the full image.
+scalarRanges = [reader1.scalarRange, reader2.scalarRange]
 
 # Determine window/level if needed
 print("Window/Level:")
 window = args.window
 level = args.level
 for i in range(len(args.window)):
-    # Check if we should calculate (cannot have window less than or equal to zero)
-    if args.window[i] <= 0:
-        window[i] = scalarRanges[i][1] - scalarRanges[i][0]
-        level[i] = (scalarRanges[i][1] + scalarRanges[i][0])/2
+    window[i], level[i] = checkerboardOverlay.windowLevel(scalarRanges[i], args.window[i], args.level[i])
 
     # Print resulting window/level
     print("\tImage {i}: {w}/{l}".format(i=i+1, w=window[i], l=level[i]))
 
-# Setup input1 Mapper + Property -> Slice
-input1Mapper = vtk.vtkImageResliceMapper()
-input1Mapper.SetInputConnection(reader1.GetOutputPort())
-input1Mapper.SliceAtFocalPointOn()
-input1Mapper.SliceFacesCameraOn()
-input1Mapper.BorderOn()
-input1Mapper.SetNumberOfThreads(args.nThreads)
-input1Mapper.ResampleToScreenPixelsOn()
-input1Mapper.StreamingOn()
-
-image1Property = vtk.vtkImageProperty()
-image1Property.SetColorLevel(level[0])
-image1Property.SetColorWindow(window[0])
-image1Property.SetInterpolationTypeToNearest()
-image1Property.SetCheckerboardSpacing(args.divisions)
-image1Property.SetLayerNumber(1)
-image1Property.CheckerboardOn()
-
-input1Slice = vtk.vtkImageSlice()
-input1Slice.SetMapper(input1Mapper)
-input1Slice.SetProperty(image1Property)
-
-# Setup input2 Mapper + Property -> Slice
-input2Mapper = vtk.vtkImageResliceMapper()
-input2Mapper.SetInputConnection(reader2.GetOutputPort())
-input2Mapper.SliceAtFocalPointOn()
-input2Mapper.SliceFacesCameraOn()
-input2Mapper.BorderOn()
-input2Mapper.SetNumberOfThreads(args.nThreads)
-input2Mapper.ResampleToScreenPixelsOn()
-input2Mapper.StreamingOn()
-
-image2Property = vtk.vtkImageProperty()
-image2Property.SetColorLevel(level[1])
-image2Property.SetColorWindow(window[1])
-image2Property.SetInterpolationTypeToNearest()
-image2Property.SetCheckerboardSpacing(args.divisions)
-image2Property.SetCheckerboardOffset(0,1) # offset from image1 checkerboard
-image2Property.CheckerboardOn()
-image2Property.SetLayerNumber(2)
-
-input2Slice = vtk.vtkImageSlice()
-input2Slice.SetMapper(input2Mapper)
-input2Slice.SetProperty(image2Property)
-
-imageStack = vtk.vtkImageStack()
-imageStack.AddImage(input1Slice)
-imageStack.AddImage(input2Slice)
-imageStack.SetActiveLayer(1)
+# Setup both images in a checkerboard vtkImageStack
+imageStack, image1Property, image2Property = checkerboardOverlay.checkerboardStack(
+    reader1.GetOutputPort(), reader2.GetOutputPort(), window, level, args.divisions, args.nThreads)
 
 # Create Renderer -> RenderWindow -> RenderWindowInteractor -> InteractorStyle
 renderer = vtk.vtkRenderer()
@@ -232,6 +166,16 @@ def layerSwitcher(obj,event):
 # Add ability to switch between active layers
 interactor.AddObserver('KeyPressEvent', layerSwitcher, -1.0) # Call layerSwitcher as last observer
 
+# Swap in full resolution slabs as they are loaded
+def streamSlabs(obj, event):
+    if any([image.update(renderer.GetActiveCamera()) for image in streamedImages]):
+        interactor.Render()
+
+if len(streamedImages) > 0:
+    interactor.AddObserver('TimerEvent', streamSlabs)
+
 # Initialize and go
 interactor.Initialize()
+if len(streamedImages) > 0:
+    interactor.CreateRepeatingTimer(100)
 interactor.Start()
@@ -0,0 +1,212 @@
+# History:
+#   2026.10.19  agent       Created from checkerBoardViewer.py
+#
+# Description:
+#   Shared setup of two images drawn as a checkerboard, and batch montages
+#
+# Notes:
+#   - checkerboardStack shows squares of --divisions spacing units of the
+#       first image on layer 1 and fills the others from the second image on
+#       layer 2, through the checkerboard spacing and offset of each
+#       vtkImageProperty, as checkerBoardViewer.py always has.
+#   - montage renders the checkerboard at several positions through each of
+#       the axial, coronal and sagittal planes of the fixed image in one
+#       offscreen window and writes it as one PNG. Rows are orientations and
+#       columns are positions, given as fractions of the fixed image extent.
+#   - The moving image is resampled onto the fixed image grid if the grids
+#       differ, padded with the minimum of its range. Like the viewers this
+#       works in VTK coordinates, which ignore the NIfTI qform/sform, so
+#       results still on a cropped grid (see QCT_RegisterROI.py) should be
+#       resampled onto the fixed image with transformix first.
+#   - With score, each tile is labelled with the normalized cross correlation
+#       of the two images over that slice, where the moving image is defined.
+#       Low values point at bad registrations.
+#
+# Usage:
+#   import checkerboardOverlay
+#   imageStack, image1Property, image2Property = checkerboardOverlay.checkerboardStack(
+#       reader1.GetOutputPort(), reader2.GetOutputPort(), [400, 400], [200, 200], [10, 10])
+#   scores = checkerboardOverlay.montage('target.nii', 'result.0.nii', 'result.png', score=True)
+
+import numpy
+import vtk
+from vtk.util import numpy_support
+import imageReader
+from segmentationOverlay import imageSlice
+
+# Slice normal (camera looks along minus the normal) and view up of each montage row
+montageViews = [
+    ('Axial', 2, (0, 0, 1), (0, 1, 0)),
+    ('Coronal', 1, (0, -1, 0), (0, 0, 1)),
+    ('Sagittal', 0, (1, 0, 0), (0, 0, 1))]
+
+def windowLevel(scalarRange, window, level):
+    '''The window and level, computed from the dynamic range if window is zero or less'''
+    # Check if we should calculate (cannot have window less than or equal to zero)
+    if window <= 0:
+        window = scalarRange[1] - scalarRange[0]
+        level = (scalarRange[1] + scalarRange[0])/2
+    return window, level
+
+def checkerboardStack(input1Port, input2Port, window, level, divisions, nThreads=1):
+    '''Return (imageStack, image1Property, image2Property) of the two images as a checkerboard.
+
+    window and level are given for each image.'''
+    image1Property = vtk.vtkImageProperty()
+    image1Property.SetColorLevel(level[0])
+    image1Property.SetColorWindow(window[0])
+    image1Property.SetInterpolationTypeToNearest()
+    image1Property.SetCheckerboardSpacing(divisions)
+    image1Property.SetLayerNumber(1)
+    image1Property.CheckerboardOn()
+
+    image2Property = vtk.vtkImageProperty()
+    image2Property.SetColorLevel(level[1])
+    image2Property.SetColorWindow(window[1])
+    image2Property.SetInterpolationTypeToNearest()
+    image2Property.SetCheckerboardSpacing(divisions)
+    image2Property.SetCheckerboardOffset(0,1) # offset from image1 checkerboard
+    image2Property.CheckerboardOn()
+    image2Property.SetLayerNumber(2)
+
+    imageStack = vtk.vtkImageStack()
+    imageStack.AddImage(imageSlice(input1Port, image1Property, nThreads))
+    imageStack.AddImage(imageSlice(input2Port, image2Property, nThreads))
+    imageStack.SetActiveLayer(1)
+    return imageStack, image1Property, image2Property
+
+def resampleTo(image, reference):
+    '''Linearly resample image onto the grid of reference'''
+    if image.GetDimensions() == reference.GetDimensions() and \
+            numpy.allclose(image.GetSpacing(), reference.GetSpacing()) and \
+            numpy.allclose(image.GetOrigin(), reference.GetOrigin()) and \
+            image.GetExtent() == reference.GetExtent():
+        return image
+    reslice = vtk.vtkImageReslice()
+    reslice.SetInputData(image)
+    reslice.SetInformationInput(reference)
+    reslice.SetInterpolationModeToLinear()
+    reslice.SetBackgroundLevel(image.GetScalarRange()[0])
+    reslice.Update()
+    return reslice.GetOutput()
+
+def toArray(image):
+    '''The scalars of image as a [z,y,x] array'''
+    return numpy_support.vtk_to_numpy(image.GetPointData().GetScalars()).reshape(image.GetDimensions()[::-1])
+
+def normalizedCrossCorrelation(a, b):
+    '''Normalized cross correlation of two arrays, or 0 if either is constant'''
+    a = a.astype(numpy.float64).ravel()
+    b = b.astype(numpy.float64).ravel()
+    a -= a.mean()
+    b -= b.mean()
+    norm = numpy.sqrt((a * a).sum() * (b * b).sum())
+    if norm == 0:
+        return 0.0
+    return float((a * b).sum() / norm)
+
+def sliceIndex(image, axis, position):
+    '''Index along axis of the slice at fraction position through the extent'''
+    extent = image.GetExtent()
+    return int(round(extent[2*axis] + position * (extent[2*axis+1] - extent[2*axis]))) - extent[2*axis]
+
+def movingRegion(fixed, moving):
+    '''[z,y,x] slices of the fixed grid that lie inside the moving image'''
+    fixedOrigin = [fixed.GetOrigin()[i] + fixed.GetExtent()[2*i] * fixed.GetSpacing()[i] for i in range(3)]
+    bounds = moving.GetBounds()
+    region = []
+    for i in range(3):
+        lower = int(numpy.ceil((bounds[2*i] - fixedOrigin[i]) / fixed.GetSpacing()[i] - 1e-6))
+        upper = int(numpy.floor((bounds[2*i+1] - fixedOrigin[i]) / fixed.GetSpacing()[i] + 1e-6)) + 1
+        region.append(slice(max(lower, 0), max(min(upper, fixed.GetDimensions()[i]), 0)))
+    return region[::-1]
+
+def sliceScore(fixedArray, movingArray, region, axis, index):
+    '''Normalized cross correlation over one slice inside region, or None if it misses the moving image'''
+    region = list(region)
+    axis = 2 - axis
+    if index < region[axis].start or index >= region[axis].stop:
+        return None
+    region[axis] = index
+    a = fixedArray[tuple(region)]
+    if a.size == 0:
+        return None
+    return normalizedCrossCorrelation(a, movingArray[tuple(region)])
+
+def montage(fixedImage, movingImage, outputImage, window=(0, 0), level=(0, 0), divisions=(10, 10),
+            positions=(0.3, 0.5, 0.7), tileSize=300, score=False, title=None):
+    '''Write a PNG of checkerboards of movingImage over fixedImage at positions through each plane.
+
+    Returns the score of every tile, row by row, or None without score.
+    Raises ValueError if an image cannot be read.'''
+    fixed = imageReader.readImage(fixedImage)
+    original = imageReader.readImage(movingImage)
+    moving = resampleTo(original, fixed)
+    window, level = zip(*[windowLevel(image.GetScalarRange(), window[i], level[i])
+        for i, image in enumerate([fixed, moving])])
+
+    fixedSource = vtk.vtkTrivialProducer()
+    fixedSource.SetOutput(fixed)
+    movingSource = vtk.vtkTrivialProducer()
+    movingSource.SetOutput(moving)
+
+    scores = None
+    if score:
+        scores = []
+        fixedArray, movingArray = toArray(fixed), toArray(moving)
+        region = movingRegion(fixed, original)
+
+    renderWindow = vtk.vtkRenderWindow()
+    renderWindow.SetOffScreenRendering(1)
+    renderWindow.SetSize(tileSize * len(positions), tileSize * len(montageViews))
+
+    bounds = fixed.GetBounds()
+    center = [(bounds[2*i] + bounds[2*i+1]) / 2.0 for i in range(3)]
+    for row, (name, axis, normal, viewUp) in enumerate(montageViews):
+        for column, position in enumerate(positions):
+            imageStack = checkerboardStack(fixedSource.GetOutputPort(), movingSource.GetOutputPort(),
+                window, level, divisions)[0]
+            renderer = vtk.vtkRenderer()
+            # Rows go top to bottom, viewports bottom to top
+            renderer.SetViewport(float(column) / len(positions), 1 - float(row + 1) / len(montageViews),
+                float(column + 1) / len(positions), 1 - float(row) / len(montageViews))
+            renderer.AddViewProp(imageStack)
+
+            # Fit the whole slice in the tile
+            index = sliceIndex(fixed, axis, position)
+            focalPoint = list(center)
+            focalPoint[axis] = fixed.GetOrigin()[axis] + (fixed.GetExtent()[2*axis] + index) * fixed.GetSpacing()[axis]
+            inPlane = [abs(bounds[2*i+1] - bounds[2*i]) for i in range(3) if i != axis]
+            camera = renderer.GetActiveCamera()
+            camera.ParallelProjectionOn()
+            camera.SetParallelScale(1.05 * max(inPlane) / 2.0)
+            camera.SetFocalPoint(focalPoint)
+            camera.SetPosition([focalPoint[i] + normal[i] * max(inPlane) for i in range(3)])
+            camera.SetViewUp(viewUp)
+            renderer.ResetCameraClippingRange()
+
+            label = '{n} {p:.0f}%'.format(n=name, p=100 * position)
+            if row == 0 and column == 0 and title is not None:
+                label = '{t}\n{l}'.format(t=title, l=label)
+            if score:
+                scores.append(sliceScore(fixedArray, movingArray, region, axis, index))
+                label += '\nNCC {}'.format('-' if scores[-1] is None else '{:.3f}'.format(scores[-1]))
+            text = vtk.vtkTextActor()
+            text.SetInput(label)
+            text.GetTextProperty().SetFontSize(max(tileSize // 25, 8))
+            text.SetPosition(5, 5)
+            renderer.AddViewProp(text)
+            renderWindow.AddRenderer(renderer)
+    renderWindow.Render()
+
+    windowToImage = vtk.vtkWindowToImageFilter()
+    windowToImage.SetInput(renderWindow)
+    windowToImage.ReadFrontBufferOff()
+    windowToImage.Update()
+
+    writer = vtk.vtkPNGWriter()
+    writer.SetInputConnection(windowToImage.GetOutputPort())
+    writer.SetFileName(outputImage)
+    writer.Write()
+    renderWindow.Finalize()
+    return scores
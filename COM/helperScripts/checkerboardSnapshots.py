@@ -0,0 +1,190 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Render checkerboard QA montages for every registration in a directory
+#
+# Notes:
+#   - Every image under registrationDirectory (searched recursively) that
+#       matches --pattern is a registered atlas, drawn as a checkerboard with
+#       the fixed (target) image as in checkerBoardViewer.py. See
+#       checkerboardOverlay.montage. Registered images should be on the
+#       fixed image grid, such as transformix output.
+#   - Each registration is written as <outputDirectory>/<name>.png, where the
+#       name is its path below registrationDirectory without the image
+#       extension and with the separators replaced by underscores. Rows are
+#       axial, coronal and sagittal, columns are --positions through the fixed
+#       image.
+#   - With --score (or --threshold) every tile is scored with the normalized
+#       cross correlation of the two images over that slice. The scores and
+#       their minimum are written to <outputDirectory>/scores.csv, and
+#       registrations with a tile under --threshold are flagged.
+#   - Rendering is offscreen, so no display is needed. Registrations are
+#       rendered in --nWorkers processes, each with its own OpenGL context.
+#   - Existing montages are kept unless --force is given, but are rendered
+#       again when scoring so scores.csv covers every registration.
+#
+# Usage:
+#   python checkerboardSnapshots.py target.nii registrations montages --nWorkers 4
+#   python checkerboardSnapshots.py target.nii registrations montages --threshold 0.6 --positions 0.25 0.5 0.75
+
+# Libraries
+import argparse
+import csv
+import fnmatch
+import os
+import multiprocessing
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc'))
+import imageReader
+import checkerboardOverlay
+import niftiIO
+
+# Setup and parse command line arguments
+parser = argparse.ArgumentParser(
+    description='Render checkerboard montages of every registration in a directory against the fixed image',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+parser.add_argument(
+    'fixedImage',
+    help='The fixed (target) image'
+    )
+parser.add_argument(
+    'registrationDirectory',
+    help='Directory searched for registered images'
+    )
+parser.add_argument(
+    'outputDirectory',
+    help='Directory the PNG montages and scores are written to'
+    )
+parser.add_argument('--pattern',
+                    default='result*.nii*',
+                    help='File name pattern of the registered images')
+parser.add_argument('-w', '--window',
+                    default=[0,0], type=float, nargs=2,
+                    help='The window of the fixed and registered images. Computed from the dynamic range if zero or less')
+parser.add_argument('-l', '--level',
+                    default=[0,0], type=float, nargs=2,
+                    help='The level of the fixed and registered images. Computed from the dynamic range if the window is zero or less')
+parser.add_argument('-d', '--divisions',
+                    default=[10, 10], type=int, nargs=2,
+                    help='The spacing between divisions in spacing units')
+parser.add_argument('-p', '--positions',
+                    default=[0.3, 0.5, 0.7], type=float, nargs='+',
+                    help='Slice positions through each plane as fractions of the fixed image extent')
+parser.add_argument('-s', '--tileSize',
+                    default=int(300), type=int,
+                    help='Width and height in pixels of each tile')
+parser.add_argument('--score',
+                    action='store_true',
+                    help='Set to score every tile with the normalized cross correlation')
+parser.add_argument('-t', '--threshold',
+                    default=None, type=float,
+                    help='Flag registrations with a tile scored below this. Implies --score')
+parser.add_argument('--nWorkers',
+                    default=int(1), type=int,
+                    help='Number of registrations rendered at once')
+parser.add_argument('-f', '--force',
+                    action='store_true',
+                    help='Set to overwrite existing montages')
+args = parser.parse_args()
+score = args.score or args.threshold is not None
+
+# Check inputs
+if not os.path.isfile(args.fixedImage):
+    os.sys.exit('Input \"{}\" does not exist. Exiting...'.format(args.fixedImage))
+if not os.path.isdir(args.registrationDirectory):
+    os.sys.exit('Directory \"{}\" does not exist. Exiting...'.format(args.registrationDirectory))
+for position in args.positions:
+    if position < 0 or position > 1:
+        os.sys.exit('Positions must be between zero and one. Given {p}. Exiting...'.format(p=position))
+if args.tileSize < 16:
+    os.sys.exit('Tile size must be atleast 16 pixels. Given {n}. Exiting...'.format(n=args.tileSize))
+if args.nWorkers < 1:
+    os.sys.exit('Must have atleast one worker, asked for {}. Exiting...'.format(args.nWorkers))
+
+# Find the registrations
+registrations = []
+for directory, directories, fileNames in os.walk(args.registrationDirectory):
+    directories.sort()
+    for fileName in sorted(fnmatch.filter(fileNames, args.pattern)):
+        movingImage = os.path.join(directory, fileName)
+        if os.path.abspath(movingImage) == os.path.abspath(args.fixedImage):
+            continue
+        # Only drop the image extension, so result.0.nii and result.1.nii differ
+        name = os.path.relpath(movingImage, args.registrationDirectory)
+        if niftiIO.isNIFTI(name):
+            name = name[:-len(niftiIO.niftiExtension(name))]
+        else:
+            name = os.path.splitext(name)[0]
+        name = name.replace(os.sep, '_')
+        registrations.append({'name': name, 'moving': movingImage,
+            'output': os.path.join(args.outputDirectory, name + '.png')})
+if len(registrations) == 0:
+    os.sys.exit('No files match \"{p}\" in \"{d}\". Exiting...'.format(p=args.pattern, d=args.registrationDirectory))
+
+# Create the output directory
+if not os.path.isdir(args.outputDirectory):
+    os.makedirs(args.outputDirectory)
+
+# Skip registrations already rendered
+todo = [registration for registration in registrations
+    if args.force or score or not os.path.exists(registration['output'])]
+print('Rendering {t} of {n} registrations on {w} workers'.format(t=len(todo), n=len(registrations), w=args.nWorkers))
+
+# Keep the fixed image cached in each worker next to the registration being read
+imageReader.setCacheSize(2)
+
+def render(registration):
+    '''Render one registration, returning (registration, scores, error)'''
+    try:
+        scores = checkerboardOverlay.montage(args.fixedImage, registration['moving'], registration['output'],
+            args.window, args.level, args.divisions, args.positions, args.tileSize, score, registration['name'])
+        return registration, scores, None
+    except (ValueError, IOError, OSError) as e:
+        return registration, None, str(e)
+
+failed = []
+results = []
+pool = multiprocessing.Pool(args.nWorkers)
+try:
+    for count, (registration, scores, error) in enumerate(pool.imap(render, todo)):
+        if error is not None:
+            print('[{i}/{n}] {r}: {e}'.format(i=count+1, n=len(todo), r=registration['name'], e=error))
+            failed.append(registration['name'])
+            continue
+        message = '[{i}/{n}] {r}'.format(i=count+1, n=len(todo), r=registration['name'])
+        if score:
+            valid = [x for x in scores if x is not None]
+            minimum = min(valid) if len(valid) > 0 else None
+            flagged = minimum is None or (args.threshold is not None and minimum < args.threshold)
+            results.append((registration, scores, minimum, flagged))
+            message += ': minimum NCC {m}{f}'.format(m='-' if minimum is None else '{:.3f}'.format(minimum),
+                f=' FLAGGED' if flagged else '')
+        print(message)
+except KeyboardInterrupt:
+    pool.terminate()
+    pool.join()
+    os.sys.exit('Rendering stopped, rerun to finish the remaining registrations. Exiting...')
+pool.close()
+pool.join()
+
+# Write the scores
+if score:
+    scoreFileName = os.path.join(args.outputDirectory, 'scores.csv')
+    tileNames = ['{v}{p:.0f}'.format(v=view[0], p=100 * position)
+        for view in checkerboardOverlay.montageViews for position in args.positions]
+    with open(scoreFileName, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'moving', 'minimum', 'flagged'] + tileNames)
+        for registration, scores, minimum, flagged in results:
+            writer.writerow([registration['name'], registration['moving'],
+                '' if minimum is None else '{:.4f}'.format(minimum), int(flagged)] +
+                ['' if x is None else '{:.4f}'.format(x) for x in scores])
+    print('Wrote scores to \"{}\"'.format(scoreFileName))
+    flaggedNames = [result[0]['name'] for result in results if result[3]]
+    if len(flaggedNames) > 0:
+        print('Flagged {n} registrations: {r}'.format(n=len(flaggedNames), r=', '.join(flaggedNames)))
+
+if len(failed) > 0:
+    os.sys.exit('{n} registrations failed: {r}. Exiting...'.format(n=len(failed), r=', '.join(failed)))
+print('Wrote montages to \"{}\"'.format(args.outputDirectory))
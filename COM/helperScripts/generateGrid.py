@@ -1,5 +1,6 @@
 # History:
 #   2017.04.10  babesler    Created
+#   2026.10.19  agent       Read through imageReader.py
 #
 # Description:
 #   Generate a grid image using another image as a template
@@ -17,8 +18,8 @@
 import os
 import math
 import vtk
-import vtkbone
 import argparse
+import imageReader
 
 # Parse arguments
 parser = argparse.ArgumentParser(
@@ -53,8 +54,8 @@ if not os.path.isfile(args.inputImage):
     os.sys.exit('Input file \"{fileName}\" does not exist. Exiting...'.format(fileName=args.inputImage))
 
 # Validate that the output is .nii and does not exist already
-if not args.outputImage.lower().endswith('.nii'):
-    os.sys.exit('Output file \"{outputImage}\" is not a .nii file. Exiting...'.format(outputImage=args.outputImage))
+if not args.outputImage.lower().endswith(('.nii', '.nii.gz')):
+    os.sys.exit('Output file \"{outputImage}\" is not a .nii or .nii.gz file. Exiting...'.format(outputImage=args.outputImage))
 if os.path.isfile(args.outputImage):
     if not args.force:
         answer = raw_input('Output file \"{outputImage}\" exists. Overwrite? [Y/n]'.format(outputImage=args.outputImage))
@@ -68,26 +69,17 @@ for spacing in args.gridSpacing:
         os.sys.exit('Grid spacing must be an integer greater than zero. Given {}.Exiting...'.format(spacing))
 
 # Read in inputs
-reader = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage)
-if reader is None:
-    if args.inputImage.lower().endswith('.aim'):
-        reader = vtkbone.vtkboneAIMReader()
-        reader.DataOnCellsOff()
-    elif args.inputImage.lower().endswith('.nii'):
-        reader = vtk.vtkNIFTIImageReader()
-    elif args.inputImage.lower().endswith('.dcm'):
-        reader = vtk.vtkDICOMImageReader()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage))
-reader.SetFileName(args.inputImage)
 print('Loading {}...'.format(args.inputImage))
-reader.Update()
+try:
+    image = imageReader.readImage(args.inputImage)
+except ValueError as e:
+    os.sys.exit('{e}. Exiting...'.format(e=e))
 
 # Grid source
 gridSource = vtk.vtkImageGridSource()
-gridSource.SetDataOrigin(reader.GetOutput().GetOrigin())
-gridSource.SetDataSpacing(reader.GetOutput().GetSpacing())
-gridSource.SetDataExtent(reader.GetOutput().GetExtent())
+gridSource.SetDataOrigin(image.GetOrigin())
+gridSource.SetDataSpacing(image.GetSpacing())
+gridSource.SetDataExtent(image.GetExtent())
 gridSource.SetDataScalarTypeToShort()
 gridSource.SetGridSpacing(args.gridSpacing)
 gridSource.SetLineValue(args.lineValue)
@@ -0,0 +1,221 @@
+# History:
+#   2026.10.19  agent       Created
+#   2026.10.19  agent       Load several images at once with progress
+#
+# Description:
+#   Shared image loading for the helper scripts
+#
+# Notes:
+#   - createReader picks a reader the way every helper script used to:
+#       vtkImageReader2Factory first, then NIfTI, DICOM and AIM by extension.
+#   - vtkbone (or failing that vtkbonelab) is only imported when an *.aim
+#       file is opened, so other images do not pay for it at startup.
+#   - readImage keeps the last cacheSize images read in an LRU keyed on
+#       the absolute path, modification time and region, so tools that open
+#       the same image twice only read it once. Cached images are shared, so
+#       do not modify them. Call setCacheSize(0) to turn the cache off.
+#   - Chunked stores (*.chunks) and run-length labels (*.rle.npz) are read
+#       through chunkedStore.py and sparseLabels.py. A region (inclusive
+#       [x,y,z] lower and upper) is only read from chunked stores.
+#   - openImage returns something with GetOutputPort() to connect to a
+#       mapper: a proxyPyramid.StreamedImage for images over proxyVoxels,
+#       otherwise a vtkTrivialProducer of readImage.
+#   - openImages opens each image on its own thread and prints the progress
+#       of all of them on one line. NIfTI is read through niftiIO.readNIFTI,
+#       whose zlib and numpy copies run without the GIL, so the reads
+#       overlap. Other readers only overlap if VTK releases the GIL.
+#
+# Usage:
+#   import imageReader
+#   image = imageReader.readImage('image.nii')
+#   source = imageReader.openImage('image.nii', proxyVoxels=1 << 22)
+#   atlas, target = imageReader.openImages(['atlas.nii.gz', 'target.nii.gz'])
+#   mapper.SetInputConnection(source.GetOutputPort())
+
+import os
+import threading
+import collections
+from multiprocessing.pool import ThreadPool
+import numpy
+import vtk
+imageProcDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc')
+if imageProcDirectory not in os.sys.path:
+    os.sys.path.append(imageProcDirectory)
+import niftiIO
+import chunkedStore
+import sparseLabels
+import proxyPyramid
+
+cacheSize = 4
+cache = collections.OrderedDict()
+cacheLock = threading.Lock()
+
+def setCacheSize(size):
+    '''Keep at most size images in the cache'''
+    global cacheSize
+    with cacheLock:
+        cacheSize = size
+        while len(cache) > max(cacheSize, 0):
+            cache.popitem(last=False)
+
+def clearCache():
+    '''Drop every cached image'''
+    with cacheLock:
+        cache.clear()
+
+def aimReader():
+    '''An AIM reader from vtkbone or vtkbonelab, or None if neither is installed'''
+    try:
+        import vtkbone
+        reader = vtkbone.vtkboneAIMReader()
+    except ImportError:
+        try:
+            import vtkbonelab
+            reader = vtkbonelab.vtkbonelabAIMReader()
+        except ImportError:
+            return None
+    reader.DataOnCellsOff()
+    return reader
+
+def createReader(fileName):
+    '''Return a reader for fileName that has not been updated, or None if there is none'''
+    reader = vtk.vtkImageReader2Factory.CreateImageReader2(fileName)
+    if reader is None:
+        if fileName.lower().endswith(('.nii', '.nii.gz')):
+            reader = vtk.vtkNIFTIImageReader()
+        elif fileName.lower().endswith('.dcm'):
+            reader = vtk.vtkDICOMImageReader()
+        elif fileName.lower().endswith('.aim'):
+            reader = aimReader()
+    if reader is not None:
+        reader.SetFileName(fileName)
+    return reader
+
+def isReadable(fileName):
+    '''True if readImage can read fileName'''
+    if chunkedStore.isChunked(fileName) or sparseLabels.isSparse(fileName):
+        return True
+    return createReader(fileName) is not None
+
+def cacheKey(fileName, lower, upper):
+    return (os.path.abspath(fileName), os.path.getmtime(fileName),
+            None if lower is None else tuple(lower), None if upper is None else tuple(upper))
+
+def readNIFTI(fileName, progress=None):
+    '''Read a single component NIfTI as vtkImageData through niftiIO'''
+    array, reader = niftiIO.readNIFTI(fileName, progress)
+    # Copy out of the memory map of an uncompressed file
+    if isinstance(array, numpy.memmap) or isinstance(array.base, numpy.memmap):
+        array = numpy.array(array)
+    return niftiIO.arrayToImage(array, reader.GetDataExtent(), reader.GetDataSpacing(),
+        reader.GetDataOrigin(), reader.GetDataScalarType())
+
+def readImage(fileName, lower=None, upper=None, nThreads=1, progress=None):
+    '''Read fileName as vtkImageData, reusing a cached read if the file is unchanged.
+
+    progress, if given, is called with the fraction read.'''
+    key = cacheKey(fileName, lower, upper)
+    with cacheLock:
+        if key in cache:
+            image = cache.pop(key)
+            cache[key] = image
+            return image
+
+    if chunkedStore.isChunked(fileName):
+        image = chunkedStore.readImage(fileName, lower, upper, nThreads)
+    elif sparseLabels.isSparse(fileName):
+        image = sparseLabels.toImage(sparseLabels.load(fileName))
+    else:
+        image = None
+        if niftiIO.isNIFTI(fileName):
+            try:
+                image = readNIFTI(fileName, progress)
+            except ValueError:
+                # Multi-component images go through the reader
+                pass
+        if image is None:
+            reader = createReader(fileName)
+            if reader is None:
+                raise ValueError('Unable to find a reader for \"{}\"'.format(fileName))
+            if progress is not None:
+                reader.AddObserver('ProgressEvent', lambda obj, event: progress(obj.GetProgress()))
+            reader.Update()
+            image = reader.GetOutput()
+
+    with cacheLock:
+        if cacheSize > 0:
+            cache[key] = image
+            while len(cache) > cacheSize:
+                cache.popitem(last=False)
+    return image
+
+def openImage(fileName, lower=None, upper=None, nThreads=1, proxyVoxels=0, method='mean', slabSize=64, progress=None):
+    '''Return a source for fileName with GetOutputPort() and scalarRange.
+
+    Images are streamed through a proxy (see proxyPyramid.py) if proxyVoxels
+    is above zero, unless a region of a chunked store is given or they are
+    run-length labels.'''
+    region = chunkedStore.isChunked(fileName) and (lower is not None or upper is not None)
+    if proxyVoxels > 0 and not region and not sparseLabels.isSparse(fileName):
+        reader = None
+        if not chunkedStore.isChunked(fileName):
+            reader = createReader(fileName)
+            if reader is None:
+                raise ValueError('Unable to find a reader for \"{}\"'.format(fileName))
+        return proxyPyramid.StreamedImage(fileName, reader, method, proxyVoxels, slabSize, progress)
+
+    image = readImage(fileName, lower, upper, nThreads, progress)
+    source = vtk.vtkTrivialProducer()
+    source.SetOutput(image)
+    source.scalarRange = image.GetScalarRange()
+    return source
+
+class LoadProgress(object):
+    '''Print the percent loaded of several files on one line'''
+    def __init__(self, fileNames, stream=os.sys.stdout):
+        self.names = [os.path.basename(fileName.rstrip('/')) for fileName in fileNames]
+        self.percents = [0] * len(fileNames)
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def callback(self, index):
+        return lambda fraction: self.update(index, fraction)
+
+    def update(self, index, fraction):
+        percent = int(100 * min(max(fraction, 0.0), 1.0))
+        with self.lock:
+            if percent == self.percents[index]:
+                return
+            self.percents[index] = percent
+            self.stream.write('\rLoading ' + ', '.join(['{n} {p:3d}%'.format(n=name, p=p)
+                for name, p in zip(self.names, self.percents)]))
+            self.stream.flush()
+
+    def finish(self):
+        with self.lock:
+            self.stream.write('\n')
+            self.stream.flush()
+
+def openImages(fileNames, methods=None, lower=None, upper=None, nThreads=1, proxyVoxels=0, slabSize=64, showProgress=True):
+    '''openImage every file on its own thread, returning the sources in order.
+
+    methods gives the proxy method of each file, 'mean' by default.'''
+    if methods is None:
+        methods = ['mean'] * len(fileNames)
+    progress = LoadProgress(fileNames) if showProgress else None
+
+    def load(index):
+        callback = progress.callback(index) if progress is not None else None
+        source = openImage(fileNames[index], lower, upper, nThreads, proxyVoxels, methods[index], slabSize, callback)
+        if callback is not None:
+            callback(1.0)
+        return source
+
+    pool = ThreadPool(len(fileNames))
+    try:
+        return pool.map(load, range(len(fileNames)))
+    finally:
+        pool.close()
+        pool.join()
+        if progress is not None:
+            progress.finish()
@@ -1,5 +1,8 @@
 # History:
 #   2017.03.21  babesler    Created
+#   2026.10.19  agent       Open on proxies and stream full resolution slabs
+#   2026.10.19  agent       Read through imageReader.py
+#   2026.10.19  agent       Load both inputs at once
 #
 # Description:
 #   Visualize two volumes overlayed with a checherboard layout
@@ -18,6 +21,10 @@
 #       X/Y/Z               Slice sagittal/coronal/axial
 #       Right Click         Zoom camera
 #       Shift + Left Click  Pan camera
+#   - Images over --proxyVoxels are first shown from low resolution proxies
+#       stored next to them (see proxyPyramid.py). Full resolution slabs of
+#       --slabSize slices around the viewed slice are loaded in the
+#       background.
 #
 # Usage:
 #   python checkerBoardViewer.py input1.nii input2.nii
@@ -27,17 +34,9 @@ import os
 import math
 import vtk
 import argparse
-try:
-    import vtkbone
-    vtkboneImported = True
-    vtkbonelabImported = False
-except ImportError:
-    vtkboneImported = False
-    try:
-        import vtkbonelab
-        vtkbonelabImported = True
-    except:
-        vtkbonelabImported = False
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc'))
+import proxyPyramid
+import imageReader
 
 # Parse arguments
 parser = argparse.ArgumentParser(
@@ -72,6 +71,12 @@ parser.add_argument('-d', '--divisions',
 parser.add_argument('-n', '--nThreads',
                     default=int(1), type=int,
                     help='Number of threads for each image slice visualizer (default: %(default)s)')
+parser.add_argument('--proxyVoxels',
+                    default=proxyPyramid.defaultProxyVoxels, type=int,
+                    help='Largest image shown before it is fully read. Larger images open on a proxy. Zero or less always reads the full images first')
+parser.add_argument('--slabSize',
+                    default=int(64), type=int,
+                    help='Number of full resolution slices loaded around the viewed slice')
 args = parser.parse_args()
 
 # Check input arguments
@@ -84,45 +89,21 @@ for fileName in [args.inputImage1, args.inputImage2]:
 if args.nThreads < 1:
     os.sys.exit('Number of threads must be one or greater. Given {n}. Exiting...'.format(n=args.nThreads))
 
-# Read in inputs
-reader1 = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage1)
-if reader1 is None:
-    if args.inputImage1.lower().endswith('.nii'):
-        reader1 = vtk.vtkNIFTIImageReader()
-    elif args.inputImage1.lower().endswith('.dcm'):
-        reader1 = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputImage1.lower().endswith('.aim'):
-        reader1 = vtkbone.vtkboneAIMReader()
-        reader1.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputImage1.lower().endswith('.aim'):
-        reader1 = vtkbonelab.vtkbonelabAIMReader()
-        reader1.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage1))
-reader1.SetFileName(args.inputImage1)
-print('Loading {}...'.format(args.inputImage1))
-reader1.Update()
-
-reader2 = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage1)
-if reader2 is None:
-    if args.inputImage2.lower().endswith('.nii'):
-        reader2 = vtk.vtkNIFTIImageReader()
-    elif args.inputImage2.lower().endswith('.dcm'):
-        reader2 = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputImage2.lower().endswith('.aim'):
-        reader2 = vtkbone.vtkboneAIMReader()
-        reader2.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputImage2.lower().endswith('.aim'):
-        reader2 = vtkbonelab.vtkbonelabAIMReader()
-        reader2.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage2))
-reader2.SetFileName(args.inputImage2)
-print('Loading {}...'.format(args.inputImage2))
-reader2.Update()
-
-# Get scalar range for W/L and padding
-scalarRanges = [reader1.GetOutput().GetScalarRange(), reader2.GetOutput().GetScalarRange()]
+# Check slab size
+if args.slabSize < 1:
+    os.sys.exit('Slab size must be one or greater. Given {n}. Exiting...'.format(n=args.slabSize))
+
+# Read in both inputs at once
+try:
+    readers = imageReader.openImages([args.inputImage1, args.inputImage2], nThreads=args.nThreads,
+        proxyVoxels=args.proxyVoxels, slabSize=args.slabSize)
+except ValueError as e:
+    os.sys.exit('{e}. Exiting...'.format(e=e))
+reader1, reader2 = readers
+streamedImages = [reader for reader in readers if isinstance(reader, proxyPyramid.StreamedImage)]
+
+# Get scalar range for W/L and padding. A proxy knows the range of the full image.
+scalarRanges = [reader1.scalarRange, reader2.scalarRange]
 
 # Determine window/level if needed
 print("Window/Level:")
@@ -216,6 +197,16 @@ def layerSwitcher(obj,event):
 # Add ability to switch between active layers
 interactor.AddObserver('KeyPressEvent', layerSwitcher, -1.0) # Call layerSwitcher as last observer
 
+# Swap in full resolution slabs as they are loaded
+def streamSlabs(obj, event):
+    if any([image.update(renderer.GetActiveCamera()) for image in streamedImages]):
+        interactor.Render()
+
+if len(streamedImages) > 0:
+    interactor.AddObserver('TimerEvent', streamSlabs)
+
 # Initialize and go
 interactor.Initialize()
+if len(streamedImages) > 0:
+    interactor.CreateRepeatingTimer(100)
 interactor.Start()
@@ -1,19 +1,35 @@
 # History:
 #   2017.04.10  babesler    Created
+#   2026.10.19  agent       Load both inputs at once
+#   2026.10.19  agent       Grid lines (*.vtp) from QCT_DeformationGrid.py
+#   2026.10.19  agent       Tiled multi-slice view
 #
 # Description:
 #   Given an image and a grid, overlay them.
 #
 # Notes:
-#   - None
+#   - The grid is either a warped grid image (see generateGrid.py) or grid
+#       lines from QCT_DeformationGrid.py. Grid lines are drawn on top of the
+#       image, clipped to a slab one line spacing thick around the slice, and
+#       the lines running along the view direction are hidden.
+#   - With --tiles rows columns, that many axial slices evenly spaced through
+#       the image are laid out side by side, followed by a coronal and a
+#       sagittal plane through the centre. Every tile is a fixed slice in one
+#       renderer, placed by its user matrix, so the tiles pan and zoom
+#       together. Each tile keeps its own slice texture, which is only
+#       rebuilt when the window/level changes, and all tiles share one
+#       image property, so window/level changes reach every tile at once.
 #
 # Usage:
 #   python overlayGrid.py image checkerboard
+#   python overlayGrid.py result.0.nii grid.vtp
+#   python overlayGrid.py result.0.nii grid.vtp --tiles 3 3
 
 # Libraries
 import vtk
 import argparse
 import os
+import imageReader
 
 # Setup and parse command line arguments
 parser = argparse.ArgumentParser(
@@ -26,7 +42,7 @@ parser.add_argument(
     )
 parser.add_argument(
     'inputGrid',
-    help='The input NIfTI grid file'
+    help='The input NIfTI grid file or grid lines (*.vtp)'
     )
 parser.add_argument('-w', '--window',
                     default=float(500), type=float,
@@ -37,33 +53,78 @@ parser.add_argument('-l', '--level',
 parser.add_argument('-o', '--opacity',
                     default=float(0.25), type=float,
                     help='The grid opacity')
+parser.add_argument('-t', '--tiles',
+                    default=[0, 0], type=int, nargs=2,
+                    help='Rows and columns of axial slices shown side by side with coronal and sagittal planes. One slice through the focal point if zero')
 args = parser.parse_args()
 
 # Check that the input (file or directory) exists
+gridLines = args.inputGrid.lower().endswith('.vtp')
 for fileName in [args.inputImage,args.inputGrid]:
     if not os.path.exists(fileName):
         os.sys.exit('Input \"{inputImage}\" does not exist. Exiting...'.format(inputImage=fileName))
 
-    if not fileName.lower().endswith('.nii'):
-        os.sys.exit('Input \"{inputImage}\" is not of type NIfTI (*.nii). Exiting...'.format(inputImage=fileName))
+    if fileName == args.inputGrid and gridLines:
+        continue
+    if not fileName.lower().endswith(('.nii', '.nii.gz')):
+        os.sys.exit('Input \"{inputImage}\" is not of type NIfTI (*.nii or *.nii.gz). Exiting...'.format(inputImage=fileName))
 
-# Read both images
-inputReader = vtk.vtkNIFTIImageReader()
-inputReader.SetFileName(args.inputImage)
-print("Reading {}".format(args.inputImage))
-inputReader.Update()
+# Check the tiles
+if args.tiles[0] < 0 or args.tiles[1] < 0:
+    os.sys.exit('Tiles must be zero or greater. Given {}. Exiting...'.format(args.tiles))
+tiled = args.tiles[0] * args.tiles[1] > 0
 
-gridReader = vtk.vtkNIFTIImageReader()
-gridReader.SetFileName(args.inputGrid)
-print("Reading {}".format(args.inputGrid))
-gridReader.Update()
+# Read both images at once
+try:
+    if gridLines:
+        inputReader, = imageReader.openImages([args.inputImage])
+    else:
+        inputReader, gridReader = imageReader.openImages([args.inputImage, args.inputGrid])
+except ValueError as e:
+    os.sys.exit('{e}. Exiting...'.format(e=e))
 
-# Setup input Mapper + Property -> Slice
-inputMapper = vtk.vtkImageSliceMapper()
-inputMapper.SetInputConnection(inputReader.GetOutputPort())
-inputMapper.SliceAtFocalPointOn()
-inputMapper.SliceFacesCameraOn()
-inputMapper.BorderOff()
+def sliceMapper(inputPort, axis=None, index=None):
+    '''Slice mapper through the focal point facing the camera, or of slice index along axis'''
+    mapper = vtk.vtkImageSliceMapper()
+    mapper.SetInputConnection(inputPort)
+    if axis is None:
+        mapper.SliceAtFocalPointOn()
+        mapper.SliceFacesCameraOn()
+    else:
+        mapper.SetOrientation(axis)
+        mapper.SetSliceNumber(index)
+    mapper.BorderOff()
+    return mapper
+
+def tileMatrix(image, axis, index, center):
+    '''Matrix laying slice index along axis flat in the axial plane, centred on center'''
+    bounds = image.GetBounds()
+    sliceCenter = [(bounds[2*i] + bounds[2*i+1]) / 2.0 for i in range(3)]
+    sliceCenter[axis] = image.GetOrigin()[axis] + index * image.GetSpacing()[axis]
+    # Coronal planes are seen from the front and sagittal planes from the side, superior up
+    rotation = {2: [[1, 0, 0], [0, 1, 0], [0, 0, 1]],
+                1: [[1, 0, 0], [0, 0, 1], [0, -1, 0]],
+                0: [[0, 1, 0], [0, 0, 1], [1, 0, 0]]}[axis]
+    matrix = vtk.vtkMatrix4x4()
+    for i in range(3):
+        for j in range(3):
+            matrix.SetElement(i, j, rotation[i][j])
+        matrix.SetElement(i, 3, center[i] - sum([rotation[i][j] * sliceCenter[j] for j in range(3)]))
+    return matrix
+
+def imageTiles(image, rows, columns):
+    '''Return [(axis, index, matrix)] of the axial tiles, then the coronal and sagittal ones'''
+    extent = image.GetExtent()
+    bounds = image.GetBounds()
+    cellSize = 1.05 * max([bounds[2*i+1] - bounds[2*i] for i in range(3)])
+    nAxial = rows * columns
+    slices = [(2, extent[4] + int(round((k + 1) * (extent[5] - extent[4]) / float(nAxial + 1))), k // columns, k % columns)
+        for k in range(nAxial)]
+    # The orthogonal planes fill a column to the right, or a row if there is only one
+    for k, axis in enumerate([1, 0]):
+        slices.append((axis, (extent[2*axis] + extent[2*axis+1]) // 2, k % rows, columns + k // rows))
+    return [(axis, index, tileMatrix(image, axis, index, [column * cellSize, -row * cellSize, 0]))
+        for axis, index, row, column in slices]
 
 imageProperty = vtk.vtkImageProperty()
 imageProperty.SetColorLevel(args.level)
@@ -71,56 +132,151 @@ imageProperty.SetColorWindow(args.window)
 imageProperty.SetInterpolationTypeToLinear()
 imageProperty.SetLayerNumber(1)
 
-inputSlice = vtk.vtkImageSlice()
-inputSlice.SetMapper(inputMapper)
-inputSlice.SetProperty(imageProperty)
-
-# Determine an appropriate window/level for the grid
-scalarRange = [int(x) for x in gridReader.GetOutput().GetScalarRange()]
-window = scalarRange[1] - scalarRange[0]+1
-level = (scalarRange[1] + scalarRange[0])/2
-
-# Setup grid Mapper + Property -> Slice
-gridImageProperty = vtk.vtkImageProperty()
-gridImageProperty.SetOpacity(args.opacity)
-gridImageProperty.SetColorLevel(level)
-gridImageProperty.SetColorWindow(window)
-gridImageProperty.SetLayerNumber(2)
-gridImageProperty.SetInterpolationTypeToNearest()
-
-gridMapper = vtk.vtkImageSliceMapper()
-gridMapper.SetInputConnection(gridReader.GetOutputPort())
-gridMapper.SliceAtFocalPointOn()
-gridMapper.SliceFacesCameraOn()
-gridMapper.BorderOff()
-#gridMapper.ResampleToScreenPixelsOn()
-#gridMapper.JumpToNearestSliceOn()
-
-gridSlice = vtk.vtkImageSlice()
-gridSlice.SetProperty(gridImageProperty)
-gridSlice.SetMapper(gridMapper)
-
-# Add everything to a vtkImageStack
-imageStack = vtk.vtkImageStack()
-imageStack.AddImage(inputSlice)
-imageStack.AddImage(gridSlice)
-imageStack.SetActiveLayer(1)
+if gridLines:
+    # Read the grid lines
+    polyReader = vtk.vtkXMLPolyDataReader()
+    polyReader.SetFileName(args.inputGrid)
+    polyReader.Update()
+    if polyReader.GetOutput().GetCellData().GetArray('Axis') is None:
+        os.sys.exit('Input \"{}\" has no Axis cell array, write it with QCT_DeformationGrid.py. Exiting...'.format(args.inputGrid))
+    lineSpacing = polyReader.GetOutput().GetFieldData().GetArray('LineSpacing').GetTuple3(0)
+
+    # Split the lines by the axis they run along
+    axisLines = []
+    for axis in range(3):
+        threshold = vtk.vtkThreshold()
+        threshold.SetInputConnection(polyReader.GetOutputPort())
+        threshold.SetInputArrayToProcess(0, 0, 0, vtk.vtkDataObject.FIELD_ASSOCIATION_CELLS, 'Axis')
+        threshold.SetThresholdFunction(vtk.vtkThreshold.THRESHOLD_BETWEEN)
+        threshold.SetLowerThreshold(axis)
+        threshold.SetUpperThreshold(axis)
+
+        geometry = vtk.vtkGeometryFilter()
+        geometry.SetInputConnection(threshold.GetOutputPort())
+        axisLines.append(geometry)
+
+    def lineActor(axis, slab, matrix=None):
+        '''Actor of the lines along axis clipped to slab'''
+        clipper = vtk.vtkClipPolyData()
+        clipper.SetInputConnection(axisLines[axis].GetOutputPort())
+        clipper.SetClipFunction(slab)
+        clipper.InsideOutOn()
+
+        gridMapper = vtk.vtkPolyDataMapper()
+        gridMapper.SetInputConnection(clipper.GetOutputPort())
+        gridMapper.ScalarVisibilityOff()
+
+        gridActor = vtk.vtkActor()
+        gridActor.SetMapper(gridMapper)
+        gridActor.GetProperty().SetOpacity(args.opacity)
+        if matrix is not None:
+            gridActor.SetUserMatrix(matrix)
+        return gridActor
+
+    def slabBounds(axis, position):
+        '''Bounds of the slab one line spacing thick around position along axis'''
+        bounds = [-1e30, 1e30] * 3
+        bounds[2*axis] = position - lineSpacing[axis] / 2.0
+        bounds[2*axis+1] = position + lineSpacing[axis] / 2.0
+        return bounds
+else:
+    # Determine an appropriate window/level for the grid
+    scalarRange = [int(x) for x in gridReader.scalarRange]
+    window = scalarRange[1] - scalarRange[0]+1
+    level = (scalarRange[1] + scalarRange[0])/2
+
+    # Setup grid Property
+    gridImageProperty = vtk.vtkImageProperty()
+    gridImageProperty.SetOpacity(args.opacity)
+    gridImageProperty.SetColorLevel(level)
+    gridImageProperty.SetColorWindow(window)
+    gridImageProperty.SetLayerNumber(2)
+    gridImageProperty.SetInterpolationTypeToNearest()
+
+# One view following the camera, or a fixed slice for each tile
+image = inputReader.GetOutputDataObject(0)
+if tiled:
+    views = imageTiles(image, args.tiles[0], args.tiles[1])
+else:
+    views = [(None, None, None)]
+
+imageStacks = []
+gridActors = []
+for axis, index, matrix in views:
+    # Setup input Mapper + Property -> Slice
+    inputSlice = vtk.vtkImageSlice()
+    inputSlice.SetMapper(sliceMapper(inputReader.GetOutputPort(), axis, index))
+    inputSlice.SetProperty(imageProperty)
+
+    imageStack = vtk.vtkImageStack()
+    imageStack.AddImage(inputSlice)
+    imageStack.SetActiveLayer(1)
+
+    if gridLines:
+        if axis is None:
+            # The slab follows the camera (see updateLines)
+            slab = vtk.vtkBox()
+            gridActors += [lineActor(lineAxis, slab) for lineAxis in range(3)]
+        else:
+            slab = vtk.vtkBox()
+            slab.SetBounds(slabBounds(axis, image.GetOrigin()[axis] + index * image.GetSpacing()[axis]))
+            gridActors += [lineActor(lineAxis, slab, matrix) for lineAxis in range(3) if lineAxis != axis]
+    else:
+        # Setup grid Mapper -> Slice
+        gridMapper = sliceMapper(gridReader.GetOutputPort(), axis, index)
+        #gridMapper.ResampleToScreenPixelsOn()
+        #gridMapper.JumpToNearestSliceOn()
+
+        gridSlice = vtk.vtkImageSlice()
+        gridSlice.SetProperty(gridImageProperty)
+        gridSlice.SetMapper(gridMapper)
+        imageStack.AddImage(gridSlice)
+
+    if matrix is not None:
+        for layer in range(imageStack.GetImages().GetNumberOfItems()):
+            imageStack.GetImages().GetItemAsObject(layer).SetUserMatrix(matrix)
+    imageStacks.append(imageStack)
 
 # Create Renderer -> RenderWindow -> RenderWindowInteractor -> InteractorStyle
 renderer = vtk.vtkRenderer()
-renderer.AddViewProp(imageStack)
+for imageStack in imageStacks:
+    renderer.AddViewProp(imageStack)
 
 renderWindow = vtk.vtkRenderWindow()
 renderWindow.AddRenderer(renderer)
 
+if gridLines:
+    # Draw the lines on a layer above the image with the same camera, which
+    # is then no longer reset on the first render
+    renderer.ResetCamera()
+    lineRenderer = vtk.vtkRenderer()
+    lineRenderer.SetLayer(1)
+    lineRenderer.SetActiveCamera(renderer.GetActiveCamera())
+    lineRenderer.InteractiveOff()
+    for gridActor in gridActors:
+        lineRenderer.AddActor(gridActor)
+    renderWindow.SetNumberOfLayers(2)
+    renderWindow.AddRenderer(lineRenderer)
+
+    def updateLines(obj, event):
+        '''Clip the lines to the slab around the slice and hide those along the view direction'''
+        camera = renderer.GetActiveCamera()
+        if not tiled:
+            viewAxis = max(range(3), key=lambda i: abs(camera.GetDirectionOfProjection()[i]))
+            slab.SetBounds(slabBounds(viewAxis, camera.GetFocalPoint()[viewAxis]))
+            for axis, gridActor in enumerate(gridActors):
+                gridActor.SetVisibility(axis != viewAxis)
+        lineRenderer.ResetCameraClippingRange()
+
+    renderer.AddObserver('StartEvent', updateLines)
+
 interactor = vtk.vtkRenderWindowInteractor()
 interactorStyle = vtk.vtkInteractorStyleImage()
-interactorStyle.SetInteractionModeToImageSlicing()
+if not tiled:
+    interactorStyle.SetInteractionModeToImageSlicing()
 interactor.SetInteractorStyle(interactorStyle)
 renderWindow.SetInteractor(interactor)
 
-# TODO: Get multislice visualization working.
-
 # Let 'er rip
 renderWindow.Render()
 interactor.Start()
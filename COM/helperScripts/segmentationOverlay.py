@@ -0,0 +1,224 @@
+# History:
+#   2026.10.19  agent       Created from visualizeSegmentation.py
+#   2026.10.19  agent       Categorical lookup table of the labels present
+#
+# Description:
+#   Shared setup of a segmentation drawn over a grey scale image
+#
+# Notes:
+#   - labelLookupTable is categorical: each label present gets the same
+#       colour wherever it is drawn, stepping the hue by the golden ratio, so
+#       thousands of labels stay distinct. Label zero and values not present
+#       are transparent. Integer labels get one entry per value over their
+#       range, so mapping a pixel is an index. IndexedLookupOn is only used
+#       for other labels since VTK looks annotated values up one by one,
+#       which took minutes a slice with a thousand labels.
+#   - presentLabels takes the labels from the runs of a *.rle.npz file or
+#       the header of a label proxy (see proxyPyramid.py), and otherwise
+#       from one histogram pass over the image.
+#   - setLabelVisible hides or shows a label by changing the alpha of its
+#       table entry, so only the colours of the shown slice are redone.
+#   - overlayStack puts the image on layer 1 and the segmentation on layer 2
+#       of a vtkImageStack, each through a vtkImageResliceMapper that slices
+#       at the camera focal point. It is used both interactively and by
+#       segmentationSnapshots.py, so the snapshots look like the viewer.
+#   - snapshot renders axial, coronal and sagittal slices through the
+#       centroid of the segmentation side by side in an offscreen window and
+#       writes them as one PNG. Without a display VTK falls back to EGL or
+#       OSMesa, whichever it was built with (VTK_DEFAULT_OPENGL_WINDOW picks
+#       one, e.g. vtkOSOpenGLRenderWindow).
+#
+# Usage:
+#   import segmentationOverlay
+#   imageStack, imageProperty, segImageProperty = segmentationOverlay.overlayStack(
+#       imageReader.GetOutputPort(), segReader.GetOutputPort(), 500, 0, [1, 2], 0.25)
+#   renderer.AddViewProp(imageStack)
+#   segmentationOverlay.setLabelVisible(segImageProperty.GetLookupTable(), 2, False)
+#   segmentationOverlay.snapshot('image.nii', 'segmentation.nii', 'case.png')
+
+import colorsys
+import vtk
+from vtk.util import numpy_support
+import imageReader
+import sparseLabels
+
+# Largest range of integer labels given one table entry per value
+maximumTableValues = 1 << 20
+
+# Slice normal (camera looks along minus the normal) and view up of each snapshot tile
+snapshotViews = [
+    ('Axial', (0, 0, 1), (0, 1, 0)),
+    ('Coronal', (0, -1, 0), (0, 0, 1)),
+    ('Sagittal', (1, 0, 0), (0, 0, 1))]
+
+def labelColor(label):
+    '''RGB colour of a label'''
+    hue = (label * 0.618033988749895) % 1.0
+    return colorsys.hsv_to_rgb(hue, 0.65 + 0.35 * ((label // 7) % 2), 1.0)
+
+def labelLookupTable(labels):
+    '''Categorical lookup table of labels with label zero transparent'''
+    labels = [label for label in labels if label != 0]
+    segLUT = vtk.vtkLookupTable()
+    transparent = (0.0, 0.0, 0.0, 0.0)
+    segLUT.SetNanColor(transparent)
+    segLUT.SetBelowRangeColor(transparent)
+    segLUT.SetAboveRangeColor(transparent)
+    segLUT.UseBelowRangeColorOn()
+    segLUT.UseAboveRangeColorOn()
+    if len(labels) == 0:
+        segLUT.SetNumberOfTableValues(1)
+        segLUT.SetTableValue(0, transparent)
+        return segLUT
+
+    integers = all([label == int(label) for label in labels])
+    if integers and labels[-1] - labels[0] < maximumTableValues:
+        # One entry per value from the lowest to the highest label, each
+        # value in the middle of its entry, absent values transparent
+        lowest, highest = int(labels[0]), int(labels[-1])
+        segLUT.SetNumberOfTableValues(highest - lowest + 1)
+        segLUT.SetTableRange(lowest - 0.5, highest + 0.5)
+        for index in range(highest - lowest + 1):
+            segLUT.SetTableValue(index, transparent)
+    else:
+        # Annotated values, looked up one by one
+        segLUT.IndexedLookupOn()
+        segLUT.SetNumberOfTableValues(len(labels))
+        values = vtk.vtkVariantArray()
+        names = vtk.vtkStringArray()
+        for label in labels:
+            values.InsertNextValue(vtk.vtkVariant(label))
+            names.InsertNextValue(str(label))
+        segLUT.SetAnnotations(values, names)
+    for label in labels:
+        setLabelVisible(segLUT, label, True)
+    return segLUT
+
+def labelIndex(lookupTable, label):
+    '''Table entry of a label, or -1 if it has none'''
+    if lookupTable.GetIndexedLookup():
+        return lookupTable.GetAnnotatedValueIndex(vtk.vtkVariant(label))
+    if label != int(label):
+        return -1
+    index = int(label) - int(round(lookupTable.GetTableRange()[0] + 0.5))
+    return index if 0 <= index < lookupTable.GetNumberOfTableValues() else -1
+
+def setLabelVisible(lookupTable, label, visible):
+    '''Show or hide one label of a labelLookupTable. Returns False if it has no entry.'''
+    index = labelIndex(lookupTable, label)
+    if index < 0 or label == 0:
+        return False
+    r, g, b = labelColor(label)
+    lookupTable.SetTableValue(index, r, g, b, 1.0 if visible else 0.0)
+    lookupTable.Modified()
+    return True
+
+def presentLabels(source):
+    '''Sorted labels of a source from imageReader.openImage'''
+    labels = getattr(source, 'labels', None)
+    if labels is not None:
+        return list(labels)
+    # A proxy without labels is of a non-integer image, so take its distinct values
+    image = source.GetOutput() if hasattr(source, 'GetOutput') else source.GetOutputDataObject(0)
+    return sparseLabels.arrayLabels(numpy_support.vtk_to_numpy(image.GetPointData().GetScalars()))
+
+def imageSlice(inputPort, imageProperty, nThreads=1):
+    '''A vtkImageSlice of inputPort that slices at the focal point, facing the camera'''
+    mapper = vtk.vtkImageResliceMapper()
+    mapper.SetInputConnection(inputPort)
+    mapper.SliceAtFocalPointOn()
+    mapper.SliceFacesCameraOn()
+    mapper.BorderOn()
+    mapper.SetNumberOfThreads(nThreads)
+    mapper.ResampleToScreenPixelsOn()
+    mapper.StreamingOn()
+
+    imageActor = vtk.vtkImageSlice()
+    imageActor.SetMapper(mapper)
+    imageActor.SetProperty(imageProperty)
+    return imageActor
+
+def overlayStack(inputPort, segPort, window, level, labels, opacity, nThreads=1):
+    '''Return (imageStack, imageProperty, segImageProperty) of the segmentation over the image'''
+    # Setup input Property -> Slice
+    imageProperty = vtk.vtkImageProperty()
+    imageProperty.SetColorLevel(level)
+    imageProperty.SetColorWindow(window)
+    imageProperty.SetLayerNumber(1)
+    imageProperty.SetInterpolationTypeToNearest()
+
+    # Setup seg Property -> Slice
+    segImageProperty = vtk.vtkImageProperty()
+    segImageProperty.SetLookupTable(labelLookupTable(labels))
+    segImageProperty.UseLookupTableScalarRangeOn()
+    segImageProperty.SetOpacity(opacity)
+    segImageProperty.SetLayerNumber(2)
+    segImageProperty.SetInterpolationTypeToNearest()
+
+    # Add everything to a vtkImageStack
+    imageStack = vtk.vtkImageStack()
+    imageStack.AddImage(imageSlice(inputPort, imageProperty, nThreads))
+    imageStack.AddImage(imageSlice(segPort, segImageProperty, nThreads))
+    imageStack.SetActiveLayer(1)
+    return imageStack, imageProperty, segImageProperty
+
+def snapshot(inputImage, inputSegmentation, outputImage, window=500, level=0, opacity=0.25,
+             label=None, tileSize=400, title=None):
+    '''Write a PNG of axial, coronal and sagittal slices through the centroid of the segmentation.
+
+    The centroid is of label, or every non-zero label if None. Returns the
+    centroid. Raises ValueError if an input cannot be read or the label is absent.'''
+    labels = sparseLabels.readLabels(inputSegmentation)
+    center = sparseLabels.centroid(labels, label)
+    if center is None:
+        raise ValueError('Segmentation \"{s}\" has no voxels of label {l}'.format(
+            s=inputSegmentation, l='non-zero' if label is None else label))
+    present = sparseLabels.presentLabels(labels)
+
+    image = imageReader.readImage(inputImage)
+    inputSource = vtk.vtkTrivialProducer()
+    inputSource.SetOutput(image)
+    segSource = vtk.vtkTrivialProducer()
+    segSource.SetOutput(sparseLabels.toImage(labels))
+
+    renderWindow = vtk.vtkRenderWindow()
+    renderWindow.SetOffScreenRendering(1)
+    renderWindow.SetSize(tileSize * len(snapshotViews), tileSize)
+
+    bounds = image.GetBounds()
+    for index, (name, normal, viewUp) in enumerate(snapshotViews):
+        imageStack = overlayStack(inputSource.GetOutputPort(), segSource.GetOutputPort(),
+            window, level, present, opacity)[0]
+        renderer = vtk.vtkRenderer()
+        renderer.SetViewport(float(index) / len(snapshotViews), 0, float(index + 1) / len(snapshotViews), 1)
+        renderer.AddViewProp(imageStack)
+
+        # Fit the whole image slice in the tile
+        inPlane = [abs(bounds[2*i+1] - bounds[2*i]) for i in range(3) if normal[i] == 0]
+        camera = renderer.GetActiveCamera()
+        camera.ParallelProjectionOn()
+        camera.SetParallelScale(1.05 * max(inPlane) / 2.0)
+        camera.SetFocalPoint(center)
+        camera.SetPosition([center[i] + normal[i] * max(inPlane) for i in range(3)])
+        camera.SetViewUp(viewUp)
+        renderer.ResetCameraClippingRange()
+
+        text = vtk.vtkTextActor()
+        text.SetInput(name if index > 0 or title is None else '{t}\n{n}'.format(t=title, n=name))
+        text.GetTextProperty().SetFontSize(max(tileSize // 25, 8))
+        text.SetPosition(5, 5)
+        renderer.AddViewProp(text)
+        renderWindow.AddRenderer(renderer)
+    renderWindow.Render()
+
+    windowToImage = vtk.vtkWindowToImageFilter()
+    windowToImage.SetInput(renderWindow)
+    windowToImage.ReadFrontBufferOff()
+    windowToImage.Update()
+
+    writer = vtk.vtkPNGWriter()
+    writer.SetInputConnection(windowToImage.GetOutputPort())
+    writer.SetFileName(outputImage)
+    writer.Write()
+    renderWindow.Finalize()
+    return center
@@ -0,0 +1,135 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Render segmentation QA snapshots for every case in a manifest
+#
+# Notes:
+#   - The manifest is a CSV file with the columns image and segmentation and
+#       optionally name. Cases without a name are named after their
+#       segmentation file.
+#   - Each case is written as <outputDirectory>/<name>.png: axial, coronal
+#       and sagittal slices through the centroid of --label (every non-zero
+#       label by default), drawn as in visualizeSegmentation.py. See
+#       segmentationOverlay.snapshot.
+#   - Rendering is offscreen, so no display is needed. Cases are rendered in
+#       --nWorkers processes, each with its own OpenGL context.
+#   - Existing snapshots are kept unless --force is given, so an interrupted
+#       run can be restarted. Cases that fail are listed at the end.
+#
+# Usage:
+#   python segmentationSnapshots.py cases.csv snapshots -w 4
+#   python segmentationSnapshots.py cases.csv snapshots --label 1 --window 1500 --level 400
+
+# Libraries
+import argparse
+import csv
+import os
+import multiprocessing
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc'))
+import imageReader
+import segmentationOverlay
+
+# Setup and parse command line arguments
+parser = argparse.ArgumentParser(
+    description='Render axial, coronal and sagittal segmentation snapshots for every case in a manifest',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+parser.add_argument(
+    'manifest',
+    help='CSV file with the columns image, segmentation and optionally name'
+    )
+parser.add_argument(
+    'outputDirectory',
+    help='Directory the PNG snapshots are written to'
+    )
+parser.add_argument('--window',
+                    default=float(500), type=float,
+                    help='The window of the image')
+parser.add_argument('--level',
+                    default=float(0), type=float,
+                    help='The level of the image')
+parser.add_argument('-o', '--opacity',
+                    default=float(0.25), type=float,
+                    help='The opacity of the segmentation between zero and one')
+parser.add_argument('-l', '--label',
+                    default=None, type=int,
+                    help='Label the slices pass through the centroid of. Every non-zero label if not given')
+parser.add_argument('-s', '--tileSize',
+                    default=int(400), type=int,
+                    help='Width and height in pixels of each view')
+parser.add_argument('-w', '--nWorkers',
+                    default=int(1), type=int,
+                    help='Number of cases rendered at once')
+parser.add_argument('-f', '--force',
+                    action='store_true',
+                    help='Set to overwrite existing snapshots')
+args = parser.parse_args()
+
+# Check the manifest
+if not os.path.isfile(args.manifest):
+    os.sys.exit('Manifest \"{}\" does not exist. Exiting...'.format(args.manifest))
+with open(args.manifest) as f:
+    cases = list(csv.DictReader(f))
+for case in cases:
+    for key in ['image', 'segmentation']:
+        if not case.get(key):
+            os.sys.exit('Case {c} of \"{m}\" has no {k}. Exiting...'.format(c=case, m=args.manifest, k=key))
+        if not os.path.isfile(case[key]):
+            os.sys.exit('Input \"{}\" does not exist. Exiting...'.format(case[key]))
+    if not case.get('name'):
+        case['name'] = os.path.basename(case['segmentation']).split('.')[0]
+names = [case['name'] for case in cases]
+if len(set(names)) != len(names):
+    os.sys.exit('Case names in \"{}\" are not unique. Exiting...'.format(args.manifest))
+
+# Check arguments
+if args.opacity > 1 or args.opacity < 0:
+    os.sys.exit('Opacity must be between zero and one. Given {o}. Exiting...'.format(o=args.opacity))
+if args.tileSize < 16:
+    os.sys.exit('Tile size must be atleast 16 pixels. Given {n}. Exiting...'.format(n=args.tileSize))
+if args.nWorkers < 1:
+    os.sys.exit('Must have atleast one worker, asked for {}. Exiting...'.format(args.nWorkers))
+
+# Create the output directory
+if not os.path.isdir(args.outputDirectory):
+    os.makedirs(args.outputDirectory)
+
+# Skip cases already rendered
+for case in cases:
+    case['output'] = os.path.join(args.outputDirectory, case['name'] + '.png')
+todo = [case for case in cases if args.force or not os.path.exists(case['output'])]
+print('Rendering {t} of {n} cases on {w} workers'.format(t=len(todo), n=len(cases), w=args.nWorkers))
+
+# Every image is read once, so there is nothing to cache
+imageReader.setCacheSize(0)
+
+def render(case):
+    '''Render one case, returning (case, centroid, error)'''
+    try:
+        center = segmentationOverlay.snapshot(case['image'], case['segmentation'], case['output'],
+            args.window, args.level, args.opacity, args.label, args.tileSize, case['name'])
+        return case, center, None
+    except (ValueError, IOError, OSError) as e:
+        return case, None, str(e)
+
+failed = []
+pool = multiprocessing.Pool(args.nWorkers)
+try:
+    for count, (case, center, error) in enumerate(pool.imap_unordered(render, todo)):
+        if error is None:
+            print('[{i}/{n}] {c}: centroid ({x:.1f}, {y:.1f}, {z:.1f})'.format(
+                i=count+1, n=len(todo), c=case['name'], x=center[0], y=center[1], z=center[2]))
+        else:
+            print('[{i}/{n}] {c}: {e}'.format(i=count+1, n=len(todo), c=case['name'], e=error))
+            failed.append(case['name'])
+except KeyboardInterrupt:
+    pool.terminate()
+    pool.join()
+    os.sys.exit('Rendering stopped, rerun to finish the remaining cases. Exiting...')
+pool.close()
+pool.join()
+
+if len(failed) > 0:
+    os.sys.exit('{n} cases failed: {c}. Exiting...'.format(n=len(failed), c=', '.join(failed)))
+print('Wrote snapshots to \"{}\"'.format(args.outputDirectory))
@@ -0,0 +1,196 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Window/levelled 8-bit orthogonal slices for scrolling without a GPU
+#
+# Notes:
+#   - SliceCache shows one slice at a time as unsigned char, already mapped
+#       through the window and level, so the mapper only has to draw it. The
+#       slices are cut straight out of the volume from proxyPyramid.openVolume,
+#       which pages an uncompressed NIfTI or a chunked store one slice at a
+#       time instead of reslicing the image for every render.
+#   - The last cacheSize slices are kept in an LRU. After each slice is
+#       shown, a background thread fills the cache with the prefetch slices
+#       on either side of it along the same axis, nearest first, so
+#       scrolling finds the next slice ready.
+#   - Call update(camera) before each render (a renderer StartEvent
+#       observer does). It shows the slice at the camera focal point along
+#       the axis the camera looks down, reading it right away if it is not
+#       cached yet.
+#   - Slices are mapped with value 0 at level - window/2 and 255 at
+#       level + window/2. setWindowLevel drops the cache. Show them with a
+#       window of 255 and a level of 127.5.
+#   - The output only covers the shown slice, so add the volume bounds to
+#       the renderer (see boundsActor) or camera resets and slicing are
+#       limited to that slice.
+#
+# Usage:
+#   import sliceCache
+#   cache = sliceCache.SliceCache(*proxyPyramid.openVolume('image.nii'), window=1000, level=200)
+#   mapper.SetInputConnection(cache.GetOutputPort())
+#   renderer.AddObserver('StartEvent', lambda obj, event: cache.update(obj.GetActiveCamera()))
+
+import threading
+import collections
+import numpy
+import vtk
+from vtk.util import numpy_support
+
+class SliceCache(object):
+    '''LRU of window/levelled 8-bit slices of a [z,y,x] array, prefetched around the shown slice.
+
+    lower and upper give the inclusive [x,y,z] region shown, everything by default.'''
+    def __init__(self, array, spacing, origin, window, level, cacheSize=128, prefetch=8, lower=None, upper=None):
+        self.array = array
+        self.spacing = list(spacing)
+        self.origin = list(origin)
+        self.lower = [0, 0, 0] if lower is None else list(lower)
+        self.upper = [n - 1 for n in array.shape[::-1]] if upper is None else list(upper)
+        self.cacheSize = max(cacheSize, 1)
+        self.prefetchSize = prefetch
+        self.window = window
+        self.level = level
+        self.cache = collections.OrderedDict()
+        self.shown = None
+        self.wanted = None
+        self.condition = threading.Condition()
+        self.producer = vtk.vtkTrivialProducer()
+
+        # Start on the middle axial slice
+        self.show(2, (self.lower[2] + self.upper[2]) // 2)
+
+        self.thread = None
+        if self.prefetchSize > 0:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def GetOutputPort(self):
+        return self.producer.GetOutputPort()
+
+    def GetOutput(self):
+        return self.producer.GetOutputDataObject(0)
+
+    def bounds(self):
+        '''Physical bounds of the whole region'''
+        return [self.origin[i // 2] + [self.lower, self.upper][i % 2][i // 2] * self.spacing[i // 2] for i in range(6)]
+
+    def setWindowLevel(self, window, level):
+        '''Map slices through a new window and level, dropping every cached slice'''
+        with self.condition:
+            self.window = window
+            self.level = level
+            self.cache.clear()
+            shown, self.shown = self.shown, None
+        if shown is not None:
+            self.show(*shown)
+
+    def readSlice(self, axis, index, window, level):
+        '''Cut one slice out of the array and map it to unsigned char, as a 2D [row, column] array'''
+        region = [slice(self.lower[i], self.upper[i] + 1) for i in (2, 1, 0)]
+        region[2 - axis] = slice(index, index + 1)
+        values = numpy.array(self.array[tuple(region)], dtype=numpy.float32)
+        lowest = level - window / 2.0
+        mapped = numpy.clip((values - lowest) * (255.0 / max(window, 1e-6)), 0, 255)
+        return numpy.squeeze(mapped.astype(numpy.uint8), axis=2 - axis)
+
+    def get(self, axis, index):
+        '''The mapped slice, from the cache if it is there'''
+        with self.condition:
+            key = (axis, index)
+            if key in self.cache:
+                value = self.cache.pop(key)
+                self.cache[key] = value
+                return value
+            window, level = self.window, self.level
+        value = self.readSlice(axis, index, window, level)
+        self.store(axis, index, window, level, value)
+        return value
+
+    def store(self, axis, index, window, level, value):
+        with self.condition:
+            # Drop slices mapped through a window and level changed since
+            if (window, level) != (self.window, self.level):
+                return
+            self.cache[(axis, index)] = value
+            while len(self.cache) > self.cacheSize:
+                self.cache.popitem(last=False)
+
+    def show(self, axis, index):
+        '''Show one slice, returning True if it was not already shown'''
+        if self.shown == (axis, index):
+            return False
+        value = self.get(axis, index)
+        extent = [self.lower[0], self.upper[0], self.lower[1], self.upper[1], self.lower[2], self.upper[2]]
+        extent[2*axis] = extent[2*axis+1] = index
+
+        image = vtk.vtkImageData()
+        image.SetExtent(extent)
+        image.SetSpacing(self.spacing)
+        image.SetOrigin(self.origin)
+        scalars = numpy_support.numpy_to_vtk(numpy.ascontiguousarray(value).ravel(), deep=True,
+            array_type=vtk.VTK_UNSIGNED_CHAR)
+        scalars.SetName('ImageScalars')
+        image.GetPointData().SetScalars(scalars)
+        self.producer.SetOutput(image)
+
+        with self.condition:
+            self.shown = (axis, index)
+            self.wanted = (axis, index)
+            self.condition.notify()
+        return True
+
+    def viewedSlice(self, camera):
+        '''Return (axis, index) of the slice at the camera focal point'''
+        direction = camera.GetDirectionOfProjection()
+        axis = int(numpy.argmax(numpy.abs(direction)))
+        index = int(round((camera.GetFocalPoint()[axis] - self.origin[axis]) / self.spacing[axis]))
+        return axis, min(max(index, self.lower[axis]), self.upper[axis])
+
+    def update(self, camera):
+        '''Show the slice at the camera focal point. Returns True if the output changed.'''
+        return self.show(*self.viewedSlice(camera))
+
+    def run(self):
+        '''Background thread: cache the slices around the last one shown'''
+        done = None
+        while True:
+            with self.condition:
+                while self.wanted is None or (self.wanted, self.window, self.level) == done:
+                    self.condition.wait()
+                done = (self.wanted, self.window, self.level)
+                axis, index = self.wanted
+            for offset in range(1, self.prefetchSize + 1):
+                for neighbour in (index + offset, index - offset):
+                    with self.condition:
+                        # Start over around a newer slice or window/level
+                        if (self.wanted, self.window, self.level) != done:
+                            break
+                        cached = (axis, neighbour) in self.cache
+                        window, level = self.window, self.level
+                    if cached or neighbour < self.lower[axis] or neighbour > self.upper[axis]:
+                        continue
+                    self.store(axis, neighbour, window, level, self.readSlice(axis, neighbour, window, level))
+                if (self.wanted, self.window, self.level) != done:
+                    break
+
+def scalarRange(array, slabSize=64):
+    '''[minimum, maximum] of a [z,y,x] array, read slabSize slices at a time'''
+    lowest, highest = None, None
+    for z in range(0, array.shape[0], slabSize):
+        slab = numpy.asarray(array[z:z+slabSize, :, :])
+        lowest = slab.min() if lowest is None else min(lowest, slab.min())
+        highest = slab.max() if highest is None else max(highest, slab.max())
+    return [float(lowest), float(highest)]
+
+def boundsActor(bounds):
+    '''An invisible actor spanning bounds, so the renderer knows the size of the volume'''
+    outline = vtk.vtkOutlineSource()
+    outline.SetBounds(bounds)
+    mapper = vtk.vtkPolyDataMapper()
+    mapper.SetInputConnection(outline.GetOutputPort())
+    actor = vtk.vtkActor()
+    actor.SetMapper(mapper)
+    actor.GetProperty().SetColor(0.3, 0.3, 0.3)
+    return actor
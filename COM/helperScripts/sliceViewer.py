@@ -1,12 +1,27 @@
 # History:
 #   2017.04.03  babesler   Created
 #   2017.04.25  babesler   Setup threaded visualization
+#   2026.10.19  agent      Read regions of chunked (*.chunks) stores
+#   2026.10.19  agent      Open on a proxy and stream full resolution slabs
+#   2026.10.19  agent      Read through imageReader.py
+#   2026.10.19  agent      Scroll through cached 8-bit slices with --sliceCache
 #
 # Description:
 #   Slice-by-slice visualization
 #
 # Notes:
 #   - Taken from visualizeSegmentation.py
+#   - Chunked (*.chunks) inputs only read the chunks inside --lower/--upper.
+#   - Images over --proxyVoxels are first shown from a low resolution proxy
+#       stored next to the image (see proxyPyramid.py). Full resolution slabs
+#       of --slabSize slices around the viewed slice are loaded in the
+#       background. The first view of an image builds its proxy.
+#   - With --sliceCache the image is not resliced for every render. Slices
+#       are cut straight out of the file, mapped to 8-bit through the window
+#       and level and kept in an LRU of --sliceCache slices, with --prefetch
+#       slices on either side of the viewed slice read in the background
+#       (see sliceCache.py). Changing the window/level remaps the slices once
+#       the mouse is released.
 #
 # Usage:
 #   python sliceViewer.py greyScale
@@ -15,17 +30,10 @@
 import argparse
 import os
 import vtk
-try:
-    import vtkbone
-    vtkboneImported = True
-    vtkbonelabImported = False
-except ImportError:
-    vtkboneImported = False
-    try:
-        import vtkbonelab
-        vtkbonelabImported = True
-    except ImportError:
-        vtkbonelabImported = False
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc'))
+import proxyPyramid
+import imageReader
+import sliceCache
 
 # Setup and parse command line arguments
 parser = argparse.ArgumentParser(
@@ -45,6 +53,24 @@ parser.add_argument('--level',
 parser.add_argument('-n', '--nThreads',
                     default=int(1), type=int,
                     help='Number of threads for each image slice visualizer (default: %(default)s)')
+parser.add_argument('--lower',
+                    default=None, type=int, nargs=3,
+                    help='Lower (x,y,z) bound of the region read from a chunked (*.chunks) store. Reads everything if not given')
+parser.add_argument('--upper',
+                    default=None, type=int, nargs=3,
+                    help='Upper (x,y,z) bound of the region read from a chunked (*.chunks) store. Reads everything if not given')
+parser.add_argument('--proxyVoxels',
+                    default=proxyPyramid.defaultProxyVoxels, type=int,
+                    help='Largest image shown before it is fully read. Larger images open on a proxy. Zero or less always reads the full image first')
+parser.add_argument('--slabSize',
+                    default=int(64), type=int,
+                    help='Number of full resolution slices loaded around the viewed slice')
+parser.add_argument('--sliceCache',
+                    default=int(0), type=int,
+                    help='Number of window/levelled 8-bit slices kept for scrolling. Zero or less reslices the image for every render instead')
+parser.add_argument('--prefetch',
+                    default=int(8), type=int,
+                    help='Number of slices on either side of the viewed slice read ahead into the slice cache')
 args = parser.parse_args()
 
 # Check that the input (file or directory) exists
@@ -55,27 +81,29 @@ if not os.path.exists(args.inputImage):
 if args.nThreads < 1:
     os.sys.exit('Number of threads must be one or greater. Given {n}. Exiting...'.format(n=args.nThreads))
 
+# Check slab size
+if args.slabSize < 1:
+    os.sys.exit('Slab size must be one or greater. Given {n}. Exiting...'.format(n=args.slabSize))
+
 # Read the image
-inputReader = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage)
-if inputReader is None:
-    if args.inputImage.lower().endswith('.nii'):
-        inputReader = vtk.vtkNIFTIImageReader()
-    elif args.inputImage.lower().endswith('.dcm'):
-        inputReader = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputImage.lower().endswith('.aim'):
-        inputReader = vtkbone.vtkboneAIMReader()
-        inputReader.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputImage.lower().endswith('.aim'):
-        inputReader = vtkbonelab.vtkbonelabAIMReader()
-        inputReader.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage))
-inputReader.SetFileName(args.inputImage)
 print('Loading {}...'.format(args.inputImage))
-inputReader.Update()
-
-# Get scalar range for W/L and padding
-scalarRanges = inputReader.GetOutput().GetScalarRange()
+if args.sliceCache > 0:
+    # Slices are cut straight out of the file
+    reader = None
+    if not os.path.isdir(args.inputImage):
+        reader = imageReader.createReader(args.inputImage)
+        if reader is None:
+            os.sys.exit('Unable to find a reader for \"{}\". Exiting...'.format(args.inputImage))
+    array, spacing, origin = proxyPyramid.openVolume(args.inputImage, reader)
+    header = proxyPyramid.readProxy(args.inputImage)
+    streamedImages = []
+else:
+    try:
+        inputReader = imageReader.openImage(args.inputImage, args.lower, args.upper, args.nThreads,
+            args.proxyVoxels, 'mean', args.slabSize)
+    except ValueError as e:
+        os.sys.exit('{e}. Exiting...'.format(e=e))
+    streamedImages = [inputReader] if isinstance(inputReader, proxyPyramid.StreamedImage) else []
 
 # Determine window/level if needed
 window = args.window
@@ -83,26 +111,43 @@ level = args.level
 
 # Determine if we need to autocompute the window/level
 if args.window <= 0:
+    # Get scalar range for W/L and padding. A proxy knows the range of the full image.
+    if args.sliceCache <= 0:
+        scalarRanges = inputReader.scalarRange
+    elif header is not None:
+        scalarRanges = header['scalarRange']
+    else:
+        scalarRanges = sliceCache.scalarRange(array, args.slabSize)
     window = scalarRanges[1] - scalarRanges[0]
     level = (scalarRanges[1] + scalarRanges[0])/2
 
 # Print resulting window/level
 print("Image W/L: {w}/{l}".format(w=window, l=level))
 
-# Setup input Mapper + Property -> Slice
-inputMapper = vtk.vtkOpenGLImageSliceMapper()
-inputMapper.SetInputConnection(inputReader.GetOutputPort())
-inputMapper.SliceAtFocalPointOn()
-inputMapper.SliceFacesCameraOn()
-inputMapper.BorderOn()
-inputMapper.SetNumberOfThreads(args.nThreads)
-inputMapper.StreamingOn()
-
 imageProperty = vtk.vtkImageProperty()
 imageProperty.SetColorLevel(level)
 imageProperty.SetColorWindow(window)
 imageProperty.SetInterpolationTypeToNearest()
 
+# Setup input Mapper + Property -> Slice
+if args.sliceCache > 0:
+    cache = sliceCache.SliceCache(array, spacing, origin, window, level, args.sliceCache, args.prefetch,
+        args.lower, args.upper)
+    inputMapper = vtk.vtkImageSliceMapper()
+    inputMapper.SetInputConnection(cache.GetOutputPort())
+
+    # Slices are already window/levelled to 0-255
+    imageProperty.SetColorLevel(127.5)
+    imageProperty.SetColorWindow(255)
+else:
+    inputMapper = vtk.vtkOpenGLImageSliceMapper()
+    inputMapper.SetInputConnection(inputReader.GetOutputPort())
+    inputMapper.SetNumberOfThreads(args.nThreads)
+    inputMapper.StreamingOn()
+inputMapper.SliceAtFocalPointOn()
+inputMapper.SliceFacesCameraOn()
+inputMapper.BorderOn()
+
 inputSlice = vtk.vtkImageSlice()
 inputSlice.SetMapper(inputMapper)
 inputSlice.SetProperty(imageProperty)
@@ -110,6 +155,10 @@ inputSlice.SetProperty(imageProperty)
 # Create Renderer -> RenderWindow -> RenderWindowInteractor -> InteractorStyle
 renderer = vtk.vtkRenderer()
 renderer.AddActor(inputSlice)
+if args.sliceCache > 0:
+    # The cache only holds the viewed slice, so give the renderer the volume size
+    renderer.AddActor(sliceCache.boundsActor(cache.bounds()))
+    renderer.AddObserver('StartEvent', lambda obj, event: cache.update(obj.GetActiveCamera()))
 
 renderWindow = vtk.vtkRenderWindow()
 renderWindow.AddRenderer(renderer)
@@ -125,7 +174,10 @@ interactor.SetRenderWindow(renderWindow)
 # Add some functionality to switch layers for window/level
 def layerSwitcher(obj,event):
     if str(interactor.GetKeyCode()) == 'w':
-        print("Image W/L: {w}/{l}".format(w=imageProperty.GetColorWindow(), l=imageProperty.GetColorLevel()))
+        if args.sliceCache > 0:
+            print("Image W/L: {w}/{l}".format(w=cache.window, l=cache.level))
+        else:
+            print("Image W/L: {w}/{l}".format(w=imageProperty.GetColorWindow(), l=imageProperty.GetColorLevel()))
     elif str(interactor.GetKeyCode()) == 'n':
         # Set interpolation to nearest neighbour (good for voxel visualization)
         imageProperty.SetInterpolationTypeToNearest()
@@ -138,6 +190,29 @@ def layerSwitcher(obj,event):
 # Add ability to switch between active layers
 interactor.AddObserver('KeyPressEvent', layerSwitcher, -1.0) # Call layerSwitcher as last observer
 
+# Remap the cached slices through the window/level set with the mouse
+def rewindow(obj, event):
+    # The property window/level is over the 0-255 slice values
+    lowest = cache.level - cache.window / 2.0
+    cache.setWindowLevel(cache.window * imageProperty.GetColorWindow() / 255.0,
+        lowest + cache.window * imageProperty.GetColorLevel() / 255.0)
+    imageProperty.SetColorLevel(127.5)
+    imageProperty.SetColorWindow(255)
+    interactor.Render()
+
+if args.sliceCache > 0:
+    interactorStyle.AddObserver('EndWindowLevelEvent', rewindow)
+
+# Swap in full resolution slabs as they are loaded
+def streamSlabs(obj, event):
+    if any([image.update(renderer.GetActiveCamera()) for image in streamedImages]):
+        interactor.Render()
+
+if len(streamedImages) > 0:
+    interactor.AddObserver('TimerEvent', streamSlabs)
+
 # Initialize and go
 interactor.Initialize()
+if len(streamedImages) > 0:
+    interactor.CreateRepeatingTimer(100)
 interactor.Start()
@@ -2,6 +2,13 @@
 #   2017.02.04  babesler    Created
 #   2017.04.03  babesler    Updated to overlay inputs
 #   2017.04.25  babesler    Setup standard vtkImageStack with threaded visualization
+#   2026.10.19  agent       Read regions of chunked (*.chunks) stores
+#   2026.10.19  agent       Read run-length (*.rle.npz) segmentations
+#   2026.10.19  agent       Open on proxies and stream full resolution slabs
+#   2026.10.19  agent       Read through imageReader.py
+#   2026.10.19  agent       Load both inputs at once
+#   2026.10.19  agent       Share the overlay setup through segmentationOverlay.py
+#   2026.10.19  agent       Colour the labels present and toggle them
 #
 # Description:
 #   Given two images, visualize the second image ontop of the first
@@ -9,6 +16,22 @@
 # Notes:
 #   - See http://www.vtk.org/gitweb?p=VTK.git;a=blob;f=Examples/ImageProcessing/Python/ImageSlicing.py
 #       for inspiration in creating the script
+#   - Chunked (*.chunks) inputs only read the chunks inside --lower/--upper.
+#   - A run-length (*.rle.npz) segmentation is decoded over --lower/--upper
+#       and its labels are taken from the runs instead of scanning the volume.
+#   - Images over --proxyVoxels are first shown from low resolution proxies
+#       stored next to them (see proxyPyramid.py). Full resolution slabs of
+#       --slabSize slices around the viewed slice are loaded in the
+#       background. Segmentation proxies are subsampled, not averaged.
+#   - Each label present gets its own colour (see segmentationOverlay.py).
+#       The labels come from the runs, the proxy or one pass over the image.
+#   - Key Bindings:
+#       1/2                 Set the image/segmentation as the active layer for window/level
+#       w                   Print the window/level of the image
+#       n/c                 Nearest neighbour/cubic interpolation of the image
+#       t                   Hide or show the label under the mouse
+#       i                   Hide every label but the one under the mouse
+#       a                   Show every label
 #
 # Usage:
 #   python segmentation.py greyScale segmentation
@@ -17,17 +40,11 @@
 import argparse
 import os
 import vtk
-try:
-    import vtkbone
-    vtkboneImported = True
-    vtkbonelabImported = False
-except ImportError:
-    vtkboneImported = False
-    try:
-        import vtkbonelab
-        vtkbonelabImported = True
-    except ImportError:
-        vtkbonelabImported = False
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'imageProc'))
+import sparseLabels
+import proxyPyramid
+import imageReader
+import segmentationOverlay
 
 # Setup and parse command line arguments
 parser = argparse.ArgumentParser(
@@ -40,7 +57,7 @@ parser.add_argument(
     )
 parser.add_argument(
     'inputSegmentation',
-    help='The input NIfTI segmented file'
+    help='The input NIfTI or run-length (*.rle.npz) segmented file'
     )
 parser.add_argument('--window',
                     default=float(500), type=float,
@@ -54,6 +71,18 @@ parser.add_argument('-n', '--nThreads',
 parser.add_argument('-o', '--opacity',
                     default=float(0.25), type=float,
                     help='The opacity of the segmentation between zero and one (default: %(default)s)')
+parser.add_argument('--lower',
+                    default=None, type=int, nargs=3,
+                    help='Lower (x,y,z) bound of the region read from a chunked (*.chunks) store. Reads everything if not given')
+parser.add_argument('--upper',
+                    default=None, type=int, nargs=3,
+                    help='Upper (x,y,z) bound of the region read from a chunked (*.chunks) store. Reads everything if not given')
+parser.add_argument('--proxyVoxels',
+                    default=proxyPyramid.defaultProxyVoxels, type=int,
+                    help='Largest image shown before it is fully read. Larger images open on a proxy. Zero or less always reads the full images first')
+parser.add_argument('--slabSize',
+                    default=int(64), type=int,
+                    help='Number of full resolution slices loaded around the viewed slice')
 args = parser.parse_args()
 
 # Check that the input (file or directory) exists
@@ -69,105 +98,44 @@ if args.nThreads < 1:
 if args.opacity > 1 or args.opacity < 0:
     os.sys.exit('Opaicty must be between zeor and one. Given {o}. Exiting...'.format(o=args.opacity))
 
-# Read both images
-inputReader = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputImage)
-if inputReader is None:
-    if args.inputImage.lower().endswith('.nii'):
-        inputReader = vtk.vtkNIFTIImageReader()
-    elif args.inputImage.lower().endswith('.dcm'):
-        inputReader = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputImage.lower().endswith('.aim'):
-        inputReader = vtkbone.vtkboneAIMReader()
-        inputReader.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputImage.lower().endswith('.aim'):
-        inputReader = vtkbonelab.vtkbonelabAIMReader()
-        inputReader.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputImage))
-inputReader.SetFileName(args.inputImage)
-print('Loading {}...'.format(args.inputImage))
-inputReader.Update()
-
-segReader = vtk.vtkImageReader2Factory.CreateImageReader2(args.inputSegmentation)
-if segReader is None:
-    if args.inputSegmentation.lower().endswith('.nii'):
-        segReader = vtk.vtkNIFTIImageReader()
-    elif args.inputSegmentation.lower().endswith('.dcm'):
-        segReader = vtk.vtkDICOMImageReader()
-    elif vtkboneImported and args.inputSegmentation.lower().endswith('.aim'):
-        segReader = vtkbone.vtkboneAIMReader()
-        segReader.DataOnCellsOff()
-    elif vtkbonelabImported and args.inputSegmentation.lower().endswith('.aim'):
-        segReader = vtkbonelab.vtkbonelabAIMReader()
-        segReader.DataOnCellsOff()
-    else:
-        os.sys.exit('Unable to find a reader for \"{fileName}\". Exiting...'.format(fileName=args.inputSegmentation))
-segReader.SetFileName(args.inputSegmentation)
-print('Loading {}...'.format(args.inputSegmentation))
-segReader.Update()
-
-# Get data range
-scalarRange = [int(x) for x in segReader.GetOutput().GetScalarRange()]
-if scalarRange[0] < 0:
-    os.sys.exit("Segmentation image \"{}\" has values less than zero which cannot currently be handled. Exiting...".format(args.inputSegmentation))
-nLabels = scalarRange[1]
-print("Segmented image has {} labels".format(nLabels))
-
-# Setup LUT
-segLUT = vtk.vtkLookupTable()
-segLUT.SetRange(0,nLabels)
-segLUT.SetRampToLinear()
-segLUT.SetAlphaRange(1,1) # Make it slightly transparent
-segLUT.Build()
-segLUT.SetTableValue(0, 0.0, 0.0, 0.0, 0.0 ) # Set zero to black, transparent
-
-# Setup input Mapper + Property -> Slice
-inputMapper = vtk.vtkImageResliceMapper()
-inputMapper.SetInputConnection(inputReader.GetOutputPort())
-inputMapper.SliceAtFocalPointOn()
-inputMapper.SliceFacesCameraOn()
-inputMapper.BorderOn()
-inputMapper.SetNumberOfThreads(args.nThreads)
-inputMapper.ResampleToScreenPixelsOn()
-inputMapper.StreamingOn()
-
-imageProperty = vtk.vtkImageProperty()
-imageProperty.SetColorLevel(args.level)
-imageProperty.SetColorWindow(args.window)
-imageProperty.SetLayerNumber(1)
-imageProperty.SetInterpolationTypeToNearest()
-
-inputSlice = vtk.vtkImageSlice()
-inputSlice.SetMapper(inputMapper)
-inputSlice.SetProperty(imageProperty)
-
-# Setup seg Mapper + Property -> Slice
-segImageProperty = vtk.vtkImageProperty()
-segImageProperty.SetLookupTable(segLUT)
-segImageProperty.UseLookupTableScalarRangeOn()
-segImageProperty.SetInterpolationTypeToLinear()
-segImageProperty.SetOpacity(args.opacity)
-segImageProperty.SetLayerNumber(2)
-segImageProperty.SetInterpolationTypeToNearest()
-
-segMapper = vtk.vtkImageResliceMapper()
-segMapper.SetInputConnection(segReader.GetOutputPort())
-segMapper.SliceAtFocalPointOn()
-segMapper.SliceFacesCameraOn()
-segMapper.BorderOn()
-segMapper.SetNumberOfThreads(args.nThreads)
-segMapper.ResampleToScreenPixelsOn()
-segMapper.StreamingOn()
-
-segSlice = vtk.vtkImageSlice()
-segSlice.SetProperty(segImageProperty)
-segSlice.SetMapper(segMapper)
-
-# Add everything to a vtkImageStack
-imageStack = vtk.vtkImageStack()
-imageStack.AddImage(inputSlice)
-imageStack.AddImage(segSlice)
-imageStack.SetActiveLayer(1)
+# Check slab size
+if args.slabSize < 1:
+    os.sys.exit('Slab size must be one or greater. Given {n}. Exiting...'.format(n=args.slabSize))
+
+# Read both images at once. Run-length labels are decoded here instead.
+fileNames = [args.inputImage]
+if not sparseLabels.isSparse(args.inputSegmentation):
+    fileNames.append(args.inputSegmentation)
+try:
+    readers = imageReader.openImages(fileNames, ['mean', 'sample'], args.lower, args.upper, args.nThreads,
+        args.proxyVoxels, args.slabSize)
+except ValueError as e:
+    os.sys.exit('{e}. Exiting...'.format(e=e))
+inputReader = readers[0]
+
+labels = None
+if sparseLabels.isSparse(args.inputSegmentation):
+    print('Loading {}...'.format(args.inputSegmentation))
+    segReader = vtk.vtkTrivialProducer()
+    labels = sparseLabels.load(args.inputSegmentation)
+    segReader.SetOutput(sparseLabels.toImage(labels, args.lower, args.upper))
+else:
+    segReader = readers[1]
+streamedImages = [source for source in [inputReader, segReader] if isinstance(source, proxyPyramid.StreamedImage)]
+
+# Find the labels present. A subsampled proxy can miss small labels, so these are of the full image.
+if labels is not None:
+    present = sparseLabels.presentLabels(labels)
+else:
+    present = segmentationOverlay.presentLabels(segReader)
+print("Segmented image has {n} labels: {l}".format(n=len([x for x in present if x != 0]),
+    l=' '.join([str(x) for x in present[:20] if x != 0]) + (' ...' if len(present) > 20 else '')))
+
+# Setup the image and segmentation slices in a vtkImageStack
+imageStack, imageProperty, segImageProperty = segmentationOverlay.overlayStack(
+    inputReader.GetOutputPort(), segReader.GetOutputPort(), args.window, args.level, present, args.opacity, args.nThreads)
+segLUT = segImageProperty.GetLookupTable()
+hiddenLabels = set()
 
 # Create Renderer -> RenderWindow -> RenderWindowInteractor -> InteractorStyle
 renderer = vtk.vtkRenderer()
@@ -203,10 +171,61 @@ def layerSwitcher(obj,event):
         # Set interpolation to cubic (makes a better visualization)
         imageProperty.SetInterpolationTypeToCubic()
         interactor.Render()
+    elif str(interactor.GetKeyCode()) == 't':
+        # Toggle the label under the mouse
+        label = labelAt(*interactor.GetEventPosition())
+        if label is not None:
+            setLabelsVisible([label], label in hiddenLabels)
+    elif str(interactor.GetKeyCode()) == 'i':
+        # Isolate the label under the mouse
+        label = labelAt(*interactor.GetEventPosition())
+        if label is not None:
+            setLabelsVisible([x for x in present if x not in hiddenLabels and x != label], False)
+            setLabelsVisible([label], True)
+    elif str(interactor.GetKeyCode()) == 'a':
+        # Show every label again
+        setLabelsVisible(list(hiddenLabels), True)
+
+# Label under a display position, from the segmentation slice being shown
+def labelAt(x, y):
+    camera = renderer.GetActiveCamera()
+    renderer.SetWorldPoint(list(camera.GetFocalPoint()) + [1.0])
+    renderer.WorldToDisplay()
+    renderer.SetDisplayPoint(x, y, renderer.GetDisplayPoint()[2])
+    renderer.DisplayToWorld()
+    point = renderer.GetWorldPoint()
+    image = segReader.GetOutput() if hasattr(segReader, 'GetOutput') else segReader.GetOutputDataObject(0)
+    pointId = image.FindPoint([point[i] / point[3] for i in range(3)])
+    if pointId < 0:
+        return None
+    label = image.GetPointData().GetScalars().GetTuple1(pointId)
+    return int(label) if label == int(label) else label
+
+# Show or hide labels by changing their lookup table entries only
+def setLabelsVisible(labels, visible):
+    for label in labels:
+        if label == 0 or not segmentationOverlay.setLabelVisible(segLUT, label, visible):
+            continue
+        if visible:
+            hiddenLabels.discard(label)
+        else:
+            hiddenLabels.add(label)
+    print("Hidden labels: {}".format(' '.join([str(x) for x in sorted(hiddenLabels)]) or 'none'))
+    interactor.Render()
 
 # Add ability to switch between active layers
 interactor.AddObserver('KeyPressEvent', layerSwitcher, -1.0) # Call layerSwitcher as last observer
 
+# Swap in full resolution slabs as they are loaded
+def streamSlabs(obj, event):
+    if any([image.update(renderer.GetActiveCamera()) for image in streamedImages]):
+        interactor.Render()
+
+if len(streamedImages) > 0:
+    interactor.AddObserver('TimerEvent', streamSlabs)
+
 # Initialize and go
 interactor.Initialize()
+if len(streamedImages) > 0:
+    interactor.CreateRepeatingTimer(100)
 interactor.Start()
@@ -0,0 +1,121 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Build, check and list an atlas library
+#
+# Notes:
+#   - See atlasLibrary.py for the library layout.
+#   - 'build' reads a CSV with a header of name,image,mask and optionally
+#       boneRegion,segmentation, and adds every row to the library.
+#   - Atlases in a library can be used as the moving image of
+#       QCT_RegisterROI.py with --atlasLibrary.
+#
+# Usage:
+#   python QCT_AtlasLibrary.py add atlases QCTCAL_0001_R image.nii mask.nii -b boneRegion.nii
+#   python QCT_AtlasLibrary.py build atlases atlases.csv -n 4
+#   python QCT_AtlasLibrary.py verify atlases
+#   python QCT_AtlasLibrary.py list atlases
+
+# Libraries
+import os
+import csv
+import argparse
+import atlasLibrary
+import niftiIO
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Build, check and list an atlas library',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+subparsers = parser.add_subparsers(dest='action')
+
+addParser = subparsers.add_parser('add', help='Add one atlas',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+addParser.add_argument('library', help='The library directory')
+addParser.add_argument('name', help='The atlas name')
+addParser.add_argument('image', help='The atlas NIfTI (*.nii) image')
+addParser.add_argument('mask', help='The atlas NIfTI (*.nii) mask')
+addParser.add_argument('-b', '--boneRegion', default=None, help='The atlas NIfTI (*.nii) bone region mask')
+addParser.add_argument('-s', '--segmentation', default=None, help='The atlas NIfTI (*.nii) segmentation')
+
+buildParser = subparsers.add_parser('build', help='Add every atlas in a CSV file',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+buildParser.add_argument('library', help='The library directory')
+buildParser.add_argument('atlasFile', help='CSV file with columns name,image,mask[,boneRegion,segmentation]')
+
+for subparser in [addParser, buildParser]:
+    subparser.add_argument('-l', '--levels', default=int(6), type=int,
+        help='Number of pyramid levels, matching NumberOfResolutions')
+    subparser.add_argument('-n', '--nThreads', default=1, type=int,
+        help='Number of threads')
+
+verifyParser = subparsers.add_parser('verify', help='Check the checksums of atlases',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+verifyParser.add_argument('library', help='The library directory')
+verifyParser.add_argument('names', nargs='*', help='Atlases to check (default: all)')
+
+listParser = subparsers.add_parser('list', help='List the atlases',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+listParser.add_argument('library', help='The library directory')
+args = parser.parse_args()
+
+if args.action is None:
+    parser.print_help()
+    os.sys.exit(1)
+
+# Add atlases
+if args.action in ['add', 'build']:
+    if args.levels < 1:
+        os.sys.exit('Must have atleast one level, asked for {}. Exiting...'.format(args.levels))
+    if args.nThreads < 1:
+        os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+    import SimpleITK as sitk
+    sitk.ProcessObject.SetGlobalDefaultNumberOfThreads(args.nThreads)
+
+    if args.action == 'add':
+        atlases = [{'name': args.name, 'image': args.image, 'mask': args.mask,
+            'boneRegion': args.boneRegion, 'segmentation': args.segmentation}]
+    else:
+        if not os.path.isfile(args.atlasFile):
+            os.sys.exit('Atlas file \"{}\" does not exist. Exiting...'.format(args.atlasFile))
+        with open(args.atlasFile, 'r') as f:
+            atlases = list(csv.DictReader(f))
+
+    for atlas in atlases:
+        for key in ['image', 'mask', 'boneRegion', 'segmentation']:
+            fileName = atlas.get(key) or None
+            atlas[key] = fileName
+            if fileName is None and key in ['image', 'mask']:
+                os.sys.exit('Atlas \"{}\" has no {}. Exiting...'.format(atlas['name'], key))
+            if fileName is not None and not os.path.isfile(fileName):
+                os.sys.exit('Input \"{}\" does not exist. Exiting...'.format(fileName))
+            if fileName is not None and not niftiIO.isNIFTI(fileName):
+                os.sys.exit('Input \"{}\" is not of type *.nii or *.nii.gz! Exiting...'.format(fileName))
+
+    for atlas in atlases:
+        print('Adding {} with {} pyramid levels'.format(atlas['name'], args.levels))
+        atlasLibrary.addAtlas(args.library, atlas['name'], atlas['image'], atlas['mask'],
+            atlas['boneRegion'], atlas['segmentation'], args.levels)
+
+# Check checksums
+elif args.action == 'verify':
+    manifest = atlasLibrary.readManifest(args.library)
+    names = args.names if len(args.names) > 0 else sorted(manifest['atlases'].keys())
+    nBad = 0
+    for name in names:
+        if name not in manifest['atlases']:
+            os.sys.exit('No atlas \"{}\" in \"{}\". Exiting...'.format(name, args.library))
+        bad = atlasLibrary.verifyAtlas(args.library, name, manifest)
+        print('{n}: {s}'.format(n=name, s='OK' if len(bad) == 0 else 'bad ' + ', '.join(bad)))
+        nBad += len(bad)
+    if nBad > 0:
+        os.sys.exit('{} files failed their checksum. Exiting...'.format(nBad))
+
+# List atlases
+elif args.action == 'list':
+    manifest = atlasLibrary.readManifest(args.library)
+    for name in sorted(manifest['atlases'].keys()):
+        entry = manifest['atlases'][name]
+        print('{n}: {f} ({l} pyramid levels)'.format(
+            n=name, f=', '.join(sorted(entry['files'].keys())), l=len(entry['pyramid'])))
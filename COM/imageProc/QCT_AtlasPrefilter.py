@@ -0,0 +1,165 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Rank the atlases of a library against a target with cheap descriptors
+#
+# Notes:
+#   - 'build' describes every atlas in a QCT_AtlasLibrary.py library and
+#       writes <library>/descriptors.json. The atlas bone region mask, if
+#       present, limits where bone is looked for.
+#   - 'query' describes the target the same way and prints the --top closest
+#       atlases, one per line, so they can be fed to QCT_RegisterROI.py.
+#   - See atlasDescriptors.py for the descriptors. Use split images (one
+#       femur each) for both atlases and targets.
+#   - Atlases are described on their stored pyramid level shrunk by
+#       --shrinkFactor, so building reads a fraction of the library. The
+#       target is smoothed and shrunk the same way before it is described, and
+#       region masks are resampled onto the shrunk grid.
+#
+# Usage:
+#   python QCT_AtlasPrefilter.py build atlases -t 250 -w 4
+#   python QCT_AtlasPrefilter.py query atlases target_R.nii -k 5
+#   for atlas in $(python QCT_AtlasPrefilter.py query atlases target_R.nii -k 5 -q); do
+#       python QCT_RegisterROI.py target_R.nii $atlas targetMask.nii out/$atlas -a atlases
+#   done
+
+# Libraries
+import os
+import csv
+import time
+import argparse
+from multiprocessing.pool import ThreadPool
+import SimpleITK as sitk
+import atlasLibrary
+import niftiIO
+import atlasDescriptors
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Rank atlases against a target with cheap global descriptors',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+subparsers = parser.add_subparsers(dest='action')
+
+buildParser = subparsers.add_parser('build', help='Describe every atlas in a library',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+buildParser.add_argument('library', help='The library directory')
+buildParser.add_argument('-t', '--threshold', default=atlasDescriptors.defaultSettings['threshold'], type=float,
+    help='Bone threshold')
+buildParser.add_argument('-r', '--range', default=atlasDescriptors.defaultSettings['histogramRange'], type=float, nargs=2,
+    help='Intensity histogram range')
+buildParser.add_argument('-b', '--bins', default=atlasDescriptors.defaultSettings['histogramBins'], type=int,
+    help='Number of intensity histogram bins')
+buildParser.add_argument('-s', '--shrinkFactor', default=atlasDescriptors.defaultSettings['shrinkFactor'], type=int,
+    help='Describe the pyramid level shrunk by this factor, one for the full image')
+buildParser.add_argument('-w', '--nWorkers', default=1, type=int,
+    help='Number of atlases described at once')
+
+queryParser = subparsers.add_parser('query', help='Rank the atlases against a target',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+queryParser.add_argument('library', help='The library directory')
+queryParser.add_argument('targetImage', help='The target NIfTI (*.nii) image')
+queryParser.add_argument('-m', '--mask', default=None,
+    help='NIfTI (*.nii) region mask of the target to look for bone in')
+queryParser.add_argument('-k', '--top', default=5, type=int,
+    help='Number of atlases to return')
+queryParser.add_argument('--weights', default=[1.0, 1.0, 1.0, 1.0], type=float, nargs=4,
+    help='Weights of volume, length, histogram and orientation')
+queryParser.add_argument('-o', '--outputFile', default=None,
+    help='CSV file of the full ranking')
+queryParser.add_argument('-q', '--quiet', action='store_true',
+    help='Only print the atlas names')
+args = parser.parse_args()
+
+if args.action is None:
+    parser.print_help()
+    os.sys.exit(1)
+
+# Functions
+def onGrid(mask, image):
+    '''Resample a mask onto the grid of image'''
+    if mask.GetSize() == image.GetSize() and mask.GetSpacing() == image.GetSpacing():
+        return mask
+    return sitk.Resample(mask, image, sitk.Transform(), sitk.sitkNearestNeighbor, 0, mask.GetPixelID())
+
+# Describe the library
+if args.action == 'build':
+    if args.nWorkers < 1:
+        os.sys.exit('Must have atleast one worker, asked for {}. Exiting...'.format(args.nWorkers))
+    if args.bins < 1:
+        os.sys.exit('Must have atleast one bin, asked for {}. Exiting...'.format(args.bins))
+    manifest = atlasLibrary.readManifest(args.library)
+    names = sorted(manifest['atlases'].keys())
+    if len(names) < 2:
+        os.sys.exit('Need atleast two atlases in \"{}\", found {}. Exiting...'.format(args.library, len(names)))
+
+    for name in names:
+        if args.shrinkFactor not in manifest['atlases'][name]['shrinkFactors']:
+            os.sys.exit('Atlas \"{n}\" has no pyramid level shrunk by {f}, only {a}. Exiting...'.format(
+                n=name, f=args.shrinkFactor, a=manifest['atlases'][name]['shrinkFactors']))
+
+    def describeAtlas(name):
+        files = atlasLibrary.atlasFiles(args.library, name)
+        image = atlasLibrary.readShrunkImage(args.library, name, args.shrinkFactor)
+        region = onGrid(sitk.ReadImage(files['boneRegion']), image) if 'boneRegion' in files else None
+        return atlasDescriptors.describe(image, args.threshold, region, args.range, args.bins)
+
+    pool = ThreadPool(args.nWorkers)
+    start = time.time()
+    descriptors = pool.map(describeAtlas, names)
+    pool.close()
+    pool.join()
+
+    index = {
+        'settings': {'threshold': args.threshold, 'histogramRange': args.range, 'histogramBins': args.bins,
+            'shrinkFactor': args.shrinkFactor},
+        'atlases': dict(zip(names, descriptors))}
+    index['spread'] = atlasDescriptors.spreads(index)
+    atlasDescriptors.writeIndex(args.library, index)
+    print('Described {n} atlases in {t:.1f}s'.format(n=len(names), t=time.time() - start))
+
+# Rank the library against a target
+elif args.action == 'query':
+    for fileName in [args.targetImage, args.mask]:
+        if fileName is None:
+            continue
+        if not os.path.isfile(fileName):
+            os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=fileName))
+        if not niftiIO.isNIFTI(fileName):
+            os.sys.exit('Input \"{fileName}\" is not of type *.nii or *.nii.gz! Exiting...'.format(fileName=fileName))
+    if args.top < 1:
+        os.sys.exit('Must return atleast one atlas, asked for {}. Exiting...'.format(args.top))
+    try:
+        index = atlasDescriptors.readIndex(args.library)
+    except ValueError as e:
+        os.sys.exit('{}. Run build first. Exiting...'.format(e.args[0]))
+
+    settings = index['settings']
+    start = time.time()
+    # Indices built before the pyramid was used describe full images
+    target = atlasLibrary.pyramidLevel(sitk.ReadImage(args.targetImage), settings.get('shrinkFactor', 1))
+    region = onGrid(sitk.ReadImage(args.mask), target) if args.mask is not None else None
+    try:
+        descriptor = atlasDescriptors.describe(target, settings['threshold'], region,
+            settings['histogramRange'], settings['histogramBins'])
+    except ValueError as e:
+        os.sys.exit('{m} \"{i}\". Exiting...'.format(m=e.args[0], i=args.targetImage))
+    described = time.time()
+    ranking = atlasDescriptors.rank(index, descriptor, args.weights)
+    ranked = time.time()
+
+    if args.outputFile is not None:
+        with open(args.outputFile, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Rank', 'Atlas', 'Score'])
+            for i, (name, score) in enumerate(ranking):
+                writer.writerow([i + 1, name, score])
+
+    if args.quiet:
+        for name, score in ranking[:args.top]:
+            print(name)
+    else:
+        print('Described target in {d:.1f}s, ranked {n} atlases in {r:.1f}ms'.format(
+            d=described - start, n=len(ranking), r=1000.0*(ranked - described)))
+        for i, (name, score) in enumerate(ranking[:args.top]):
+            print('\t{i}: {n} ({s:.3f})'.format(i=i + 1, n=name, s=score))
@@ -1,5 +1,6 @@
 # History:
 #   2017.04.12  babesler    Created
+#   2026.10.19  agent       Accept *.nii.gz, compressed on --nThreads threads
 #
 # Description:
 #   Mask the bone region for registration
@@ -11,6 +12,7 @@
 #   python QCT_BoneRegion.py input output lower upper
 
 import vtk
+import niftiIO
 import argparse
 import os
 
@@ -41,8 +43,8 @@ if not os.path.isfile(args.inputImage):
 
 # Check that output does not exist, or we can over write
 for fileName in [args.inputImage, args.outputImage]:
-    if not fileName.lower().endswith('.nii'):
-        os.sys.exit('Output file \"{outputImage}\" is not a .nii file. Exiting...'.format(outputImage=fileName))
+    if not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Output file \"{outputImage}\" is not a .nii or .nii.gz file. Exiting...'.format(outputImage=fileName))
 if os.path.isfile(args.outputImage):
     if not args.force:
         answer = raw_input('Output file \"{outputImage}\" exists. Overwrite? [Y/n]'.format(outputImage=args.outputImage))
@@ -118,7 +120,6 @@ math2.Update()
 
 # Writer
 writer = vtk.vtkNIFTIImageWriter()
-writer.SetFileName(args.outputImage)
 writer.SetInputConnection(math2.GetOutputPort())
 print("Writing to {}".format(args.outputImage))
-writer.Update()
+niftiIO.writeNIFTI(writer, args.outputImage, args.nThreads, mask=True)
@@ -0,0 +1,109 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Convert between NIfTI images and chunked stores
+#
+# Notes:
+#   - The direction is taken from the file names: a NIfTI (*.nii, *.nii.gz)
+#       input is written as a chunked (*.chunks) store and a store is written
+#       as NIfTI.
+#   - Uncompressed NIfTI is memory mapped and converted one slab of chunks
+#       at a time, so the whole image is never in memory.
+#   - NIfTI written from a store has no qform/sform, like the other scripts
+#       that write through vtkNIFTIImageWriter.
+#   - See chunkedStore.py for the store layout.
+#
+# Usage:
+#   python QCT_ChunkConvert.py image.nii image.chunks -c 64 64 64 -n 4
+#   python QCT_ChunkConvert.py image.chunks image.nii.gz -n 4
+
+# Libraries
+import os
+import argparse
+import vtk
+import niftiIO
+import chunkedStore
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Convert between NIfTI images and chunked stores',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'inputImage',
+    help='The input NIfTI (*.nii, *.nii.gz) image or chunked (*.chunks) store')
+parser.add_argument(
+    'outputImage',
+    help='The output chunked (*.chunks) store or NIfTI (*.nii, *.nii.gz) image')
+parser.add_argument(
+    '-c', '--chunkSize',
+    default=list(chunkedStore.defaultChunkSize), type=int, nargs=3,
+    help='Chunk size on (x,y,z)')
+parser.add_argument(
+    '-l', '--level',
+    default=int(1), type=int,
+    help='zlib compression level of the chunks (1 to 9)')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads')
+parser.add_argument(
+    '-f', '--force',
+    action='store_true',
+    help='Set to overwrite output without asking')
+args = parser.parse_args()
+
+# Check that the input exists
+if not os.path.exists(args.inputImage):
+    os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=args.inputImage))
+
+# Check the conversion direction
+if niftiIO.isNIFTI(args.inputImage) and chunkedStore.isChunked(args.outputImage):
+    toChunks = True
+elif chunkedStore.isChunked(args.inputImage) and niftiIO.isNIFTI(args.outputImage):
+    toChunks = False
+else:
+    os.sys.exit('Can only convert *.nii or *.nii.gz to *.chunks or back, given \"{i}\" and \"{o}\". Exiting...'.format(
+        i=args.inputImage, o=args.outputImage))
+
+# Check the options
+for size in args.chunkSize:
+    if size < 1:
+        os.sys.exit('Chunk size must be one or greater, given {}. Exiting...'.format(args.chunkSize))
+if args.level < 1 or args.level > 9:
+    os.sys.exit('Compression level must be in [1,9], given {}. Exiting...'.format(args.level))
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
+# Only ever replace a chunked store, which chunkedStore.createStore does
+if toChunks and os.path.exists(args.outputImage) and \
+        not os.path.isfile(os.path.join(args.outputImage, chunkedStore.headerName)):
+    os.sys.exit('Output "{}" exists and is not a chunked store. Exiting...'.format(args.outputImage))
+
+# Make sure we don't overwrite
+if os.path.exists(args.outputImage):
+    if not args.force:
+        response = str(raw_input('"{outputFilename}" exists. Overwrite? [Y/n]'.format(outputFilename=args.outputImage)))
+        if not 'yes'.startswith(response.lower()):
+            os.sys.exit('Exiting to avoid overwrite...')
+
+# Convert
+if toChunks:
+    print('Reading in \"{}\"'.format(args.inputImage))
+    try:
+        array, reader = niftiIO.readNIFTI(args.inputImage)
+    except ValueError as e:
+        os.sys.exit('{e}. Exiting...'.format(e=e))
+    print('Writing {d} in {c} chunks to \"{o}\"'.format(d=array.shape[::-1], c=args.chunkSize, o=args.outputImage))
+    chunkedStore.writeArray(array, args.outputImage, reader.GetDataSpacing(), reader.GetDataOrigin(),
+        args.chunkSize, args.level, args.nThreads)
+else:
+    print('Reading in \"{}\"'.format(args.inputImage))
+    try:
+        image = chunkedStore.readImage(args.inputImage, nThreads=args.nThreads)
+    except ValueError as e:
+        os.sys.exit('{e}. Exiting...'.format(e=e))
+    writer = vtk.vtkNIFTIImageWriter()
+    writer.SetInputData(image)
+    print('Writing {d} to \"{o}\"'.format(d=image.GetDimensions(), o=args.outputImage))
+    niftiIO.writeNIFTI(writer, args.outputImage, args.nThreads)
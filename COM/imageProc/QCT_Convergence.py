@@ -0,0 +1,204 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Summarize elastix convergence from IterationInfo files
+#
+# Notes:
+#   - Reads every IterationInfo.<parameter>.R<level>.txt in each elastix
+#       output directory. Elastix only writes these files when it is run with
+#       an output directory, which QCT_RegisterROI.py always does.
+#   - The metric is smoothed with a moving average of --window iterations.
+#       A level has converged at the first iteration after which the smoothed
+#       metric stays within --tolerance of the total improvement of its final
+#       value. The recommended budget for a level is the largest converged
+#       iteration over all directories.
+#   - Time per level is the sum of the Time[ms] column.
+#   - Plotting needs matplotlib, which is only imported if --plot is given.
+#
+# Usage:
+#   python QCT_Convergence.py out/*/ -o summary.csv -p convergence.png -t 0.01
+
+# Libraries
+import os
+import re
+import csv
+import glob
+import argparse
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Summarize elastix convergence and recommend iteration budgets',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'elastixDirectories',
+    nargs='+',
+    help='Elastix output directories')
+parser.add_argument(
+    '-o', '--outputFile',
+    default=None,
+    help='CSV file of per-level statistics, defaults to standard out with the recommendations on standard error')
+parser.add_argument(
+    '-i', '--iterationsFile',
+    default=None,
+    help='CSV file of every iteration, for plotting elsewhere')
+parser.add_argument(
+    '-p', '--plot',
+    default=None,
+    help='Image file of metric against iteration for every level')
+parser.add_argument(
+    '-t', '--tolerance',
+    default=float(0.01), type=float,
+    help='Fraction of the total metric improvement still allowed at convergence')
+parser.add_argument(
+    '-w', '--window',
+    default=int(50), type=int,
+    help='Moving average window in iterations')
+args = parser.parse_args()
+
+# Check the inputs
+for directory in args.elastixDirectories:
+    if not os.path.isdir(directory):
+        os.sys.exit('Input directory \"{}\" does not exist. Exiting...'.format(directory))
+if args.tolerance <= 0 or args.tolerance >= 1:
+    os.sys.exit('Tolerance must be in (0,1), given {}. Exiting...'.format(args.tolerance))
+if args.window < 1:
+    os.sys.exit('Window must be one or greater, given {}. Exiting...'.format(args.window))
+
+# Functions
+iterationInfoPattern = re.compile(r'IterationInfo\.(\d+)\.R(\d+)\.txt$')
+
+def readIterationInfo(fileName):
+    '''Return (metric, timeMs) lists from an IterationInfo file'''
+    metric = []
+    timeMs = []
+    with open(fileName, 'r') as f:
+        header = f.readline().split()
+        metricColumn = [i for i, name in enumerate(header) if name.endswith('Metric')]
+        if len(metricColumn) == 0:
+            os.sys.exit('No metric column in \"{}\". Exiting...'.format(fileName))
+        metricColumn = metricColumn[0]
+        timeColumn = [i for i, name in enumerate(header) if name.startswith('Time[ms]')]
+        for line in f:
+            values = line.split()
+            if len(values) < len(header):
+                continue
+            metric.append(float(values[metricColumn]))
+            timeMs.append(float(values[timeColumn[0]]) if len(timeColumn) > 0 else 0.0)
+    return metric, timeMs
+
+def movingAverage(values, window):
+    '''Trailing moving average, shorter at the start'''
+    averages = []
+    total = 0.0
+    for i, value in enumerate(values):
+        total += value
+        if i >= window:
+            total -= values[i - window]
+        averages.append(total / min(i + 1, window))
+    return averages
+
+def convergedIteration(metric, window, tolerance):
+    '''Number of iterations until the smoothed metric stays near its final value.
+
+    This counts the converged iteration itself, so it can be used as
+    MaximumNumberOfIterations as is.'''
+    if len(metric) == 0:
+        return 0
+    smoothed = movingAverage(metric, window)
+    final = smoothed[-1]
+    allowed = tolerance * abs(final - smoothed[0])
+    converged = len(smoothed) - 1
+    for i in range(len(smoothed) - 1, -1, -1):
+        if abs(smoothed[i] - final) > allowed:
+            break
+        converged = i
+    return converged + 1
+
+# Read every level of every run
+levels = []
+for directory in args.elastixDirectories:
+    for fileName in sorted(glob.glob(os.path.join(directory, 'IterationInfo.*.R*.txt'))):
+        match = iterationInfoPattern.search(fileName)
+        if match is None:
+            continue
+        metric, timeMs = readIterationInfo(fileName)
+        levels.append({
+            'Directory': directory,
+            'Parameters': int(match.group(1)),
+            'Level': int(match.group(2)),
+            'Metric': metric,
+            'TimeMs': timeMs})
+if len(levels) == 0:
+    os.sys.exit('No IterationInfo files found. Exiting...')
+
+# Summarize each level
+fields = ['Directory', 'Parameters', 'Level', 'Iterations', 'InitialMetric', 'FinalMetric',
+    'ConvergedIteration', 'TotalTime[s]', 'TimePerIteration[ms]']
+rows = []
+for level in levels:
+    metric, timeMs = level['Metric'], level['TimeMs']
+    rows.append({
+        'Directory': level['Directory'],
+        'Parameters': level['Parameters'],
+        'Level': level['Level'],
+        'Iterations': len(metric),
+        'InitialMetric': metric[0] if len(metric) > 0 else '',
+        'FinalMetric': metric[-1] if len(metric) > 0 else '',
+        'ConvergedIteration': convergedIteration(metric, args.window, args.tolerance),
+        'TotalTime[s]': sum(timeMs) / 1000.0,
+        'TimePerIteration[ms]': sum(timeMs) / max(len(timeMs), 1)})
+
+if args.outputFile is None:
+    writer = csv.DictWriter(os.sys.stdout, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(rows)
+else:
+    with open(args.outputFile, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+if args.iterationsFile is not None:
+    with open(args.iterationsFile, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Directory', 'Parameters', 'Level', 'Iteration', 'Metric', 'Time[ms]'])
+        for level in levels:
+            for i in range(len(level['Metric'])):
+                writer.writerow([level['Directory'], level['Parameters'], level['Level'], i,
+                    level['Metric'][i], level['TimeMs'][i]])
+
+# Recommend a budget per parameter file and level. Keep standard out to the
+# CSV if it went there.
+report = os.sys.stdout if args.outputFile is not None else os.sys.stderr
+report.write('Recommended MaximumNumberOfIterations (tolerance {t}, window {w}):\n'.format(t=args.tolerance, w=args.window))
+budgets = {}
+for row in rows:
+    key = (row['Parameters'], row['Level'])
+    budgets.setdefault(key, []).append(row)
+for key in sorted(budgets.keys()):
+    group = budgets[key]
+    recommended = max([row['ConvergedIteration'] for row in group])
+    used = max([row['Iterations'] for row in group])
+    timeSaved = sum([(row['Iterations'] - recommended) * row['TimePerIteration[ms]'] for row in group if row['Iterations'] > recommended]) / 1000.0
+    report.write('\tParameters {p} level {l}: {r} of {u} iterations ({n} runs, {s:.1f}s saved)\n'.format(
+        p=key[0], l=key[1], r=recommended, u=used, n=len(group), s=timeSaved))
+
+# Plot metric against iteration
+if args.plot is not None:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    keys = sorted(budgets.keys())
+    figure, axes = plt.subplots(len(keys), 1, figsize=(8, 3*len(keys)), squeeze=False)
+    for axis, key in zip(axes[:, 0], keys):
+        for level in levels:
+            if (level['Parameters'], level['Level']) == key:
+                axis.plot(level['Metric'], linewidth=0.5)
+        axis.axvline(max([row['ConvergedIteration'] for row in budgets[key]]), color='k', linestyle='--')
+        axis.set_title('Parameters {} level {}'.format(key[0], key[1]))
+        axis.set_xlabel('Iteration')
+        axis.set_ylabel('Metric')
+    figure.tight_layout()
+    figure.savefig(args.plot)
+    report.write('Wrote plot to {}\n'.format(args.plot))
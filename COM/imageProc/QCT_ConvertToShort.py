@@ -1,5 +1,6 @@
 # History:
 #   2017.04.06  babesler    Created
+#   2026.10.19  agent       Accept *.nii.gz, compressed on --nThreads threads
 #
 # Description:
 #   Convert an image to short. This is needed for Elastix
@@ -13,6 +14,7 @@
 #   python QCT_ConvertToShort.py input output
 
 import vtk
+import niftiIO
 import argparse
 import os
 
@@ -23,6 +25,9 @@ parser.add_argument('inputImage',
                     help='The input NIfTI (*.nii) image)')
 parser.add_argument('outputImage',
                     help='The output NIfTI (*.nii) image)')
+parser.add_argument('-n', '--nThreads',
+                    default=1, type=int,
+                    help='Number of threads used to compress *.nii.gz output')
 parser.add_argument('-f', '--force',
                     action='store_true',
                     help='Set to overwrite output without asking')
@@ -34,8 +39,8 @@ if not os.path.isfile(args.inputImage):
 
 # Check that output does not exist, or we can over write
 for fileName in [args.inputImage, args.outputImage]:
-    if not fileName.lower().endswith('.nii'):
-        os.sys.exit('Output file \"{outputImage}\" is not a .nii file. Exiting...'.format(outputImage=fileName))
+    if not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Output file \"{outputImage}\" is not a .nii or .nii.gz file. Exiting...'.format(outputImage=fileName))
 if os.path.isfile(args.outputImage):
     if not args.force:
         answer = raw_input('Output file \"{outputImage}\" exists. Overwrite? [Y/n]'.format(outputImage=args.outputImage))
@@ -43,6 +48,10 @@ if os.path.isfile(args.outputImage):
             os.sys.exit('Will not overwrite \"{inputFile}\". Exiting...'.
             format(inputFile=args.outputImage))
 
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
 # Set reader
 reader = vtk.vtkNIFTIImageReader()
 reader.SetFileName(args.inputImage)
@@ -69,7 +78,6 @@ caster.Update()
 
 # Writer
 writer = vtk.vtkNIFTIImageWriter()
-writer.SetFileName(args.outputImage)
 writer.SetInputConnection(caster.GetOutputPort())
 print("Writing to {}".format(args.outputImage))
-writer.Update()
+niftiIO.writeNIFTI(writer, args.outputImage, args.nThreads, mask=True)
@@ -0,0 +1,311 @@
+# History:
+#   2026.10.19  agent       Created
+#   2026.10.19  agent       Fixed space grid on the moving image, inverted over its whole domain
+#
+# Description:
+#   Sample an Elastix transform on grid lines and measure its Jacobian determinant
+#
+# Notes:
+#   - Replaces generateGrid.py followed by transformix. Instead of warping a
+#       full size grid image, the transform is evaluated only at points along
+#       grid lines, which are written as polylines (*.vtp) for overlayGrid.py.
+#       Lines run along each axis every --gridSpacing voxels, sampled every
+#       --step voxels along the line.
+#   - The points of each line direction form a small lattice, so the
+#       transform is evaluated by TransformToDisplacementField on nThreads
+#       threads.
+#   - With --space moving the lattice is on the output grid of the transform
+#       (the fixed image) and each point x is drawn at T(x), over the moving
+#       image. With --space fixed (the default) the lattice is on the grid of
+#       --movingImage, like a grid image from generateGrid.py, and drawn
+#       through the inverse of T over the registered result, like that grid
+#       image warped by transformix.
+#   - The inverse is computed from the displacement on a lattice --coarsen
+#       times coarser than the fixed image, so it is only as fine as that.
+#       The lattice is grown to cover both the fixed image and where T maps
+#       it, so the moving image can lie anywhere. Points of the moving grid
+#       that map outside the fixed image are not in the registered result and
+#       are dropped, splitting their lines, and the number dropped is printed.
+#   - Points are written in the VTK coordinates of referenceImage, the image
+#       the grid is drawn over, as the viewers read it. The cell array Axis
+#       gives the axis each line runs along and the field array LineSpacing
+#       gives the distance between lines.
+#   - The Jacobian determinant of the transform is computed on a lattice
+#       --coarsen times coarser than the output grid. Its minimum, maximum,
+#       mean, standard deviation, 1st and 99th percentiles and the fraction of
+#       folded (not positive) points are written like QCT_Metrics.py.
+#
+# Usage:
+#   python QCT_DeformationGrid.py TransformParameters.1.txt result.0.nii grid.vtp --movingImage atlas.nii
+#   python QCT_DeformationGrid.py TransformParameters.1.txt atlas.nii grid.vtp --space moving -o jacobian.csv
+
+# Libraries
+import os
+import argparse
+import numpy
+import vtk
+from vtk.util import numpy_support
+import SimpleITK as sitk
+import elastixTransforms
+import niftiIO
+
+# Setup and parse command line arguments
+parser = argparse.ArgumentParser(
+    description='Sample an Elastix transform on grid lines and measure its Jacobian determinant',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'transformParameters',
+    help='The last TransformParameters.*.txt written by elastix')
+parser.add_argument(
+    'referenceImage',
+    help='The NIfTI (*.nii or *.nii.gz) image the grid is drawn over')
+parser.add_argument(
+    'outputGrid',
+    help='The output grid lines (*.vtp)')
+parser.add_argument(
+    '-s', '--space',
+    default='fixed', choices=['fixed', 'moving'],
+    help='Draw the grid over the registered result (fixed) or the moving image (moving)')
+parser.add_argument(
+    '-m', '--movingImage',
+    default=None,
+    help='The moving NIfTI (*.nii or *.nii.gz) image the grid is laid on. Needed for --space fixed')
+parser.add_argument(
+    '-g', '--gridSpacing',
+    default=[10, 10, 10], type=int, nargs=3,
+    help='The grid spacing in units of pixels')
+parser.add_argument(
+    '--step',
+    default=int(2), type=int,
+    help='Pixels between samples along each grid line')
+parser.add_argument(
+    '-c', '--coarsen',
+    default=int(4), type=int,
+    help='Pixels between points of the Jacobian (and inverse) lattice')
+parser.add_argument(
+    '-o', '--outputFile',
+    default=None,
+    help='The output text file for the Jacobian statistics, defaults to standard out if nothing given')
+parser.add_argument(
+    '-d', '--delimiter',
+    default=',', type=str,
+    help='The delimiter of the Jacobian statistics')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads')
+parser.add_argument(
+    '-f', '--force',
+    action='store_true',
+    help='Set to overwrite output without asking')
+args = parser.parse_args()
+
+# Constants for formatting the output string
+template='{Transform}{del}{Space}{del}{Minimum}{del}{Maximum}{del}{Mean}{del}{StandardDeviation}{del}{Percentile1}{del}{Percentile99}{del}{FoldingFraction}\n'.replace('{del}', args.delimiter)
+header=template.replace('{','').replace('}','')
+
+# Check inputs
+if args.space == 'fixed' and args.movingImage is None:
+    os.sys.exit('A grid over the registered result needs the --movingImage it is laid on. Exiting...')
+images = [args.referenceImage] + ([args.movingImage] if args.space == 'fixed' else [])
+for fileName in [args.transformParameters] + images:
+    if not os.path.isfile(fileName):
+        os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=fileName))
+for fileName in images:
+    if not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Input \"{fileName}\" is not of type *.nii or *.nii.gz! Exiting...'.format(fileName=fileName))
+if not args.outputGrid.lower().endswith('.vtp'):
+    os.sys.exit('Output \"{fileName}\" is not of type *.vtp! Exiting...'.format(fileName=args.outputGrid))
+if os.path.isfile(args.outputGrid):
+    if not args.force:
+        response = str(raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=args.outputGrid)))
+        if not 'yes'.startswith(response.lower()):
+            os.sys.exit('Exiting to avoid overwrite...')
+
+# Check arguments
+for spacing in args.gridSpacing:
+    if spacing < 1:
+        os.sys.exit('Grid spacing must be an integer greater than zero. Given {}. Exiting...'.format(spacing))
+if args.step < 1 or args.coarsen < 1:
+    os.sys.exit('Step and coarsen must be one or greater. Given {s} and {c}. Exiting...'.format(s=args.step, c=args.coarsen))
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+sitk.ProcessObject.SetGlobalDefaultNumberOfThreads(args.nThreads)
+
+# Functions
+def lattice(grid, steps):
+    '''Return (size, origin, spacing, direction) of the points of grid every steps pixels'''
+    size = [(n - 1) // s + 1 for n, s in zip(grid['Size'], steps)]
+    spacing = [x * s for x, s in zip(grid['Spacing'], steps)]
+    return size, list(grid['Origin']), spacing, list(grid['Direction'])
+
+def imageGrid(fileName):
+    '''Return a dict of the grid (Size, Spacing, Origin, Direction) of an image file, read from its header'''
+    info = sitk.ImageFileReader()
+    info.SetFileName(fileName)
+    info.ReadImageInformation()
+    return {'Size': list(info.GetSize()), 'Spacing': list(info.GetSpacing()),
+        'Origin': list(info.GetOrigin()), 'Direction': list(info.GetDirection())}
+
+def coveringLattice(grid, steps, points):
+    '''Return lattice(grid, steps) grown to cover points, a cell beyond them'''
+    size, origin, spacing, direction = lattice(grid, steps)
+    direction3 = numpy.reshape(direction, (3, 3))
+    local = (numpy.reshape(points, (-1, 3)) - origin).dot(numpy.linalg.inv(direction3).T)
+    lower = numpy.minimum(local.min(axis=0), 0) - spacing
+    upper = numpy.maximum(local.max(axis=0), (numpy.array(size) - 1) * spacing) + spacing
+    size = [int(n) for n in numpy.ceil((upper - lower) / spacing) + 1]
+    return size, list(origin + direction3.dot(lower)), spacing, direction
+
+def insideGrid(points, grid):
+    '''True for points, a [..., 3] array, inside the voxels of grid'''
+    direction = numpy.reshape(grid['Direction'], (3, 3))
+    index = (points - grid['Origin']).dot(numpy.linalg.inv(direction).T) / grid['Spacing']
+    return numpy.all((index >= -0.5) & (index <= numpy.array(grid['Size']) - 0.5), axis=-1)
+
+def latticePoints(size, origin, spacing, direction):
+    '''Physical points of a lattice as a [z,y,x,3] array'''
+    indices = numpy.stack(numpy.meshgrid(*[numpy.arange(n) * s for n, s in zip(size[::-1], spacing[::-1])],
+        indexing='ij')[::-1], axis=-1)
+    return indices.dot(numpy.reshape(direction, (3, 3)).T) + origin
+
+def displacement(transform, size, origin, spacing, direction):
+    '''Displacement of transform at every point of a lattice as a [z,y,x,3] array'''
+    field = sitk.TransformToDisplacementField(transform, sitk.sitkVectorFloat64, size, origin, spacing, direction)
+    return sitk.GetArrayFromImage(field)
+
+def toVTK(points, fileName):
+    '''Map physical (ITK) points into the VTK coordinates of a NIfTI image as read by the viewers'''
+    info = sitk.ImageFileReader()
+    info.SetFileName(fileName)
+    info.ReadImageInformation()
+    reader = niftiIO.readLayout(fileName)[0]
+
+    # Continuous ITK index, then VTK index, which reverses the slices when qfac is negative
+    direction = numpy.reshape(info.GetDirection(), (3, 3))
+    index = (points - info.GetOrigin()).dot(numpy.linalg.inv(direction).T) / info.GetSpacing()
+    if reader.GetQFac() < 0:
+        index[..., 2] = info.GetSize()[2] - 1 - index[..., 2]
+    return numpy.array(reader.GetDataOrigin()) + index * reader.GetDataSpacing()
+
+# Parse the transform once
+print('Reading transform \"{}\"'.format(args.transformParameters))
+try:
+    transform, grid = elastixTransforms.readTransform(args.transformParameters)
+except (ValueError, KeyError, IOError) as e:
+    os.sys.exit('Unable to read transform: {e}. Exiting...'.format(e=e))
+
+# Displacement and Jacobian determinant on the coarse lattice
+coarse = lattice(grid, [args.coarsen]*3)
+print('Computing the Jacobian determinant on a {} lattice'.format(coarse[0]))
+coarseField = sitk.TransformToDisplacementField(transform, sitk.sitkVectorFloat64, *coarse)
+jacobian = sitk.GetArrayFromImage(sitk.DisplacementFieldJacobianDeterminant(coarseField))
+
+# Lines are drawn at T(x) over the moving image, or at the inverse of T over the result
+lineGrid = grid
+if args.space == 'fixed':
+    lineGrid = imageGrid(args.movingImage)
+
+    # Invert over the fixed image and everywhere T maps it, so every moving point in the result has an inverse
+    mapped = latticePoints(*coarse) + sitk.GetArrayFromImage(coarseField)
+    covering = coveringLattice(grid, [args.coarsen]*3, mapped)
+    print('Inverting the displacement on a {} lattice'.format(covering[0]))
+    inverse = sitk.InvertDisplacementField(
+        sitk.TransformToDisplacementField(transform, sitk.sitkVectorFloat64, *covering),
+        enforceBoundaryCondition=False)
+    transform = sitk.DisplacementFieldTransform(inverse)
+
+# Sample the transform along the lines of each axis
+points = []
+lengths = []
+axes = []
+dropped = 0
+for axis in range(3):
+    steps = list(args.gridSpacing)
+    steps[axis] = args.step
+    size, origin, spacing, direction = lattice(lineGrid, steps)
+    print('Sampling {n} lines along axis {a}'.format(n=numpy.prod(size) // size[axis], a=axis))
+    warped = latticePoints(size, origin, spacing, direction) + displacement(transform, size, origin, spacing, direction)
+
+    # One row per line, the points along it in order
+    warped = numpy.moveaxis(warped, 2 - axis, 2).reshape(-1, size[axis], 3)
+    if args.space == 'fixed':
+        inside = insideGrid(warped, grid)
+    else:
+        inside = numpy.ones(warped.shape[:2], dtype=bool)
+    dropped += int(inside.size - inside.sum())
+
+    # Split lines where they leave the registered result
+    for line, keep in zip(warped, inside):
+        edges = numpy.flatnonzero(numpy.diff(numpy.concatenate([[0], keep.astype(numpy.int8), [0]])))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            if stop - start > 1:
+                points.append(line[start:stop])
+                lengths.append(stop - start)
+                axes.append(axis)
+if dropped > 0:
+    print('Dropped {d} of {n} grid points outside the registered result'.format(
+        d=dropped, n=dropped + sum(lengths)))
+if len(lengths) == 0:
+    os.sys.exit('No grid lines fall inside the registered result. Exiting...')
+
+# Build the polylines
+points = toVTK(numpy.concatenate(points), args.referenceImage)
+offsets = numpy.concatenate([[0], numpy.cumsum(lengths)])
+lines = vtk.vtkCellArray()
+lines.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+    numpy_support.numpy_to_vtkIdTypeArray(numpy.arange(offsets[-1]), deep=True))
+polyData = vtk.vtkPolyData()
+polyData.SetPoints(vtk.vtkPoints())
+polyData.GetPoints().SetData(numpy_support.numpy_to_vtk(points.astype(numpy.float32), deep=True))
+polyData.SetLines(lines)
+axisArray = numpy_support.numpy_to_vtk(numpy.array(axes, numpy.uint8), deep=True, array_type=vtk.VTK_UNSIGNED_CHAR)
+axisArray.SetName('Axis')
+polyData.GetCellData().AddArray(axisArray)
+lineSpacing = numpy_support.numpy_to_vtk(numpy.array(
+    [[s * x for s, x in zip(args.gridSpacing, lineGrid['Spacing'])]], numpy.float64), deep=True)
+lineSpacing.SetName('LineSpacing')
+polyData.GetFieldData().AddArray(lineSpacing)
+
+print('Writing {n} lines to {f}'.format(n=lines.GetNumberOfCells(), f=args.outputGrid))
+writer = vtk.vtkXMLPolyDataWriter()
+writer.SetFileName(args.outputGrid)
+writer.SetInputData(polyData)
+writer.SetDataModeToAppended()
+writer.SetCompressorTypeToZLib()
+writer.Write()
+
+# Create the file writer
+if args.outputFile is None:
+    statsWriter = os.sys.stdout
+    statsWriter.write(header)
+else:
+    # See if the file exists already. If not, write header
+    if os.path.isfile(args.outputFile):
+        try:
+            statsWriter = open(args.outputFile, 'a')
+        except IOError:
+            os.sys.exit('Unable to open file {} for appending. Exiting...'.format(args.outputFile))
+    else:
+        try:
+            statsWriter = open(args.outputFile, 'w')
+            statsWriter.write(header)
+        except IOError:
+            os.sys.exit('Unable to open file {} for writing. Exiting...'.format(args.outputFile))
+
+# Write results
+statsWriter.write(template.format(
+    Transform=args.transformParameters,
+    Space=args.space,
+    Minimum=jacobian.min(),
+    Maximum=jacobian.max(),
+    Mean=jacobian.mean(),
+    StandardDeviation=jacobian.std(),
+    Percentile1=numpy.percentile(jacobian, 1),
+    Percentile99=numpy.percentile(jacobian, 99),
+    FoldingFraction=numpy.mean(jacobian <= 0)
+))
+
+# Clean up
+if statsWriter is not os.sys.stdout:
+    statsWriter.close()
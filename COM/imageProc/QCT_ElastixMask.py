@@ -0,0 +1,227 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Prepare a mask for the Elastix RandomSparseMask sampler in a single pass
+#
+# Notes:
+#   - Replaces running QCT_SmoothHandFix.py and then QCT_ConvertToShort.py.
+#       The largest component, closing and background fill are the same as
+#       QCT_SmoothHandFix.py, but the two vtkImageMathematics and the
+#       vtkImageCast are fused into one vtkImageThreshold writing short.
+#   - The mask header must match the fixed image (extent, spacing, origin and
+#       the qform/sform matrices when present), otherwise Elastix would sample
+#       the wrong voxels.
+#   - If the input is already a short image with one foreground value and a
+#       single connected component, no filtering is done. The input is copied
+#       to the output instead.
+#
+# Usage:
+#   python QCT_ElastixMask.py mask.nii fixed.nii output.nii -k 3 -n 4
+
+# Libraries
+import os
+import shutil
+import argparse
+import vtk
+import numpy
+from vtk.util import numpy_support
+import niftiIO
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Make a short, single component mask for Elastix',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'inputFilename',
+    help='The input mask NIfTI (*.nii) file name')
+parser.add_argument(
+    'fixedFilename',
+    help='The fixed NIfTI (*.nii) image the mask will be used with')
+parser.add_argument(
+    'outputFilename',
+    help='The output NIfTI (*.nii) file name')
+parser.add_argument(
+    '-k', '--kernelSize',
+    default=int(3), type=int,
+    help='Kernel size of the closing')
+parser.add_argument(
+    '-v', '--value',
+    default=int(1), type=int,
+    help='Foreground value of the output mask')
+parser.add_argument(
+    '-t', '--tolerance',
+    default=float(1e-4), type=float,
+    help='Tolerance when comparing spacing and origin to the fixed image')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads')
+parser.add_argument(
+    '-f', '--force',
+    action='store_true',
+    help='Set to overwrite output without asking')
+args = parser.parse_args()
+
+# Check that the input files exist
+for filename in [args.inputFilename, args.fixedFilename]:
+    if not os.path.isfile(filename):
+        os.sys.exit('Input \"{filename}\" does not exist! Exiting...'.format(filename=filename))
+
+for filename in [args.inputFilename, args.fixedFilename, args.outputFilename]:
+    # Check that our output is of type NIfTI
+    if not niftiIO.isNIFTI(filename):
+        os.sys.exit('File \"{filename}\" is not of type *.nii or *.nii.gz! Exiting...'.format(filename=filename))
+
+# Make sure we don't overwrite
+if os.path.isfile(args.outputFilename):
+    if not args.force:
+        response = str(raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=args.outputFilename)))
+        if not 'yes'.startswith(response.lower()):
+            os.sys.exit('Exiting to avoid overwrite...')
+
+# Check kernel size
+if args.kernelSize < 1:
+    os.sys.exit('Kernel size must be one or greater. Exiting...')
+
+# Check the output value fits in a short
+if args.value < 1 or args.value > 32767:
+    os.sys.exit('Foreground value must be in [1,32767], given {}. Exiting...'.format(args.value))
+
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
+# Functions
+def sameMatrix(matrix1, matrix2, tolerance):
+    '''Compare two vtkMatrix4x4, where None only matches None'''
+    if matrix1 is None or matrix2 is None:
+        return matrix1 is None and matrix2 is None
+    for i in range(4):
+        for j in range(4):
+            if abs(matrix1.GetElement(i, j) - matrix2.GetElement(i, j)) > tolerance:
+                return False
+    return True
+
+def isElastixMask(image):
+    '''True if image is a short with one foreground value in one component'''
+    if image.GetScalarType() != vtk.VTK_SHORT or image.GetNumberOfScalarComponents() != 1:
+        return False
+    scalarRange = image.GetScalarRange()
+    if scalarRange[0] != 0 or scalarRange[1] <= 0:
+        return False
+
+    array = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+    if numpy.count_nonzero((array != 0) & (array != scalarRange[1])) > 0:
+        return False
+
+    components = vtk.vtkImageConnectivityFilter()
+    components.SetInputData(image)
+    components.SetExtractionModeToAllRegions()
+    components.SetScalarRange(scalarRange[1], scalarRange[1])
+    components.Update()
+    return components.GetNumberOfExtractedRegions() == 1
+
+# Check geometry against the fixed image. Only the header is read.
+fixedReader = vtk.vtkNIFTIImageReader()
+fixedReader.SetFileName(args.fixedFilename)
+fixedReader.UpdateInformation()
+
+reader = vtk.vtkNIFTIImageReader()
+reader.SetFileName(args.inputFilename)
+reader.UpdateInformation()
+
+print('Checking geometry against \"{}\"'.format(args.fixedFilename))
+if tuple(reader.GetDataExtent()) != tuple(fixedReader.GetDataExtent()):
+    os.sys.exit('Mask extent {} does not match fixed extent {}. Exiting...'.format(
+        reader.GetDataExtent(), fixedReader.GetDataExtent()))
+for name, maskValue, fixedValue in [
+        ('spacing', reader.GetDataSpacing(), fixedReader.GetDataSpacing()),
+        ('origin', reader.GetDataOrigin(), fixedReader.GetDataOrigin())]:
+    if max([abs(m - f) for m, f in zip(maskValue, fixedValue)]) > args.tolerance:
+        os.sys.exit('Mask {n} {m} does not match fixed {n} {f}. Exiting...'.format(
+            n=name, m=maskValue, f=fixedValue))
+for name, maskMatrix, fixedMatrix in [
+        ('qform', reader.GetQFormMatrix(), fixedReader.GetQFormMatrix()),
+        ('sform', reader.GetSFormMatrix(), fixedReader.GetSFormMatrix())]:
+    if not sameMatrix(maskMatrix, fixedMatrix, args.tolerance):
+        os.sys.exit('Mask {n} matrix does not match the fixed image. Exiting...'.format(n=name))
+
+# Read input
+print('Reading in \"{inputFilename}\"'.format(inputFilename=args.inputFilename))
+reader.Update()
+
+# Nothing to do if the mask is already usable
+if isElastixMask(reader.GetOutput()):
+    print('Input is already a single component short mask, skipping filtering')
+    if os.path.abspath(args.inputFilename) == os.path.abspath(args.outputFilename):
+        os.sys.exit(0)
+    if niftiIO.isCompressed(args.inputFilename) == niftiIO.isCompressed(args.outputFilename):
+        print('Copying to file {}'.format(args.outputFilename))
+        shutil.copyfile(args.inputFilename, args.outputFilename)
+    else:
+        writer = vtk.vtkNIFTIImageWriter()
+        writer.SetInputConnection(reader.GetOutputPort())
+        writer.SetQFormMatrix(reader.GetQFormMatrix())
+        writer.SetSFormMatrix(reader.GetSFormMatrix())
+        print('Writing to file {}'.format(args.outputFilename))
+        niftiIO.writeNIFTI(writer, args.outputFilename, args.nThreads, mask=True)
+    os.sys.exit(0)
+
+# Keep the largest component of the highest label
+scalarRange = reader.GetOutput().GetScalarRange()
+cc = vtk.vtkImageConnectivityFilter()
+cc.SetInputConnection(reader.GetOutputPort())
+cc.SetExtractionModeToLargestRegion()
+cc.SetScalarRange(scalarRange[1], scalarRange[1])
+cc.SetLabelModeToConstantValue()
+cc.SetLabelConstantValue(1)
+print('Performing first connected component')
+cc.Update()
+
+# Dilate and erode (background-close) the image
+dil = vtk.vtkImageContinuousDilate3D()
+dil.SetInputConnection(cc.GetOutputPort())
+dil.SetKernelSize(args.kernelSize,args.kernelSize,args.kernelSize)
+dil.SetNumberOfThreads(args.nThreads)
+print('Dilating with {} threads'.format(args.nThreads))
+dil.Update()
+
+ero = vtk.vtkImageContinuousErode3D()
+ero.SetKernelSize(args.kernelSize,args.kernelSize,args.kernelSize)
+ero.SetInputConnection(dil.GetOutputPort())
+ero.SetNumberOfThreads(args.nThreads)
+print('Eroding with {} threads'.format(args.nThreads))
+ero.Update()
+
+# Label the largest background component, everything else is the mask
+backgroundValue = 2
+ccBack = vtk.vtkImageConnectivityFilter()
+ccBack.SetInputConnection(ero.GetOutputPort())
+ccBack.SetExtractionModeToLargestRegion()
+ccBack.SetScalarRange(0, 0)
+ccBack.SetLabelModeToConstantValue()
+ccBack.SetLabelConstantValue(backgroundValue)
+print('Performing connected component on background')
+ccBack.Update()
+
+# Invert and cast to short in one pass
+thresh = vtk.vtkImageThreshold()
+thresh.SetInputConnection(ccBack.GetOutputPort())
+thresh.ThresholdBetween(backgroundValue, backgroundValue)
+thresh.ReplaceInOn()
+thresh.ReplaceOutOn()
+thresh.SetInValue(0)
+thresh.SetOutValue(args.value)
+thresh.SetOutputScalarTypeToShort()
+thresh.SetNumberOfThreads(args.nThreads)
+print('Setting mask to {} as short'.format(args.value))
+thresh.Update()
+
+# Write
+writer = vtk.vtkNIFTIImageWriter()
+writer.SetInputConnection(thresh.GetOutputPort())
+writer.SetQFormMatrix(reader.GetQFormMatrix())
+writer.SetSFormMatrix(reader.GetSFormMatrix())
+print('Writing to file {}'.format(args.outputFilename))
+niftiIO.writeNIFTI(writer, args.outputFilename, args.nThreads, mask=True)
@@ -1,6 +1,7 @@
 # Hisotry:
 #   2016.07.18  Michalski   Created
 #   2017.03.10  Besler      Edited to remove
+#   2026.10.19  agent       Accept *.nii.gz, compressed on --nThreads threads
 #
 # Description:
 #   Resample QCT image data to be isotropic
@@ -14,6 +15,7 @@
 import os
 import argparse
 import vtk
+import niftiIO
 
 ## Establish arguament parser to load the data
 parser = argparse.ArgumentParser(
@@ -25,6 +27,10 @@ parser.add_argument(
 parser.add_argument(
     'outputFilename',
     help='Output NIfTI-style filename')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads used to compress *.nii.gz output')
 parser.add_argument(
     '-f', '--force',
     action='store_true',
@@ -37,8 +43,8 @@ if not os.path.isdir(args.dcmDirectory):
     os.sys.exit('Input \"{dcmDirectory}\" does not exist! Exiting...'.format(dcmDirectory=args.dcmDirectory))
 
 # Check that our output is of type NIfTI
-if not args.outputFilename.lower().endswith('.nii'):
-    os.sys.exit('Output \"{outputFilename}\" is not of type *.nii! Exiting...'.format(outputFilename=args.outputFilename))
+if not niftiIO.isNIFTI(args.outputFilename):
+    os.sys.exit('Output \"{outputFilename}\" is not of type *.nii or *.nii.gz! Exiting...'.format(outputFilename=args.outputFilename))
 
 # Make sure we don't overwrite
 if os.path.isfile(args.outputFilename):
@@ -47,6 +53,10 @@ if os.path.isfile(args.outputFilename):
         if not 'yes'.startswith(response.lower()):
             os.sys.exit('Exiting to avoid overwrite...')
 
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
 ## Algorithm
 # Read input
 reader = vtk.vtkDICOMImageReader()
@@ -92,5 +102,4 @@ for key, value in printerMap.iteritems():
 # Write data out
 writer = vtk.vtkNIFTIImageWriter()
 writer.SetInputConnection(resampler.GetOutputPort())
-writer.SetFileName(args.outputFilename)
-writer.Write()
+niftiIO.writeNIFTI(writer, args.outputFilename, args.nThreads)
@@ -0,0 +1,229 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Extract a smoothed, decimated surface mesh from a mask
+#
+# Notes:
+#   - Meant for the output of QCT_SmoothHandFix.py or QCT_ConvertToShort.py.
+#       Every non-zero label is meshed unless --labels is given.
+#   - The mask is cropped to the bounding box of the labels plus a voxel of
+#       background before meshing, so the surface is closed and the work
+#       scales with the bone and not the scan.
+#   - The surface comes from vtkDiscreteFlyingEdges3D, which runs on the
+#       vtkSMPTools backend with --nThreads threads, or vtkDiscreteMarchingCubes
+#       on VTK without it. It is smoothed by a windowed sinc filter and then
+#       decimated by quadric decimation to about --triangles triangles.
+#   - Points are in the VTK coordinates of the mask, the same as the viewers,
+#       which ignore the NIfTI qform/sform.
+#   - With --cacheDirectory the mesh is stored under the SHA-1 of the mask
+#       contents and the settings, so meshing an unchanged mask again is a
+#       copy. Entries are written to a temporary file and renamed into place.
+#   - The output may be *.vtp, *.vtk, *.stl or *.ply.
+#
+# Usage:
+#   python QCT_Mesh.py femurMask.nii femur.stl
+#   python QCT_Mesh.py femurMask.nii.gz femur.vtp --triangles 50000 --cacheDirectory meshCache -n 4
+
+# Libraries
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import argparse
+import numpy
+import vtk
+import niftiIO
+import sparseLabels
+import registrationCache
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Extract a smoothed, decimated surface mesh from a mask',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'inputFilename',
+    help='The input mask NIfTI (*.nii) file name')
+parser.add_argument(
+    'outputFilename',
+    help='The output mesh (*.vtp, *.vtk, *.stl or *.ply) file name')
+parser.add_argument(
+    '-l', '--labels',
+    default=None, type=int, nargs='+',
+    help='Labels to mesh. Every non-zero label if not given')
+parser.add_argument(
+    '-t', '--triangles',
+    default=int(100000), type=int,
+    help='Target number of triangles. No decimation if zero')
+parser.add_argument(
+    '-s', '--smoothingIterations',
+    default=int(20), type=int,
+    help='Windowed sinc smoothing iterations. No smoothing if zero')
+parser.add_argument(
+    '-p', '--passBand',
+    default=float(0.01), type=float,
+    help='Windowed sinc pass band, smaller smooths more')
+parser.add_argument(
+    '-c', '--cacheDirectory',
+    default=None,
+    help='Directory of cached meshes')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads')
+parser.add_argument(
+    '-f', '--force',
+    action='store_true',
+    help='Set to overwrite output without asking')
+args = parser.parse_args()
+
+# Writer for each output type
+writers = {
+    '.vtp': vtk.vtkXMLPolyDataWriter,
+    '.vtk': vtk.vtkPolyDataWriter,
+    '.stl': vtk.vtkSTLWriter,
+    '.ply': vtk.vtkPLYWriter}
+extension = os.path.splitext(args.outputFilename)[1].lower()
+
+# Check that the input file exists
+if not os.path.isfile(args.inputFilename):
+    os.sys.exit('Input \"{inputFilename}\" does not exist! Exiting...'.format(inputFilename=args.inputFilename))
+if not niftiIO.isNIFTI(args.inputFilename):
+    os.sys.exit('Input \"{filename}\" is not of type *.nii or *.nii.gz! Exiting...'.format(filename=args.inputFilename))
+if extension not in writers:
+    os.sys.exit('Output \"{filename}\" is not of type {t}! Exiting...'.format(
+        filename=args.outputFilename, t=', '.join(['*' + x for x in sorted(writers)])))
+
+# Make sure we don't overwrite
+if os.path.isfile(args.outputFilename):
+    if not args.force:
+        response = raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=args.outputFilename))
+        if not 'yes'.startswith(response.lower()):
+            os.sys.exit('Exiting to avoid overwrite...')
+
+# Check arguments
+if args.triangles < 0 or args.smoothingIterations < 0:
+    os.sys.exit('Triangles and smoothing iterations must be zero or greater. Exiting...')
+if args.passBand <= 0 or args.passBand > 2:
+    os.sys.exit('Pass band must be in (0, 2]. Given {}. Exiting...'.format(args.passBand))
+
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+vtk.vtkSMPTools.Initialize(args.nThreads)
+
+# Look in the cache
+cacheEntry = None
+if args.cacheDirectory is not None:
+    sha = hashlib.sha1()
+    sha.update(registrationCache.fileHash(args.inputFilename).encode('utf-8'))
+    sha.update(repr([args.labels, args.triangles, args.smoothingIterations, args.passBand]).encode('utf-8'))
+    cacheEntry = os.path.join(args.cacheDirectory, sha.hexdigest() + extension)
+    if os.path.isfile(cacheEntry):
+        print('Copying cached mesh \"{}\"'.format(cacheEntry))
+        shutil.copyfile(cacheEntry, args.outputFilename)
+        os.sys.exit()
+
+# Read input
+print('Reading in \"{inputFilename}\"'.format(inputFilename=args.inputFilename))
+start = time.time()
+array, reader = niftiIO.readNIFTI(args.inputFilename)
+labels = args.labels
+if labels is None:
+    labels = [label for label in sparseLabels.arrayLabels(array) if label != 0]
+if len(labels) == 0:
+    os.sys.exit('Input \"{}\" has no labels to mesh. Exiting...'.format(args.inputFilename))
+
+# Crop to the labels plus a voxel of background on every side
+foreground = numpy.isin(array, labels)
+lower, upper = [], []
+for axis in range(3):
+    # array is [z,y,x], so the bounds are found in reverse
+    present = numpy.flatnonzero(foreground.any(axis=tuple(i for i in range(3) if i != 2 - axis)))
+    if present.size == 0:
+        os.sys.exit('Input \"{i}\" has none of the labels {l}. Exiting...'.format(i=args.inputFilename, l=labels))
+    lower.append(present[0] - 1)
+    upper.append(present[-1] + 1)
+del foreground
+
+# Pad with background where the labels touch the edge of the image
+shape = array.shape[::-1]
+cropped = numpy.zeros([upper[i] - lower[i] + 1 for i in (2, 1, 0)], dtype=array.dtype)
+source = tuple(slice(max(lower[i], 0), min(upper[i], shape[i] - 1) + 1) for i in (2, 1, 0))
+target = tuple(slice(max(lower[i], 0) - lower[i], min(upper[i], shape[i] - 1) + 1 - lower[i]) for i in (2, 1, 0))
+cropped[target] = array[source]
+extent = reader.GetDataExtent()
+extent = [extent[2*(i // 2)] + [lower, upper][i % 2][i // 2] for i in range(6)]
+image = niftiIO.arrayToImage(cropped, extent, reader.GetDataSpacing(), reader.GetDataOrigin(), reader.GetDataScalarType())
+print('Cropped to {s} of {t} voxels in {e:.1f} s'.format(s=list(cropped.shape[::-1]), t=list(shape), e=time.time() - start))
+
+# Extract the surface
+start = time.time()
+if hasattr(vtk, 'vtkDiscreteFlyingEdges3D'):
+    contour = vtk.vtkDiscreteFlyingEdges3D()
+else:
+    contour = vtk.vtkDiscreteMarchingCubes()
+contour.SetInputData(image)
+for i, label in enumerate(labels):
+    contour.SetValue(i, label)
+contour.ComputeNormalsOff()
+contour.ComputeGradientsOff()
+contour.Update()
+mesh = contour.GetOutput()
+print('Extracted {n} triangles with {c} in {e:.1f} s'.format(n=mesh.GetNumberOfPolys(), c=contour.GetClassName(), e=time.time() - start))
+
+# Smooth
+if args.smoothingIterations > 0:
+    start = time.time()
+    smoother = vtk.vtkWindowedSincPolyDataFilter()
+    smoother.SetInputData(mesh)
+    smoother.SetNumberOfIterations(args.smoothingIterations)
+    smoother.SetPassBand(args.passBand)
+    smoother.BoundarySmoothingOff()
+    smoother.FeatureEdgeSmoothingOff()
+    smoother.NonManifoldSmoothingOn()
+    smoother.NormalizeCoordinatesOn()
+    smoother.Update()
+    mesh = smoother.GetOutput()
+    print('Smoothed with {n} iterations in {e:.1f} s'.format(n=args.smoothingIterations, e=time.time() - start))
+
+# Decimate
+if 0 < args.triangles < mesh.GetNumberOfPolys():
+    start = time.time()
+    decimate = vtk.vtkQuadricDecimation()
+    decimate.SetInputData(mesh)
+    decimate.SetTargetReduction(1.0 - float(args.triangles) / mesh.GetNumberOfPolys())
+    decimate.VolumePreservationOn()
+    decimate.Update()
+    mesh = decimate.GetOutput()
+    print('Decimated to {n} triangles in {e:.1f} s'.format(n=mesh.GetNumberOfPolys(), e=time.time() - start))
+
+# Normals for shading
+normals = vtk.vtkPolyDataNormals()
+normals.SetInputData(mesh)
+normals.SplittingOff()
+normals.ConsistencyOn()
+normals.Update()
+mesh = normals.GetOutput()
+
+# Write output, then keep a copy in the cache
+def writeMesh(fileName):
+    writer = writers[extension]()
+    writer.SetFileName(fileName)
+    writer.SetInputData(mesh)
+    if extension == '.stl':
+        writer.SetFileTypeToBinary()
+    writer.Write()
+
+print('Writing to \"{}\"'.format(args.outputFilename))
+writeMesh(args.outputFilename)
+
+if cacheEntry is not None:
+    if not os.path.isdir(args.cacheDirectory):
+        os.makedirs(args.cacheDirectory)
+    handle, temporary = tempfile.mkstemp(suffix=extension, dir=args.cacheDirectory)
+    os.close(handle)
+    shutil.copyfile(args.outputFilename, temporary)
+    os.rename(temporary, cacheEntry)
+    print('Cached as \"{}\"'.format(cacheEntry))
@@ -1,5 +1,7 @@
 # History:
 #   2017.04.11  babesler    Created
+#   2026.10.19  agent       Accept *.nii.gz
+#   2026.10.19  agent       Run-length (--sparse) overlap and components
 #
 # Description:
 #   Compute metrics of overlap between two images
@@ -8,14 +10,23 @@
 #   - See the following links for a description of the metrics:
 #       https://itk.org/Doxygen/html/classitk_1_1LabelOverlapMeasuresImageFilter.html
 #       https://itk.org/Doxygen/html/classitk_1_1HausdorffDistanceImageFilter.html
+#   - With --sparse the inputs are run-length encoded (see sparseLabels.py)
+#       and the overlap measures are computed from the runs. Inputs may then
+#       also be *.rle.npz files. The Hausdorff distance still needs a dense
+#       image, so only the bounding box of the foreground of both inputs is
+#       decoded for it. The number of connected components of each input is
+#       also printed.
 #
 # Usage:
 #   python QCT_Metrics.py input output
+#   python QCT_Metrics.py seg1.rle.npz seg2.nii --sparse
 
 import vtk
+import niftiIO
 import argparse
 import os
 import SimpleITK as sitk
+import sparseLabels
 
 # Setup and parse command line arguments
 parser = argparse.ArgumentParser(description='Extract whole body mask',
@@ -33,6 +44,9 @@ parser.add_argument('-d', '--delimiter',
 parser.add_argument('-n', '--nThreads',
                     default=1, type=int,
                     help='Number of threads')
+parser.add_argument('-s', '--sparse',
+                    action='store_true',
+                    help='Compute from run-length encoded labels, also accepting *.rle.npz inputs')
 args = parser.parse_args()
 
 # Constants for formatting the output string
@@ -41,8 +55,10 @@ header=template.replace('{','').replace('}','') # Notice that we can remove stri
 
 # Check that input file exists
 for fileName in [args.inputImage1, args.inputImage2]:
-    if not fileName.lower().endswith('.nii'):
-        os.sys.exit('Output file \"{outputImage}\" is not a .nii file. Exiting...'.format(outputImage=fileName))
+    if args.sparse and sparseLabels.isSparse(fileName):
+        pass
+    elif not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Output file \"{outputImage}\" is not a .nii or .nii.gz file. Exiting...'.format(outputImage=fileName))
 
     if not os.path.isfile(fileName):
         os.sys.exit('Input file \"{inputImage}\" does not exist. Exiting...'.format(inputImage=fileName))
@@ -69,33 +85,74 @@ else:
         except IOError:
             os.sys.exit('Unable to open file {} for writing. Exiting...'.format(args.outputFile))
 
-# Read the inputs
-inputImage1 = sitk.ReadImage(args.inputImage1)
-inputImage2 = sitk.ReadImage(args.inputImage2)
+def sparseMeasures(labels1, labels2):
+    '''Return (Hausdorff distance, overlap measures) of two run-length label images'''
+    try:
+        measures = sparseLabels.overlapMeasures(labels1, labels2)
+    except ValueError as e:
+        os.sys.exit('{e}. Exiting...'.format(e=e))
 
-# Compute HausdorffDistance
-hdFilter = sitk.HausdorffDistanceImageFilter()
-hdFilter.SetNumberOfThreads(args.nThreads)
-print('Computing Hausdorff Distance with {} threads'.format(args.nThreads))
-hdFilter.Execute(inputImage1, inputImage2)
+    # Decode the foreground of both, plus a voxel of background, for the distance maps
+    bounds = [sparseLabels.bounds(labels) for labels in [labels1, labels2]]
+    if None in bounds:
+        os.sys.exit('Cannot compute the Hausdorff Distance of an empty image. Exiting...')
+    lower = [max(min(bounds[0][0][i], bounds[1][0][i]) - 1, 0) for i in range(3)]
+    upper = [min(max(bounds[0][1][i], bounds[1][1][i]) + 1, labels1['dimensions'][i] - 1) for i in range(3)]
+    images = []
+    for labels in [labels1, labels2]:
+        image = sitk.GetImageFromArray(sparseLabels.toArray(labels, lower, upper))
+        image.SetSpacing(labels['spacing'])
+        image.SetOrigin([labels['origin'][i] + lower[i] * labels['spacing'][i] for i in range(3)])
+        images.append(image)
 
-# Compute everything else
-overlapFilter = sitk.LabelOverlapMeasuresImageFilter()
-overlapFilter.SetNumberOfThreads(args.nThreads)
-print('Computing other Overlap Measures with {} threads'.format(args.nThreads))
-overlapFilter.Execute(inputImage1, inputImage2)
+    hdFilter = sitk.HausdorffDistanceImageFilter()
+    hdFilter.SetNumberOfThreads(args.nThreads)
+    print('Computing Hausdorff Distance with {} threads over {} to {}'.format(args.nThreads, lower, upper))
+    hdFilter.Execute(images[0], images[1])
+    return hdFilter.GetHausdorffDistance(), measures
+
+if args.sparse:
+    # Read the inputs as runs
+    labels = []
+    for fileName in [args.inputImage1, args.inputImage2]:
+        print('Encoding \"{}\"'.format(fileName))
+        labels.append(sparseLabels.readLabels(fileName))
+        print('  {r} runs, {c} components'.format(r=len(labels[-1]['label']), c=len(sparseLabels.components(labels[-1]))))
+
+    print('Computing Overlap Measures from runs')
+    hausdorffDistance, measures = sparseMeasures(labels[0], labels[1])
+else:
+    # Read the inputs
+    inputImage1 = sitk.ReadImage(args.inputImage1)
+    inputImage2 = sitk.ReadImage(args.inputImage2)
+
+    # Compute HausdorffDistance
+    hdFilter = sitk.HausdorffDistanceImageFilter()
+    hdFilter.SetNumberOfThreads(args.nThreads)
+    print('Computing Hausdorff Distance with {} threads'.format(args.nThreads))
+    hdFilter.Execute(inputImage1, inputImage2)
+    hausdorffDistance = hdFilter.GetHausdorffDistance()
+
+    # Compute everything else
+    overlapFilter = sitk.LabelOverlapMeasuresImageFilter()
+    overlapFilter.SetNumberOfThreads(args.nThreads)
+    print('Computing other Overlap Measures with {} threads'.format(args.nThreads))
+    overlapFilter.Execute(inputImage1, inputImage2)
+    measures = dict([(name, getattr(overlapFilter, 'Get' + name)()) for name in [
+        'FalseNegativeError', 'FalsePositiveError', 'VolumeSimilarity', 'JaccardCoefficient',
+        'DiceCoefficient', 'MeanOverlap', 'UnionOverlap']])
 
 result = template.format(
     InputFile1=args.inputImage1,
     InputFile2=args.inputImage2,
-    HausdorffDistance=hdFilter.GetHausdorffDistance(),
-    FalseNegativeError=overlapFilter.GetFalseNegativeError(),
-    FalsePositiveError=overlapFilter.GetFalsePositiveError(),
-    VolumeSimilarity=overlapFilter.GetVolumeSimilarity(),
-    JaccardCoefficient=overlapFilter.GetJaccardCoefficient(),
-    DiceCoefficient=overlapFilter.GetDiceCoefficient(),
-    MeanOverlap=overlapFilter.GetMeanOverlap(),
-    UnionOverlap=overlapFilter.GetUnionOverlap()
+    HausdorffDistance=hausdorffDistance,
+    FalseNegativeError=measures['FalseNegativeError'],
+    FalsePositiveError=measures['FalsePositiveError'],
+    VolumeSimilarity=measures['VolumeSimilarity'],
+    JaccardCoefficient=measures['JaccardCoefficient'],
+    DiceCoefficient=measures['DiceCoefficient'],
+    MeanOverlap=measures['MeanOverlap'],
+    UnionOverlap=measures['UnionOverlap']
 )
 
 # Write results
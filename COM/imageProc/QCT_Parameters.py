@@ -0,0 +1,68 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Render an Elastix parameter file from a base file and a preset
+#
+# Notes:
+#   - Presets are defined in elastixParameters.py (draft, standard, high).
+#   - --set overrides any parameter, e.g. --set NumberOfSpatialSamples 6000
+#   - The SHA-1 of the rendered file is printed so runs can be compared.
+#
+# Usage:
+#   python QCT_Parameters.py BSpline.txt BSpline_draft.txt -p draft
+#   python QCT_Parameters.py Affine.txt Affine_custom.txt --set MaximumNumberOfIterations 500
+
+# Libraries
+import os
+import argparse
+from collections import OrderedDict
+import elastixParameters
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Render an Elastix parameter file from a preset',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'baseFile',
+    help='The base parameter file (e.g. Affine.txt or BSpline.txt)')
+parser.add_argument(
+    'outputFile',
+    help='The rendered parameter file')
+parser.add_argument(
+    '-p', '--preset',
+    default='standard', choices=list(elastixParameters.presets.keys()),
+    help='The preset to apply')
+parser.add_argument(
+    '-s', '--set',
+    default=[], nargs='+', action='append',
+    help='Override a parameter with NAME VALUE [VALUE ...]. Can be given more than once')
+parser.add_argument(
+    '-f', '--force',
+    action='store_true',
+    help='Set to overwrite output without asking')
+args = parser.parse_args()
+
+# Check that the input exists
+if not os.path.isfile(args.baseFile):
+    os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=args.baseFile))
+
+# Make sure we don't overwrite
+if os.path.isfile(args.outputFile):
+    if not args.force:
+        response = str(raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=args.outputFile)))
+        if not 'yes'.startswith(response.lower()):
+            os.sys.exit('Exiting to avoid overwrite...')
+
+# Collect overrides, parsing values like a parameter file would
+overrides = OrderedDict()
+for override in args.set:
+    if len(override) < 2:
+        os.sys.exit('--set needs a name and at least one value, given {}. Exiting...'.format(override))
+    overrides[override[0]] = [elastixParameters.parseValue(value) for value in override[1:]]
+
+# Render
+parameters = elastixParameters.renderParameters(args.baseFile, args.preset, overrides)
+elastixParameters.writeParameterFile(parameters, args.outputFile)
+print('Wrote {f} ({p} preset)'.format(f=args.outputFile, p=args.preset))
+print('Parameter hash: {}'.format(elastixParameters.parameterHash(parameters)))
@@ -0,0 +1,143 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Warp label maps and images through an Elastix transform in one process
+#
+# Notes:
+#   - Replaces one transformix call per image. The transform parameter files
+#       (including the large B-spline coefficient file) are parsed once and
+#       the transform is shared by every image.
+#   - Label maps (--labels) use nearest neighbour interpolation. Intensity
+#       images and grids (--images) use B-spline interpolation of the order
+#       given by FinalBSplineInterpolationOrder, clamped to the input type.
+#   - With --displacementField the transform is evaluated once into a dense
+#       field, so each image only pays for a field lookup. This uses three
+#       doubles per output voxel.
+#   - Outputs keep the input file name and pixel type.
+#
+# Usage:
+#   python QCT_PropagateLabels.py TransformParameters.1.txt outputDir -l atlasSeg.nii -i grid.nii -w 2
+
+# Libraries
+import os
+import argparse
+from multiprocessing.pool import ThreadPool
+import SimpleITK as sitk
+import elastixTransforms
+import niftiIO
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Warp label maps and images through an Elastix transform',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'transformParameters',
+    help='The last TransformParameters.*.txt written by elastix')
+parser.add_argument(
+    'outputDirectory',
+    help='Directory to write the warped images to')
+parser.add_argument(
+    '-l', '--labels',
+    default=[], nargs='+',
+    help='Label NIfTI (*.nii) images, warped with nearest neighbour interpolation')
+parser.add_argument(
+    '-i', '--images',
+    default=[], nargs='+',
+    help='Intensity NIfTI (*.nii) images, warped with B-spline interpolation')
+parser.add_argument(
+    '-d', '--displacementField',
+    action='store_true',
+    help='Evaluate the transform once into a dense displacement field')
+parser.add_argument(
+    '-w', '--nWorkers',
+    default=1, type=int,
+    help='Number of images warped at the same time')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads for each image')
+parser.add_argument(
+    '-f', '--force',
+    action='store_true',
+    help='Set to overwrite output without asking')
+args = parser.parse_args()
+
+# Check that the inputs exist
+if not os.path.isfile(args.transformParameters):
+    os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=args.transformParameters))
+if len(args.labels) + len(args.images) == 0:
+    os.sys.exit('Nothing to warp, give --labels or --images. Exiting...')
+for fileName in args.labels + args.images:
+    if not os.path.isfile(fileName):
+        os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=fileName))
+    if not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Input \"{fileName}\" is not of type *.nii or *.nii.gz! Exiting...'.format(fileName=fileName))
+
+# Make the output directory
+if not os.path.isdir(args.outputDirectory):
+    os.makedirs(args.outputDirectory)
+
+# Build the list of work, making sure we don't overwrite
+targets = []
+for fileNames, interpolation in [(args.labels, 'label'), (args.images, 'image')]:
+    for fileName in fileNames:
+        outputFileName = os.path.join(args.outputDirectory, os.path.basename(fileName))
+        if os.path.abspath(outputFileName) == os.path.abspath(fileName):
+            os.sys.exit('Output \"{fileName}\" would replace its input. Exiting...'.format(fileName=outputFileName))
+        if os.path.isfile(outputFileName):
+            if not args.force:
+                response = str(raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=outputFileName)))
+                if not 'yes'.startswith(response.lower()):
+                    os.sys.exit('Exiting to avoid overwrite...')
+        targets.append((fileName, outputFileName, interpolation))
+
+# Check that the number of threads is valid
+if args.nThreads < 1 or args.nWorkers < 1:
+    os.sys.exit('Must have atleast one threads and workers. Exiting...')
+sitk.ProcessObject.SetGlobalDefaultNumberOfThreads(args.nThreads)
+
+# Parse the transform once
+print('Reading transform \"{}\"'.format(args.transformParameters))
+try:
+    chain = elastixTransforms.readTransformChain(args.transformParameters)
+    transform, grid = elastixTransforms.chainTransform(chain)
+except (ValueError, KeyError, IOError) as e:
+    os.sys.exit('Unable to read transform: {e}. Exiting...'.format(e=e))
+print('Read {n} transforms, output size {s}'.format(n=len(chain), s=grid['Size']))
+
+if args.displacementField:
+    print('Computing displacement field')
+    field = sitk.TransformToDisplacementField(transform, sitk.sitkVectorFloat64,
+        grid['Size'], grid['Origin'], grid['Spacing'], grid['Direction'])
+    transform = sitk.DisplacementFieldTransform(field)
+
+# The same interpolator transformix would use for images
+interpolators = {
+    0: sitk.sitkNearestNeighbor,
+    1: sitk.sitkLinear,
+    2: sitk.sitkBSpline2,
+    3: sitk.sitkBSpline3,
+    4: sitk.sitkBSpline4,
+    5: sitk.sitkBSpline5}
+finalOrder = int(chain[0].get('FinalBSplineInterpolationOrder', [3])[0])
+if finalOrder not in interpolators:
+    os.sys.exit('FinalBSplineInterpolationOrder must be between 0 and 5, given {}. Exiting...'.format(finalOrder))
+imageInterpolator = interpolators[finalOrder]
+
+def warp(target):
+    '''Warp one image through the shared transform'''
+    fileName, outputFileName, interpolation = target
+    interpolator = sitk.sitkNearestNeighbor if interpolation == 'label' else imageInterpolator
+    print('Warping {} ({})'.format(fileName, interpolation))
+    image = sitk.ReadImage(fileName)
+    result = elastixTransforms.resample(image, transform, grid, interpolator)
+    print('Writing to {}'.format(outputFileName))
+    sitk.WriteImage(result, outputFileName)
+    return outputFileName
+
+# Warp every target
+pool = ThreadPool(args.nWorkers)
+pool.map(warp, targets)
+pool.close()
+pool.join()
@@ -0,0 +1,143 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Submit, run and monitor registration jobs in a local queue
+#
+# Notes:
+#   - The queue is a single SQLite file (see registrationQueue.py). Job logs
+#       are written to <queue>.logs/ next to it.
+#   - 'worker' starts --nWorkers processes that each run one job at a time.
+#       Leave it running (e.g. under nohup or screen) to keep a machine busy,
+#       or give --exitWhenEmpty to stop once the queue drains.
+#   - Failed jobs are retried up to --maxAttempts times before being marked
+#       failed. 'retry' puts failed jobs back in the queue.
+#   - 'recover' requeues jobs left running by workers on this machine that
+#       were killed. Workers that are stopped kill their running job, along
+#       with anything it started, such as elastix.
+#   - QCT_RegisterROI.py can submit itself with --queue.
+#
+# Usage:
+#   python QCT_Queue.py submit queue.db -p 10 -- elastix -f fixed.nii -m moving.nii -p Affine.txt -out out
+#   python QCT_Queue.py worker queue.db -n 4
+#   python QCT_Queue.py status queue.db
+#   python QCT_Queue.py retry queue.db
+
+# Libraries
+import os
+import time
+import argparse
+import multiprocessing
+import registrationQueue
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Local registration job queue',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+subparsers = parser.add_subparsers(dest='action')
+
+submitParser = subparsers.add_parser('submit', help='Add the command given after -- to the queue',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+submitParser.add_argument('queue', help='The queue file')
+submitParser.add_argument('-p', '--priority', default=0, type=int,
+    help='Higher priority jobs run first')
+submitParser.add_argument('-a', '--maxAttempts', default=3, type=int,
+    help='Number of times to try the job before marking it failed')
+
+workerParser = subparsers.add_parser('worker', help='Run jobs from the queue',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+workerParser.add_argument('queue', help='The queue file')
+workerParser.add_argument('-n', '--nWorkers', default=1, type=int,
+    help='Number of jobs to run at the same time')
+workerParser.add_argument('--poll', default=float(10), type=float,
+    help='Seconds to wait before checking an empty queue again')
+workerParser.add_argument('-e', '--exitWhenEmpty', action='store_true',
+    help='Stop once there are no queued jobs')
+
+statusParser = subparsers.add_parser('status', help='List the jobs in the queue',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+statusParser.add_argument('queue', help='The queue file')
+statusParser.add_argument('-s', '--state', default=None,
+    choices=[registrationQueue.QUEUED, registrationQueue.RUNNING, registrationQueue.DONE, registrationQueue.FAILED],
+    help='Only list jobs in this state')
+
+retryParser = subparsers.add_parser('retry', help='Requeue failed jobs',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+retryParser.add_argument('queue', help='The queue file')
+retryParser.add_argument('jobs', nargs='*', type=int, help='Job ids to retry (default: all failed jobs)')
+
+recoverParser = subparsers.add_parser('recover', help='Requeue jobs whose worker was killed',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+recoverParser.add_argument('queue', help='The queue file')
+
+# Everything after -- is the command to submit
+argv = os.sys.argv[1:]
+command = []
+if '--' in argv:
+    command = argv[argv.index('--')+1:]
+    argv = argv[:argv.index('--')]
+args = parser.parse_args(argv)
+
+if args.action is None:
+    parser.print_help()
+    os.sys.exit(1)
+
+# Submit
+if args.action == 'submit':
+    if len(command) == 0:
+        os.sys.exit('No command given to submit. Exiting...')
+    if args.maxAttempts < 1:
+        os.sys.exit('Must have atleast one attempt, asked for {}. Exiting...'.format(args.maxAttempts))
+    connection = registrationQueue.openQueue(args.queue)
+    jobId = registrationQueue.submit(connection, command, args.priority, args.maxAttempts)
+    print('Submitted job {}'.format(jobId))
+
+# Run workers
+elif args.action == 'worker':
+    if not os.path.isfile(args.queue):
+        os.sys.exit('Queue \"{}\" does not exist. Exiting...'.format(args.queue))
+    if args.nWorkers < 1:
+        os.sys.exit('Must have atleast one worker, asked for {}. Exiting...'.format(args.nWorkers))
+    workers = []
+    for i in range(args.nWorkers):
+        worker = multiprocessing.Process(target=registrationQueue.work,
+            args=(args.queue, args.poll, args.exitWhenEmpty))
+        worker.start()
+        workers.append(worker)
+    print('Started {} workers'.format(args.nWorkers))
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Each worker kills the job it is running before it exits
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        os.sys.exit('Workers stopped, run \"recover\" to requeue their jobs. Exiting...')
+
+# Print the jobs
+elif args.action == 'status':
+    if not os.path.isfile(args.queue):
+        os.sys.exit('Queue \"{}\" does not exist. Exiting...'.format(args.queue))
+    connection = registrationQueue.openQueue(args.queue)
+    formatter = '{:>6} {:>8} {:>8} {:>8} {:>20} {}'
+    print(formatter.format('Id', 'State', 'Priority', 'Attempts', 'Finished', 'Command'))
+    for job in registrationQueue.jobs(connection, args.state):
+        finished = ''
+        if job['finished'] is not None:
+            finished = time.strftime('%Y.%m.%d %H:%M:%S', time.localtime(job['finished']))
+        print(formatter.format(job['id'], job['state'], job['priority'],
+            '{}/{}'.format(job['attempts'], job['maxAttempts']), finished, ' '.join(job['command'])))
+
+# Requeue failed jobs
+elif args.action == 'retry':
+    connection = registrationQueue.openQueue(args.queue)
+    retried = registrationQueue.retry(connection, args.jobs if len(args.jobs) > 0 else None)
+    print('Requeued jobs {}'.format(retried))
+
+# Requeue jobs of killed workers
+elif args.action == 'recover':
+    connection = registrationQueue.openQueue(args.queue)
+    recovered = registrationQueue.recover(connection)
+    print('Requeued jobs {}'.format(recovered))
@@ -0,0 +1,337 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Run Elastix on images cropped to the bounding box of the fixed mask
+#
+# Notes:
+#   - Must have elastix on the path (or give --elastix)
+#   - The fixed image and mask are cropped to the mask bounding box grown by
+#       --margin voxels. If --movingMask is given the moving image is cropped
+#       the same way, otherwise it is used as is.
+#   - Cropping keeps the physical position of every voxel, so the transform
+#       found on the crop is valid on the full image. Only the output grid in
+#       each TransformParameters.*.txt (Size, Index, Origin, Spacing,
+#       Direction) is rewritten to the full fixed image, so transformix
+#       resamples onto the full field of view. The cropped versions are kept
+#       as TransformParameters.*.crop.txt.
+#   - The B-spline control grid only covers the crop. Outside of it the
+#       deformation is zero, which is fine since nothing there was sampled.
+#   - With --movingMask, GeometricalCenter initialization aligns the centres
+#       of the two crops, which is the centre of the two masked regions.
+#       Without it, aligning the crop of the fixed image to the whole moving
+#       image would be off by the offset of the crop from the image centre.
+#       Instead, the automatic initialization of the first parameter file is
+#       turned off and the translation between the centres of the full
+#       images, where an uncropped registration would start, is given as an
+#       initial transform (-t0, TransformParameters.initial.txt).
+#   - Result images (WriteResultImage "true") are on the cropped grid.
+#   - With --queue the registration is added to a QCT_Queue.py queue instead
+#       of being run.
+#   - Parameter files are rendered with --preset (see elastixParameters.py)
+#       and written to the output directory as Parameters.*.txt before use.
+#   - With --cache, results are stored under the hash of the rendered
+#       parameters, the input images and the margin. A later run with the same
+#       hash copies the cached transforms instead of running elastix.
+#   - With --atlasLibrary, movingImage is the name of an atlas in a
+#       QCT_AtlasLibrary.py library. Its files are checked against the
+#       library checksums and its mask is used as --movingMask unless one is
+#       given.
+#
+# Usage:
+#   python QCT_RegisterROI.py fixed.nii moving.nii fixedMask.nii outputDir -p Affine.txt
+#   python QCT_RegisterROI.py fixed.nii moving.nii fixedMask.nii outputDir --queue queue.db
+#   python QCT_RegisterROI.py fixed.nii QCTCAL_0001_R fixedMask.nii outputDir --atlasLibrary atlases
+
+# Libraries
+import os
+import glob
+import shutil
+import argparse
+import tempfile
+import collections
+import subprocess
+import SimpleITK as sitk
+import atlasLibrary
+import niftiIO
+import elastixParameters
+import registrationQueue
+import registrationCache
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Register two images with Elastix, cropped to the fixed mask',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'fixedImage',
+    help='The fixed NIfTI (*.nii) image')
+parser.add_argument(
+    'movingImage',
+    help='The moving NIfTI (*.nii) image')
+parser.add_argument(
+    'fixedMask',
+    help='The fixed NIfTI (*.nii) mask')
+parser.add_argument(
+    'outputDirectory',
+    help='The Elastix output directory')
+parser.add_argument(
+    '-p', '--parameters',
+    default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Affine.txt')], nargs='+',
+    help='Elastix parameter files, run in order')
+parser.add_argument(
+    '--preset',
+    default='standard', choices=list(elastixParameters.presets.keys()),
+    help='Parameter preset applied to every parameter file')
+parser.add_argument(
+    '-c', '--cache',
+    default=None,
+    help='Directory of cached registration results')
+parser.add_argument(
+    '--movingMask',
+    default=None,
+    help='The moving NIfTI (*.nii) mask. If given, the moving image is cropped too')
+parser.add_argument(
+    '-a', '--atlasLibrary',
+    default=None,
+    help='Atlas library directory. If given, movingImage is an atlas name')
+parser.add_argument(
+    '-m', '--margin',
+    default=int(10), type=int,
+    help='Voxels added around the mask bounding box')
+parser.add_argument(
+    '-e', '--elastix',
+    default='elastix',
+    help='The elastix executable')
+parser.add_argument(
+    '-k', '--keep',
+    action='store_true',
+    help='Keep the cropped images in the output directory')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads')
+parser.add_argument(
+    '-q', '--queue',
+    default=None,
+    help='Submit to this QCT_Queue.py queue file instead of running')
+parser.add_argument(
+    '--priority',
+    default=0, type=int,
+    help='Queue priority, higher runs first')
+parser.add_argument(
+    '--maxAttempts',
+    default=3, type=int,
+    help='Number of times the queue tries the registration')
+args = parser.parse_args()
+
+# The moving image and mask as given, before the atlas library resolves them
+givenMovingImage = args.movingImage
+givenMovingMask = args.movingMask
+
+# Take the moving image and mask from the atlas library
+if args.atlasLibrary is not None:
+    try:
+        atlas = atlasLibrary.atlasFiles(args.atlasLibrary, args.movingImage)
+    except (KeyError, ValueError) as e:
+        os.sys.exit('{}. Exiting...'.format(e.args[0]))
+    args.movingImage = atlas['image']
+    if args.movingMask is None:
+        args.movingMask = atlas['mask']
+
+# Check that the inputs exist
+inputFiles = [args.fixedImage, args.movingImage, args.fixedMask]
+if args.movingMask is not None:
+    inputFiles.append(args.movingMask)
+for fileName in inputFiles:
+    if not os.path.isfile(fileName):
+        os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=fileName))
+    if not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Input \"{fileName}\" is not of type *.nii or *.nii.gz! Exiting...'.format(fileName=fileName))
+for fileName in args.parameters:
+    if not os.path.isfile(fileName):
+        os.sys.exit('Parameter file \"{fileName}\" does not exist! Exiting...'.format(fileName=fileName))
+
+# Check margin
+if args.margin < 0:
+    os.sys.exit('Margin must be zero or greater. Exiting...')
+
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
+# Submit ourselves to the queue. The command is rebuilt from the parsed
+# arguments so that no spelling of --queue is passed on.
+if args.queue is not None:
+    command = [os.sys.executable, os.path.abspath(__file__),
+        args.fixedImage, givenMovingImage, args.fixedMask, args.outputDirectory]
+    command += ['--parameters'] + args.parameters
+    command += ['--preset', args.preset, '--margin', str(args.margin),
+        '--elastix', args.elastix, '--nThreads', str(args.nThreads)]
+    for option, value in [('--cache', args.cache), ('--movingMask', givenMovingMask), ('--atlasLibrary', args.atlasLibrary)]:
+        if value is not None:
+            command += [option, value]
+    if args.keep:
+        command.append('--keep')
+    connection = registrationQueue.openQueue(args.queue)
+    jobId = registrationQueue.submit(connection, command, args.priority, args.maxAttempts)
+    print('Submitted job {} to {}'.format(jobId, args.queue))
+    os.sys.exit(0)
+
+# Make the output directory
+if not os.path.isdir(args.outputDirectory):
+    os.makedirs(args.outputDirectory)
+
+# Functions
+def maskRegion(mask, margin):
+    '''Return (index, size) of the mask bounding box grown by margin voxels'''
+    shape = sitk.LabelShapeStatisticsImageFilter()
+    shape.Execute(sitk.Cast(mask != 0, sitk.sitkUInt8))
+    if not shape.HasLabel(1):
+        return None
+    box = shape.GetBoundingBox(1)
+    dimension = mask.GetDimension()
+    imageSize = mask.GetSize()
+    lower = [max(box[i] - margin, 0) for i in range(dimension)]
+    upper = [min(box[i] + box[i+dimension] + margin, imageSize[i]) for i in range(dimension)]
+    return lower, [upper[i] - lower[i] for i in range(dimension)]
+
+def cropImages(image, mask, margin, name, directory):
+    '''Crop an image and its mask, returning the file names written'''
+    if image.GetSize() != mask.GetSize():
+        os.sys.exit('{n} image size {i} does not match mask size {m}. Exiting...'.format(
+            n=name, i=image.GetSize(), m=mask.GetSize()))
+    region = maskRegion(mask, margin)
+    if region is None:
+        os.sys.exit('{n} mask is empty. Exiting...'.format(n=name))
+    index, size = region
+    print('Cropping {n} to index {i} size {s} (from {f})'.format(n=name, i=index, s=size, f=image.GetSize()))
+
+    imageFileName = os.path.join(directory, '{n}.nii'.format(n=name))
+    maskFileName = os.path.join(directory, '{n}Mask.nii'.format(n=name))
+    sitk.WriteImage(sitk.RegionOfInterest(image, size, index), imageFileName)
+    sitk.WriteImage(sitk.RegionOfInterest(mask, size, index), maskFileName)
+    return imageFileName, maskFileName
+
+def gridParameters(size, spacing, origin, direction):
+    '''Return the elastix output grid parameters of an image geometry'''
+    dimension = len(size)
+    parameters = collections.OrderedDict()
+    parameters['Size'] = list(size)
+    parameters['Index'] = [0] * dimension
+    parameters['Spacing'] = [float(x) for x in spacing]
+    parameters['Origin'] = [float(x) for x in origin]
+    # Elastix stores the direction cosines column by column
+    parameters['Direction'] = [float(direction[j*dimension + i]) for i in range(dimension) for j in range(dimension)]
+    return parameters
+
+def geometricalCenter(size, spacing, origin, direction):
+    '''Physical centre of an image, as elastix GeometricalCenter initialization takes it'''
+    dimension = len(size)
+    offset = [spacing[j] * (size[j] - 1) / 2.0 for j in range(dimension)]
+    return [origin[i] + sum([direction[i*dimension + j] * offset[j] for j in range(dimension)]) for i in range(dimension)]
+
+def restoreFullGrid(transformFileName, image):
+    '''Point a transform parameter file at the full fixed image grid'''
+    parameters = elastixParameters.readParameterFile(transformFileName)
+    shutil.copyfile(transformFileName, transformFileName.replace('.txt', '.crop.txt'))
+    parameters.update(gridParameters(image.GetSize(), image.GetSpacing(), image.GetOrigin(), image.GetDirection()))
+    elastixParameters.writeParameterFile(parameters, transformFileName)
+
+def writeCenteringTransform(fixed, movingFileName, fileName):
+    '''Write the translation aligning the centres of the full fixed and moving images'''
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(movingFileName)
+    reader.ReadImageInformation()
+    fixedCenter = geometricalCenter(fixed.GetSize(), fixed.GetSpacing(), fixed.GetOrigin(), fixed.GetDirection())
+    movingCenter = geometricalCenter(reader.GetSize(), reader.GetSpacing(), reader.GetOrigin(), reader.GetDirection())
+    dimension = fixed.GetDimension()
+
+    parameters = collections.OrderedDict()
+    parameters['Transform'] = ['TranslationTransform']
+    parameters['NumberOfParameters'] = [dimension]
+    parameters['TransformParameters'] = [movingCenter[i] - fixedCenter[i] for i in range(dimension)]
+    parameters['InitialTransformParametersFileName'] = ['NoInitialTransform']
+    parameters['HowToCombineTransforms'] = ['Compose']
+    parameters['FixedImageDimension'] = [dimension]
+    parameters['MovingImageDimension'] = [dimension]
+    parameters['FixedInternalImagePixelType'] = ['float']
+    parameters['MovingInternalImagePixelType'] = ['float']
+    parameters.update(gridParameters(fixed.GetSize(), fixed.GetSpacing(), fixed.GetOrigin(), fixed.GetDirection()))
+    parameters['UseDirectionCosines'] = ['true']
+    elastixParameters.writeParameterFile(parameters, fileName)
+    print('Initial translation {}'.format(parameters['TransformParameters']))
+
+# Render the parameter files with the preset
+parameterFiles = []
+parameterTexts = []
+centerInitially = False
+for i, fileName in enumerate(args.parameters):
+    parameters = elastixParameters.renderParameters(fileName, args.preset)
+    # Centre the crop of the fixed image on the whole moving image through
+    # an initial transform instead, see the notes
+    if i == 0 and args.movingMask is None and \
+            parameters.get('AutomaticTransformInitialization', ['false'])[0] == 'true' and \
+            parameters.get('AutomaticTransformInitializationMethod', ['GeometricalCenter'])[0] == 'GeometricalCenter':
+        parameters['AutomaticTransformInitialization'] = ['false']
+        centerInitially = True
+    parameterFiles.append(os.path.join(args.outputDirectory, 'Parameters.{}.txt'.format(i)))
+    parameterTexts.append(elastixParameters.formatParameters(parameters))
+    elastixParameters.writeParameterFile(parameters, parameterFiles[-1])
+    print('Rendered {f} with {p} preset (hash {h})'.format(
+        f=fileName, p=args.preset, h=elastixParameters.parameterHash(parameters)))
+
+# Reuse a previous result if the parameters and inputs match
+if args.cache is not None:
+    print('Hashing inputs')
+    cacheKey = registrationCache.cacheKey(parameterTexts, inputFiles, [args.margin, args.movingMask is not None])
+    if registrationCache.restore(args.cache, cacheKey, args.outputDirectory):
+        print('Restored cached result {}'.format(cacheKey))
+        os.sys.exit(0)
+    print('No cached result for {}'.format(cacheKey))
+
+# Read inputs
+print('Reading in \"{}\"'.format(args.fixedImage))
+fixed = sitk.ReadImage(args.fixedImage)
+print('Reading in \"{}\"'.format(args.fixedMask))
+fixedMask = sitk.ReadImage(args.fixedMask)
+
+# Crop to the masks
+cropDirectory = tempfile.mkdtemp(prefix='crop', dir=args.outputDirectory)
+fixedCrop, fixedMaskCrop = cropImages(fixed, fixedMask, args.margin, 'fixed', cropDirectory)
+command = [args.elastix, '-f', fixedCrop, '-fMask', fixedMaskCrop]
+if args.movingMask is None:
+    command += ['-m', args.movingImage]
+    if centerInitially:
+        initialFileName = os.path.join(args.outputDirectory, 'TransformParameters.initial.txt')
+        writeCenteringTransform(fixed, args.movingImage, initialFileName)
+        command += ['-t0', initialFileName]
+else:
+    print('Reading in \"{}\"'.format(args.movingImage))
+    moving = sitk.ReadImage(args.movingImage)
+    print('Reading in \"{}\"'.format(args.movingMask))
+    movingMask = sitk.ReadImage(args.movingMask)
+    movingCrop, movingMaskCrop = cropImages(moving, movingMask, args.margin, 'moving', cropDirectory)
+    command += ['-m', movingCrop, '-mMask', movingMaskCrop]
+for fileName in parameterFiles:
+    command += ['-p', fileName]
+command += ['-out', args.outputDirectory, '-threads', str(args.nThreads)]
+
+# Register
+print('Running {}'.format(' '.join(command)))
+returnCode = subprocess.call(command)
+if not args.keep:
+    shutil.rmtree(cropDirectory)
+if returnCode != 0:
+    os.sys.exit('Elastix failed with return code {}. Exiting...'.format(returnCode))
+
+# Put the transforms back on the full image
+for transformFileName in sorted(glob.glob(os.path.join(args.outputDirectory, 'TransformParameters.[0-9]*.txt'))):
+    if transformFileName.endswith('.crop.txt'):
+        continue
+    print('Rewriting {} to the full image grid'.format(transformFileName))
+    restoreFullGrid(transformFileName, fixed)
+
+# Keep the result for next time
+if args.cache is not None:
+    print('Storing result as {}'.format(cacheKey))
+    registrationCache.store(args.cache, cacheKey, args.outputDirectory)
@@ -1,5 +1,6 @@
 # Hisotry:
 #   2017.05.08  Besler      Created
+#   2026.10.19  agent       Accept *.nii.gz, compressed on --nThreads threads
 #
 # Description:
 #   Smooth hand segmentations
@@ -18,6 +19,7 @@
 import os
 import argparse
 import vtk
+import niftiIO
 
 # Establish arguament parser to load the data
 parser = argparse.ArgumentParser(
@@ -49,8 +51,8 @@ if not os.path.isfile(args.inputFilename):
 
 for filename in [args.inputFilename, args.outputFilename]:
     # Check that our output is of type NIfTI
-    if not filename.lower().endswith('.nii'):
-        os.sys.exit('Output \"{filename}\" is not of type *.nii! Exiting...'.format(filename=filename))
+    if not niftiIO.isNIFTI(filename):
+        os.sys.exit('Output \"{filename}\" is not of type *.nii or *.nii.gz! Exiting...'.format(filename=filename))
 
 # Make sure we don't overwrite
 if os.path.isfile(args.outputFilename):
@@ -142,6 +144,5 @@ caster.Update()
 # Write
 writer = vtk.vtk.vtkNIFTIImageWriter()
 writer.SetInputConnection(caster.GetOutputPort())
-writer.SetFileName(args.outputFilename)
 print('Writing to file {}'.format(args.outputFilename))
-writer.Update()
+niftiIO.writeNIFTI(writer, args.outputFilename, args.nThreads, mask=True)
@@ -0,0 +1,85 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Convert between NIfTI label images and run-length encoded labels
+#
+# Notes:
+#   - The direction is taken from the file names: a NIfTI (*.nii, *.nii.gz)
+#       input is written as runs (*.rle.npz) and runs are written as NIfTI.
+#   - The label values and the voxel type are kept. See sparseLabels.py for
+#       the encoding.
+#   - NIfTI written from runs has no qform/sform, like the other scripts
+#       that write through vtkNIFTIImageWriter.
+#
+# Usage:
+#   python QCT_SparseLabels.py segmentation.nii segmentation.rle.npz
+#   python QCT_SparseLabels.py segmentation.rle.npz segmentation.nii.gz -n 4
+
+# Libraries
+import os
+import argparse
+import vtk
+import niftiIO
+import sparseLabels
+
+# Establish arguament parser to load the data
+parser = argparse.ArgumentParser(
+    description='Convert between NIfTI label images and run-length encoded labels',
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+parser.add_argument(
+    'inputImage',
+    help='The input NIfTI (*.nii, *.nii.gz) label image or run-length (*.rle.npz) file')
+parser.add_argument(
+    'outputImage',
+    help='The output run-length (*.rle.npz) file or NIfTI (*.nii, *.nii.gz) label image')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=1, type=int,
+    help='Number of threads used to compress *.nii.gz output')
+parser.add_argument(
+    '-f', '--force',
+    action='store_true',
+    help='Set to overwrite output without asking')
+args = parser.parse_args()
+
+# Check that the input exists
+if not os.path.isfile(args.inputImage):
+    os.sys.exit('Input \"{fileName}\" does not exist! Exiting...'.format(fileName=args.inputImage))
+
+# Check the conversion direction
+if niftiIO.isNIFTI(args.inputImage) and sparseLabels.isSparse(args.outputImage):
+    toRuns = True
+elif sparseLabels.isSparse(args.inputImage) and niftiIO.isNIFTI(args.outputImage):
+    toRuns = False
+else:
+    os.sys.exit('Can only convert *.nii or *.nii.gz to *.rle.npz or back, given \"{i}\" and \"{o}\". Exiting...'.format(
+        i=args.inputImage, o=args.outputImage))
+
+# Make sure we don't overwrite
+if os.path.exists(args.outputImage) and not args.force:
+    response = str(raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=args.outputImage)))
+    if not 'yes'.startswith(response.lower()):
+        os.sys.exit('Exiting to avoid overwrite...')
+
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
+# Convert
+print('Reading in \"{}\"'.format(args.inputImage))
+try:
+    labels = sparseLabels.readLabels(args.inputImage)
+except ValueError as e:
+    os.sys.exit('{e}. Exiting...'.format(e=e))
+volumes = sparseLabels.labelVolumes(labels)
+print('{r} runs over {d}, labels {l}'.format(r=len(labels['label']), d=labels['dimensions'], l=volumes))
+
+if toRuns:
+    print('Writing \"{}\"'.format(args.outputImage))
+    sparseLabels.save(labels, args.outputImage)
+else:
+    writer = vtk.vtkNIFTIImageWriter()
+    writer.SetInputData(sparseLabels.toImage(labels))
+    print('Writing \"{}\"'.format(args.outputImage))
+    niftiIO.writeNIFTI(writer, args.outputImage, args.nThreads, mask=True)
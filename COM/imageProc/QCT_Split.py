@@ -1,35 +1,73 @@
 # Hisotry:
 #   2017.03.14  Besler      Created
+#   2026.10.19  agent       Single read split with views and concurrent writers
+#   2026.10.19  agent       Automatic midline detection
+#   2026.10.19  agent       Accept *.nii.gz, compressed on --nThreads threads
+#   2026.10.19  agent       Read and write chunked (*.chunks) stores
 #
 # Description:
 #   Subselect femurs from whole CT image
 #
 # Notes:
 #   - Orientation: +z moves distal, +y moves anterior, +x moves left.
+#   - Both halves are numpy views of the one scalar buffer read from disk. The
+#       left half is flipped with a negative x stride, so no vtkExtractVOI or
+#       vtkImageFlip copies are made. The only copy is done by each writer
+#       thread when it makes its half contiguous.
+#   - Several images can be split in one process by giving more than one
+#       input/left/right triple. The next image is read while the previous
+#       image is being written.
+#   - With --auto the cut is placed at the valley between the femurs in the
+#       profile of bone voxels projected onto x. Confidence is one minus the
+#       valley height over the smaller of the two peaks. If the confidence is
+#       below --confidence the cut falls back to --dim.
+#   - Inputs and outputs may also be chunked (*.chunks) stores, see
+#       chunkedStore.py. Chunked outputs need a single component input.
+#
+# Usage:
+#   python QCT_Split.py input.nii left.nii right.nii
+#   python QCT_Split.py in1.nii left1.nii right1.nii in2.nii left2.nii right2.nii
+#   python QCT_Split.py input.nii left.nii right.nii --auto -t 250
 
 ## Libraries
 import os
 import argparse
 import vtk
+import numpy
+from vtk.util import numpy_support
+from multiprocessing.pool import ThreadPool
+import niftiIO
+import chunkedStore
 
 ## Establish arguament parser to load the data
 parser = argparse.ArgumentParser(
     description='Split left and right femurs. The left femur is also transformed into a right femur',
     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 parser.add_argument(
-    'inputImageFile',
-    help='The input NIfTI (*.nii) image)')
-parser.add_argument(
-    'outputLeftFemurImageFile',
-    help='Output NIfTI (*.nii) left femur file name')
-parser.add_argument(
-    'outputRightFemurImageFile',
-    help='Output NIfTI (*.nii) right femur file name')
+    'images',
+    nargs='+',
+    help='One or more triples of: the input NIfTI (*.nii) image, output NIfTI (*.nii) left femur file name and output NIfTI (*.nii) right femur file name')
 parser.add_argument(
     '-d', '--dim',
     default=float(0.5),
     type=float,
     help='Percent of axial distance to slice (between 0 and 1)')
+parser.add_argument(
+    '-a', '--auto',
+    action='store_true',
+    help='Find the cut plane from the bone projection profile, falling back to --dim if unsure')
+parser.add_argument(
+    '-t', '--threshold',
+    default=float(250), type=float,
+    help='The threshold for bone used by --auto')
+parser.add_argument(
+    '-c', '--confidence',
+    default=float(0.5), type=float,
+    help='Minimum midline confidence (between 0 and 1) before falling back to --dim')
+parser.add_argument(
+    '-n', '--nThreads',
+    default=2, type=int,
+    help='Number of writer threads, also used to compress *.nii.gz output')
 parser.add_argument(
     '-f', '--force',
     action='store_true',
@@ -37,78 +75,167 @@ parser.add_argument(
 args = parser.parse_args()
 
 ## Check our inputs
-# Check that the input is a directory
-if not os.path.isfile(args.inputImageFile):
-    os.sys.exit('Input \"{inputImageFile}\" does not exist! Exiting...'.format(inputImageFile=args.inputImageFile))
-
-# Check that our output is of type NIfTI
-for fileName in [args.inputImageFile, args.outputLeftFemurImageFile, args.outputRightFemurImageFile]:
-    if not fileName.lower().endswith('.nii'):
-        os.sys.exit('File \"{outputFilename}\" is not of type *.nii! Exiting...'.format(outputFilename=fileName))
-
-# Make sure we don't overwrite
-for fileName in [args.outputLeftFemurImageFile, args.outputRightFemurImageFile]:
-    if os.path.isfile(fileName):
-        if not args.force:
-            response = str(raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=fileName)))
-            if not 'yes'.startswith(response.lower()):
-                os.sys.exit('Exiting to avoid overwrite...')
+# Inputs come in triples of input, left and right
+if len(args.images) % 3 != 0:
+    os.sys.exit('Expected triples of input, left and right file names, given {n} names. Exiting...'.format(n=len(args.images)))
+jobs = [args.images[i:i+3] for i in range(0, len(args.images), 3)]
+
+for inputImageFile, outputLeftFemurImageFile, outputRightFemurImageFile in jobs:
+    # Check that the input is a file
+    if not os.path.exists(inputImageFile):
+        os.sys.exit('Input \"{inputImageFile}\" does not exist! Exiting...'.format(inputImageFile=inputImageFile))
+
+    # Check that our output is of type NIfTI or a chunked store
+    for fileName in [inputImageFile, outputLeftFemurImageFile, outputRightFemurImageFile]:
+        if not niftiIO.isNIFTI(fileName) and not chunkedStore.isChunked(fileName):
+            os.sys.exit('File \"{outputFilename}\" is not of type *.nii, *.nii.gz or *.chunks! Exiting...'.format(outputFilename=fileName))
+
+    # Make sure we don't overwrite
+    for fileName in [outputLeftFemurImageFile, outputRightFemurImageFile]:
+        if os.path.exists(fileName):
+            if not args.force:
+                response = str(raw_input('\"{outputFilename}\" exists. Overwrite? [Y/n]'.format(outputFilename=fileName)))
+                if not 'yes'.startswith(response.lower()):
+                    os.sys.exit('Exiting to avoid overwrite...')
 
 # Make sure our dimension is valid
 if args.dim > 1 or args.dim < 0:
     os.sys.exit('Dimenion percentage \"{dim}\" is not in [0,1]'.format(dim=args.dim))
+if args.confidence > 1 or args.confidence < 0:
+    os.sys.exit('Confidence \"{c}\" is not in [0,1]'.format(c=args.confidence))
+
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
+## Functions
+def splitImage(image, cutPoint):
+    '''Return (rightArray, rightExtent, leftArray, leftExtent) as views of image.
+
+    Arrays are indexed [z,y,x]. The left array is flipped along x so that the
+    left femur becomes a right femur.'''
+    dims = image.GetDimensions()
+    extent = image.GetExtent()
+    scalars = image.GetPointData().GetScalars()
+    array = numpy_support.vtk_to_numpy(scalars).reshape(
+        dims[2], dims[1], dims[0], scalars.GetNumberOfComponents())
+
+    rightArray = array[:, :, 0:cutPoint+1]
+    leftArray = array[:, :, cutPoint+1:dims[0]][:, :, ::-1]
+
+    # Extents match what vtkExtractVOI and vtkImageFlip would produce
+    rightExtent = [extent[0], extent[0]+cutPoint, extent[2], extent[3], extent[4], extent[5]]
+    leftExtent = [extent[0]+cutPoint+1, extent[1], extent[2], extent[3], extent[4], extent[5]]
+    return rightArray, rightExtent, leftArray, leftExtent
+
+def findMidline(image, threshold, slabSize=16, smoothing=5):
+    '''Return (cutPoint, confidence) of the sagittal plane between the femurs.
+
+    Bone voxels are counted per x column, giving a 1D profile. The cut is the
+    lowest point of the profile in the central half of the image.'''
+    dims = image.GetDimensions()
+    array = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+    array = array.reshape(dims[2], dims[1], dims[0], -1)
+
+    # Reduce a slab at a time so the mask never holds the whole volume
+    profile = numpy.zeros(dims[0], dtype=numpy.float64)
+    for z in range(0, dims[2], slabSize):
+        profile += numpy.count_nonzero(array[z:z+slabSize, :, :, 0] >= threshold, axis=(0, 1))
+    if smoothing > 1 and dims[0] >= smoothing:
+        profile = numpy.convolve(profile, numpy.ones(smoothing)/smoothing, mode='same')
+
+    # Take the middle of the flat bottom if there is one
+    lower = dims[0] // 4
+    upper = max(lower + 1, (3 * dims[0]) // 4)
+    window = profile[lower:upper]
+    valleys = numpy.flatnonzero(window == window.min())
+    cutPoint = lower + int(valleys[len(valleys) // 2])
+
+    leftPeak = profile[:cutPoint].max() if cutPoint > 0 else 0.0
+    rightPeak = profile[cutPoint+1:].max() if cutPoint < dims[0] - 1 else 0.0
+    smallerPeak = min(leftPeak, rightPeak)
+    if smallerPeak <= 0:
+        return cutPoint, 0.0
+    confidence = 1.0 - profile[cutPoint] / smallerPeak
+    return cutPoint, float(min(max(confidence, 0.0), 1.0))
+
+def writeView(array, extent, template, fileName):
+    '''Copy a view into a new vtkImageData shaped like template and write it'''
+    if chunkedStore.isChunked(fileName):
+        spacing = template.GetSpacing()
+        origin = [template.GetOrigin()[i] + extent[2*i]*spacing[i] for i in range(3)]
+        print('Writing {fileName}'.format(fileName=fileName))
+        chunkedStore.writeArray(array[..., 0], fileName, spacing, origin, nThreads=args.nThreads)
+        return fileName
+
+    # The writer needs a contiguous buffer. Keep a reference to it since
+    # numpy_to_vtk does not own the memory.
+    contiguous = numpy.ascontiguousarray(array).reshape(-1, array.shape[-1])
+    scalars = numpy_support.numpy_to_vtk(contiguous, deep=0,
+        array_type=template.GetScalarType())
+
+    image = vtk.vtkImageData()
+    image.SetExtent(extent)
+    image.SetSpacing(template.GetSpacing())
+    image.SetOrigin(template.GetOrigin())
+    image.GetPointData().SetScalars(scalars)
+
+    writer = vtk.vtkNIFTIImageWriter()
+    writer.SetInputData(image)
+    print('Writing {fileName}'.format(fileName=fileName))
+    niftiIO.writeNIFTI(writer, fileName, args.nThreads)
+    return fileName
 
 ## Algorithm
-# Read input
-reader = vtk.vtkNIFTIImageReader()
-reader.SetFileName(args.inputImageFile)
-print 'Reading in \"{fileName}\"'.format(fileName=args.inputImageFile)
-reader.Update()
-
-# Determine bounds (see: http://www.vtk.org/Wiki/VTK/Examples/Cxx/ImageData/ExtractVOI)
-inputDims = reader.GetOutput().GetDimensions()
-cutPoint = int(inputDims[0] * args.dim)
-if cutPoint < 0:
-    cutPoint = 0
-if cutPoint > inputDims[0]:
-    cutPoint = inputDims[0] - 2 # subtract 2 so there is a single x slice for left image.
-rightVOI = [    0,          cutPoint,       0, inputDims[1]-1, 0, inputDims[2]-1]
-leftVOI = [     cutPoint+1, inputDims[0]-1, 0, inputDims[1]-1, 0, inputDims[2]-1]
-print "Percentage:       {dim}".format(dim=args.dim)
-print "Input dimensions: {dims}".format(dims=inputDims)
-print "Right VOI:        {VOI}".format(VOI=rightVOI)
-print "Left VOI:         {VOI}".format(VOI=leftVOI)
-
-# Extract left
-rightExtractor = vtk.vtkExtractVOI()
-rightExtractor.SetInputConnection(reader.GetOutputPort())
-rightExtractor.SetVOI(rightVOI)
-print 'Extractiong right subvolume'
-rightExtractor.Update()
-
-# Extract right
-leftExtractor = vtk.vtkExtractVOI()
-leftExtractor.SetInputConnection(reader.GetOutputPort())
-leftExtractor.SetVOI(leftVOI)
-print 'Extractiong left subvolume'
-leftExtractor.Update()
-
-# Flip image (left becomes right)
-leftFlipper = vtk.vtkImageFlip()
-leftFlipper.SetInputConnection(leftExtractor.GetOutputPort())
-leftFlipper.SetFilteredAxis(0)
-print 'Flipping left subvolume'
-leftFlipper.Update()
-
-# Write data out
-rightWriter = vtk.vtkNIFTIImageWriter()
-rightWriter.SetInputConnection(rightExtractor.GetOutputPort())
-rightWriter.SetFileName(args.outputRightFemurImageFile)
-print "Writing {fileName}".format(fileName=args.outputRightFemurImageFile)
-rightWriter.Write()
-
-leftWriter = vtk.vtkNIFTIImageWriter()
-leftWriter.SetInputConnection(leftFlipper.GetOutputPort())
-leftWriter.SetFileName(args.outputLeftFemurImageFile)
-print "Writing {fileName}".format(fileName=args.outputLeftFemurImageFile)
-leftWriter.Write()
+pool = ThreadPool(args.nThreads)
+pending = []
+for inputImageFile, outputLeftFemurImageFile, outputRightFemurImageFile in jobs:
+    # Read input
+    print('Reading in \"{fileName}\"'.format(fileName=inputImageFile))
+    if chunkedStore.isChunked(inputImageFile):
+        image = chunkedStore.readImage(inputImageFile, nThreads=args.nThreads)
+    else:
+        reader = vtk.vtkNIFTIImageReader()
+        reader.SetFileName(inputImageFile)
+        reader.Update()
+        image = reader.GetOutput()
+
+    # Wait on the previous image so only two images are held in memory
+    for result in pending:
+        result.get()
+    pending = []
+
+    # Chunked stores hold a single component
+    if image.GetNumberOfScalarComponents() != 1 and \
+            any([chunkedStore.isChunked(f) for f in (outputLeftFemurImageFile, outputRightFemurImageFile)]):
+        os.sys.exit('Cannot write the {n} component image \"{i}\" to a chunked store. Exiting...'.format(
+            n=image.GetNumberOfScalarComponents(), i=inputImageFile))
+
+    # Determine bounds (see: http://www.vtk.org/Wiki/VTK/Examples/Cxx/ImageData/ExtractVOI)
+    inputDims = image.GetDimensions()
+    cutPoint = int(inputDims[0] * args.dim)
+    if args.auto:
+        midline, confidence = findMidline(image, args.threshold)
+        print("Midline:          {m} (confidence {c:.3f})".format(m=midline, c=confidence))
+        if confidence >= args.confidence:
+            cutPoint = midline
+        else:
+            print("Midline confidence below {c}, using percentage".format(c=args.confidence))
+    if cutPoint < 0:
+        cutPoint = 0
+    if cutPoint > inputDims[0] - 2:
+        cutPoint = inputDims[0] - 2 # subtract 2 so there is a single x slice for left image.
+    rightArray, rightVOI, leftArray, leftVOI = splitImage(image, cutPoint)
+    print("Percentage:       {dim}".format(dim=args.dim))
+    print("Input dimensions: {dims}".format(dims=inputDims))
+    print("Right VOI:        {VOI}".format(VOI=rightVOI))
+    print("Left VOI:         {VOI}".format(VOI=leftVOI))
+
+    # Write data out. The left view is flipped so left becomes right.
+    pending.append(pool.apply_async(writeView, (rightArray, rightVOI, image, outputRightFemurImageFile)))
+    pending.append(pool.apply_async(writeView, (leftArray, leftVOI, image, outputLeftFemurImageFile)))
+
+for result in pending:
+    result.get()
+pool.close()
+pool.join()
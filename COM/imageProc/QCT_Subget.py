@@ -1,6 +1,9 @@
 # History:
 #   2017.01.29  babesler    Created
 #   2017.03.14  babesler    Moved to only support nii for project
+#   2026.10.19  agent       Added multi-ROI extraction from a memory mapped read
+#   2026.10.19  agent       Accept *.nii.gz, compressed on --nThreads threads
+#   2026.10.19  agent       Read regions from chunked (*.chunks) stores
 #
 # Description:
 #   Small script to get a subset of an nii image
@@ -8,21 +11,40 @@
 # Notes:
 #   - Ranges are inclusive, so 55->99 starts at index 55 (56th element) and goes
 #       untill index 99 (total dimension of 50 elements).
+#   - With --rois, every box in a JSON or CSV file is cut from one memory
+#       mapped read of the input and written on --nThreads threads. Only the
+#       voxels inside the boxes are paged in from disk.
+#   - JSON ROI files hold a list of objects with keys output, lower, upper and
+#       optionally sample, each of lower/upper/sample being [x,y,z].
+#   - CSV ROI files have a header of output,lowerX,lowerY,lowerZ,upperX,upperY,upperZ
+#       and optionally sampleX,sampleY,sampleZ.
+#   - ROIs without a sample rate use --sample.
+#   - A chunked (*.chunks) input only reads the chunks overlapping each box,
+#       and always goes through the --rois path.
 #
 # Usage:
 #   python QCT_Subget.py input output -l 50 50 50 -u 99 99 99
+#   python QCT_Subget.py input --rois boxes.json -n 4
+#   python QCT_Subget.py input.chunks output.nii -l 50 50 50 -u 99 99 99
 
 import vtk
 import argparse
 import os
+import csv
+import json
+from multiprocessing.pool import ThreadPool
+from vtk.util import numpy_support
+import niftiIO
+import chunkedStore
 
 # Setup and parse command line arguments
 parser = argparse.ArgumentParser(description='Subget medical data',
                                 formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 parser.add_argument('inputImage',
-                    help='The input NIfTI (*.nii) image)')
+                    help='The input NIfTI (*.nii) image) or chunked (*.chunks) store')
 parser.add_argument('outputImage',
-                    help='The output NIfTI (*.nii) image)')
+                    nargs='?', default=None,
+                    help='The output NIfTI (*.nii) image). Not used with --rois')
 parser.add_argument('-l', '--lower',
                     default=(0,0,0), type=int, nargs=3,
                     help='The lower bound on (x,y,z)')
@@ -32,6 +54,12 @@ parser.add_argument('-u', '--upper',
 parser.add_argument('-s', '--sample',
                     default=(1,1,1), type=int, nargs=3,
                     help='The sample rate on (x,y,z)')
+parser.add_argument('-r', '--rois',
+                    default=None,
+                    help='JSON (*.json) or CSV (*.csv) file of boxes to extract instead of a single output')
+parser.add_argument('-n', '--nThreads',
+                    default=1, type=int,
+                    help='Number of writer threads for --rois, or compression threads for a single *.nii.gz output')
 parser.add_argument('-f', '--force',
                     action='store_true',
                     help='Set to overwrite output without asking')
@@ -39,60 +67,168 @@ args = parser.parse_args()
 lower = list(args.lower)
 upper = list(args.upper)
 
+# Functions
+def readROIs(fileName, defaultSample):
+    '''Read a list of boxes from a JSON or CSV file'''
+    rois = []
+    if fileName.lower().endswith('.json'):
+        with open(fileName, 'r') as f:
+            entries = json.load(f)
+        for entry in entries:
+            rois.append({
+                'output': entry['output'],
+                'lower': [int(x) for x in entry['lower']],
+                'upper': [int(x) for x in entry['upper']],
+                'sample': [int(x) for x in entry.get('sample', defaultSample)]})
+    elif fileName.lower().endswith('.csv'):
+        with open(fileName, 'r') as f:
+            for row in csv.DictReader(f):
+                sample = defaultSample
+                if row.get('sampleX'):
+                    sample = [int(row['sample' + axis]) for axis in 'XYZ']
+                rois.append({
+                    'output': row['output'],
+                    'lower': [int(row['lower' + axis]) for axis in 'XYZ'],
+                    'upper': [int(row['upper' + axis]) for axis in 'XYZ'],
+                    'sample': sample})
+    else:
+        os.sys.exit('ROI file \"{rois}\" is not a .json or .csv file. Exiting...'.format(rois=fileName))
+    return rois
+
+def clampBounds(lower, upper, dimensions):
+    '''Clamp bounds to the image and put them in the correct order'''
+    lower = list(lower)
+    upper = list(upper)
+    for i in range(len(lower)):
+        # Make sure bounds are in the correct order
+        if upper[i] < lower[i]:
+            upper[i], lower[i] = lower[i], upper[i]
+
+        # Check that lower is zero or greater
+        if lower[i] < 0:
+            lower[i] = 0
+
+        # Check that upper is not greater than dimensions
+        if upper[i] > dimensions[i] - 1:
+            upper[i] = dimensions[i] - 1
+    return lower, upper
+
+def extractROI(array, spacing, origin, scalarType, roi):
+    '''Cut one box out of the memory map (or chunked array) and write it.
+
+    The output geometry matches what vtkExtractVOI produces.'''
+    lower, upper, sample = roi['lower'], roi['upper'], roi['sample']
+    view = array[lower[2]:upper[2]+1:sample[2],
+                 lower[1]:upper[1]+1:sample[1],
+                 lower[0]:upper[0]+1:sample[0]]
+    spacing = list(spacing)
+    origin = list(origin)
+    if sample == [1, 1, 1]:
+        extent = [lower[0], upper[0], lower[1], upper[1], lower[2], upper[2]]
+    else:
+        extent = [0, view.shape[2]-1, 0, view.shape[1]-1, 0, view.shape[0]-1]
+        origin = [origin[i] + lower[i]*spacing[i] for i in range(3)]
+        spacing = [spacing[i]*sample[i] for i in range(3)]
+    image = niftiIO.arrayToImage(view, extent, spacing, origin, scalarType)
+
+    writer = vtk.vtkNIFTIImageWriter()
+    writer.SetInputData(image)
+    print("Writing {dims} to {fileName}".format(dims=image.GetDimensions(), fileName=roi['output']))
+    niftiIO.writeNIFTI(writer, roi['output'])
+    return roi['output']
+
 # Check that input file/dir exists
-if not os.path.isfile(args.inputImage):
+if not os.path.exists(args.inputImage):
     os.sys.exit('Input file \"{inputImage}\" does not exist. Exiting...'.format(inputImage=args.inputImage))
 
+# Read the boxes, falling back to the single box given on the command line
+if args.rois is None:
+    if args.outputImage is None:
+        os.sys.exit('Either an output image or --rois must be given. Exiting...')
+    rois = [{'output': args.outputImage, 'lower': lower, 'upper': upper, 'sample': list(args.sample)}]
+else:
+    if args.outputImage is not None:
+        os.sys.exit('Cannot give both an output image and --rois. Exiting...')
+    if not os.path.isfile(args.rois):
+        os.sys.exit('ROI file \"{rois}\" does not exist. Exiting...'.format(rois=args.rois))
+    rois = readROIs(args.rois, list(args.sample))
+
 # Check that output does not exist, or we can over write
-for fileName in [args.inputImage, args.outputImage]:
-    if not fileName.lower().endswith('.nii'):
-        os.sys.exit('Output file \"{outputImage}\" is not a .nii file. Exiting...'.format(outputImage=fileName))
-if os.path.isfile(args.outputImage):
-    if not args.force:
-        answer = raw_input('Output file \"{outputImage}\" exists. Overwrite? [Y/n]'.format(outputImage=args.outputImage))
-        if str(answer).lower() not in set(['yes','y', 'ye', '']):
-            os.sys.exit('Will not overwrite \"{inputFile}\". Exiting...'.
-            format(inputFile=args.outputImage))
-
-# Set reader
-reader = vtk.vtkNIFTIImageReader()
-reader.SetFileName(args.inputImage)
-print("Loading data...")
-reader.Update()
-dimensions = reader.GetOutput().GetDimensions()
-print("Loaded data with dimensions {dims}".format(dims=dimensions))
-
-# Specify bounds
-for i in range(len(lower)):
-    # Check that lower is zero or greater
-    if lower[i] < 0:
-        lower[i] = 0
-
-    # Check that upper is not greater than dimensions
-    if upper[i] > dimensions[i] - 1:
-        upper[i] = dimensions[i] - 1
-
-    # Make sure bounds are in the correct order
-    if upper[i] < lower[i]:
-        upper[i], lower[i] = lower[i], upper[i]
-
-print("Using lower bounds {l}".format(l=lower))
-print("Using upper bounds {u}".format(u=upper))
-
-# Setup extractor
-extractVOI = vtk.vtkExtractVOI()
-extractVOI.SetSampleRate(args.sample)
-extractVOI.SetVOI(  lower[0], upper[0],
-                    lower[1], upper[1],
-                    lower[2], upper[2])
-extractVOI.SetInputConnection(reader.GetOutputPort())
-print("Extracting...")
-extractVOI.Update()
-print("Extracted VOI has dimensions {dims}".format(dims=extractVOI.GetOutput().GetDimensions()))
-
-# Writer
-writer = vtk.vtkNIFTIImageWriter()
-writer.SetFileName(args.outputImage)
-writer.SetInputConnection(extractVOI.GetOutputPort())
-print("Writing to {}".format(args.outputImage))
-writer.Update()
+if not niftiIO.isNIFTI(args.inputImage) and not chunkedStore.isChunked(args.inputImage):
+    os.sys.exit('Input file \"{inputImage}\" is not a .nii, .nii.gz or .chunks file. Exiting...'.format(inputImage=args.inputImage))
+for fileName in [roi['output'] for roi in rois]:
+    if not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Output file \"{outputImage}\" is not a .nii or .nii.gz file. Exiting...'.format(outputImage=fileName))
+for roi in rois:
+    if os.path.isfile(roi['output']):
+        if not args.force:
+            answer = raw_input('Output file \"{outputImage}\" exists. Overwrite? [Y/n]'.format(outputImage=roi['output']))
+            if str(answer).lower() not in set(['yes','y', 'ye', '']):
+                os.sys.exit('Will not overwrite \"{inputFile}\". Exiting...'.
+                format(inputFile=roi['output']))
+    for rate in roi['sample']:
+        if rate < 1:
+            os.sys.exit('Sample rate must be one or greater, given {s}. Exiting...'.format(s=roi['sample']))
+
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
+chunked = chunkedStore.isChunked(args.inputImage)
+if args.rois is None and not chunked:
+    # Set reader
+    reader = vtk.vtkNIFTIImageReader()
+    reader.SetFileName(args.inputImage)
+    print("Loading data...")
+    reader.Update()
+    dimensions = reader.GetOutput().GetDimensions()
+    print("Loaded data with dimensions {dims}".format(dims=dimensions))
+
+    # Specify bounds
+    lower, upper = clampBounds(lower, upper, dimensions)
+    print("Using lower bounds {l}".format(l=lower))
+    print("Using upper bounds {u}".format(u=upper))
+
+    # Setup extractor
+    extractVOI = vtk.vtkExtractVOI()
+    extractVOI.SetSampleRate(args.sample)
+    extractVOI.SetVOI(  lower[0], upper[0],
+                        lower[1], upper[1],
+                        lower[2], upper[2])
+    extractVOI.SetInputConnection(reader.GetOutputPort())
+    print("Extracting...")
+    extractVOI.Update()
+    print("Extracted VOI has dimensions {dims}".format(dims=extractVOI.GetOutput().GetDimensions()))
+
+    # Writer
+    writer = vtk.vtkNIFTIImageWriter()
+    writer.SetInputConnection(extractVOI.GetOutputPort())
+    print("Writing to {}".format(args.outputImage))
+    niftiIO.writeNIFTI(writer, args.outputImage, args.nThreads)
+else:
+    # Map the input once, then cut every box from the map
+    print("Mapping data...")
+    try:
+        if chunked:
+            array = chunkedStore.ChunkedArray(args.inputImage, args.nThreads)
+            spacing = array.header['spacing']
+            origin = array.header['origin']
+            scalarType = numpy_support.get_vtk_array_type(array.dtype)
+        else:
+            array, reader = niftiIO.readNIFTI(args.inputImage)
+            spacing = reader.GetDataSpacing()
+            origin = reader.GetDataOrigin()
+            scalarType = reader.GetDataScalarType()
+    except ValueError as e:
+        os.sys.exit('{e}. Exiting...'.format(e=e))
+    dimensions = (array.shape[2], array.shape[1], array.shape[0])
+    print("Mapped data with dimensions {dims}".format(dims=dimensions))
+
+    for roi in rois:
+        roi['lower'], roi['upper'] = clampBounds(roi['lower'], roi['upper'], dimensions)
+
+    print("Extracting {n} ROIs with {t} threads".format(n=len(rois), t=args.nThreads))
+    pool = ThreadPool(args.nThreads)
+    pool.map(lambda roi: extractROI(array, spacing, origin, scalarType, roi), rois)
+    pool.close()
+    pool.join()
@@ -1,5 +1,6 @@
 # History:
 #   2017.04.10  babesler    Created
+#   2026.10.19  agent       Accept *.nii.gz, compressed on --nThreads threads
 #
 # Description:
 #   Threshold an image, output the mask
@@ -11,6 +12,7 @@
 #   python QCT_Threshold.py input output lower upper
 
 import vtk
+import niftiIO
 import argparse
 import os
 
@@ -33,6 +35,9 @@ parser.add_argument('-i', '--inValue',
 parser.add_argument('-o', '--outValue',
                     default=0,
                     help='The upper bound for thresholding')
+parser.add_argument('-n', '--nThreads',
+                    default=1, type=int,
+                    help='Number of threads used to compress *.nii.gz output')
 parser.add_argument('-f', '--force',
                     action='store_true',
                     help='Set to overwrite output without asking')
@@ -44,8 +49,8 @@ if not os.path.isfile(args.inputImage):
 
 # Check that output does not exist, or we can over write
 for fileName in [args.inputImage, args.outputImage]:
-    if not fileName.lower().endswith('.nii'):
-        os.sys.exit('Output file \"{outputImage}\" is not a .nii file. Exiting...'.format(outputImage=fileName))
+    if not niftiIO.isNIFTI(fileName):
+        os.sys.exit('Output file \"{outputImage}\" is not a .nii or .nii.gz file. Exiting...'.format(outputImage=fileName))
 if os.path.isfile(args.outputImage):
     if not args.force:
         answer = raw_input('Output file \"{outputImage}\" exists. Overwrite? [Y/n]'.format(outputImage=args.outputImage))
@@ -56,6 +61,10 @@ if os.path.isfile(args.outputImage):
 if args.upper is None and args.lower is None:
     os.sys.exit('Atleast upper or lower must be specified. Exiting...')
 
+# Check that the number of threads is valid
+if args.nThreads < 1:
+    os.sys.exit('Must have atleast one threads, asked for {}. Exiting...'.format(args.nThreads))
+
 # Set reader
 reader = vtk.vtkNIFTIImageReader()
 reader.SetFileName(args.inputImage)
@@ -83,7 +92,6 @@ thresh.Update()
 
 # Writer
 writer = vtk.vtkNIFTIImageWriter()
-writer.SetFileName(args.outputImage)
 writer.SetInputConnection(thresh.GetOutputPort())
 print("Writing to {}".format(args.outputImage))
-writer.Update()
+niftiIO.writeNIFTI(writer, args.outputImage, args.nThreads, mask=True)
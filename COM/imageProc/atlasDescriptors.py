@@ -0,0 +1,125 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Cheap global descriptors for ranking atlases against a target
+#
+# Notes:
+#   - Descriptors are computed on the bone in an image: voxels at or above a
+#       threshold, kept to the largest connected component and optionally to
+#       a region mask. Atlases and targets are described the same way, so a
+#       target does not need a segmentation.
+#   - The descriptors are the bone volume, the bone length along its
+#       principal axis, a normalized intensity histogram of the bone and the
+#       principal axis itself.
+#   - Distances are standardized by the spread of each descriptor over the
+#       index, so no descriptor dominates because of its units.
+#   - The index is <library>/descriptors.json and carries the settings it
+#       was built with. Queries reuse those settings.
+#   - Atlases are described on the pyramid level shrunk by shrinkFactor (see
+#       atlasLibrary.py), and targets after the same smoothing and shrinking.
+#
+# Usage:
+#   import atlasDescriptors
+#   descriptor = atlasDescriptors.describe(image, threshold=250)
+#   index = atlasDescriptors.readIndex('atlases')
+#   ranking = atlasDescriptors.rank(index, descriptor)
+
+import os
+import json
+import numpy as np
+import SimpleITK as sitk
+
+indexName = 'descriptors.json'
+defaultSettings = {
+    'threshold': 250.0,
+    'histogramRange': [-500.0, 2000.0],
+    'histogramBins': 32,
+    'shrinkFactor': 2}
+minimumSpread = 0.01
+
+def boneMask(image, threshold, region=None):
+    '''Largest connected component of the image at or above threshold'''
+    bone = sitk.Cast(image >= threshold, sitk.sitkUInt8)
+    if region is not None:
+        bone = bone * sitk.Cast(region != 0, sitk.sitkUInt8)
+    components = sitk.RelabelComponent(sitk.ConnectedComponent(bone), sortByObjectSize=True)
+    return components == 1
+
+def describe(image, threshold=defaultSettings['threshold'], region=None,
+             histogramRange=defaultSettings['histogramRange'], histogramBins=defaultSettings['histogramBins']):
+    '''Return the descriptor dict of an image'''
+    bone = sitk.GetArrayFromImage(boneMask(image, threshold, region)).astype(bool)
+    indices = np.nonzero(bone)
+    if len(indices[0]) == 0:
+        raise ValueError('No voxels at or above {} in the image'.format(threshold))
+
+    # Physical coordinates of the bone voxels, x first
+    spacing = np.array(image.GetSpacing())
+    direction = np.array(image.GetDirection()).reshape(3, 3)
+    points = np.stack(indices[::-1], axis=1) * spacing
+    points = points.dot(direction.T) + np.array(image.GetOrigin())
+
+    # Principal axes from the second moments
+    centred = points - points.mean(axis=0)
+    values, vectors = np.linalg.eigh(centred.T.dot(centred) / len(points))
+    axis = vectors[:, np.argmax(values)]
+    if axis[2] < 0:
+        axis = -axis
+    projection = centred.dot(axis)
+    length = np.percentile(projection, 99.5) - np.percentile(projection, 0.5)
+
+    intensities = sitk.GetArrayViewFromImage(image)[bone]
+    histogram, _ = np.histogram(intensities, bins=histogramBins, range=histogramRange)
+    histogram = histogram / float(max(histogram.sum(), 1))
+
+    return {
+        'volume': float(len(points) * np.prod(spacing)),
+        'length': float(length),
+        'axis': [float(x) for x in axis],
+        'histogram': [float(x) for x in histogram]}
+
+def readIndex(library):
+    '''Read the descriptor index of a library'''
+    fileName = os.path.join(library, indexName)
+    if not os.path.isfile(fileName):
+        raise ValueError('No descriptor index in \"{}\"'.format(library))
+    with open(fileName, 'r') as f:
+        return json.load(f)
+
+def writeIndex(library, index):
+    '''Write the descriptor index of a library'''
+    with open(os.path.join(library, indexName), 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+
+def distances(index, descriptor):
+    '''Return (names, distance per descriptor) with one row per atlas'''
+    names = sorted(index['atlases'].keys())
+    atlases = [index['atlases'][name] for name in names]
+    volume = np.log([atlas['volume'] for atlas in atlases]) - np.log(descriptor['volume'])
+    length = np.log([atlas['length'] for atlas in atlases]) - np.log(descriptor['length'])
+    # Hellinger distance between histograms
+    histograms = np.sqrt([atlas['histogram'] for atlas in atlases])
+    histogram = np.sqrt(np.sum((histograms - np.sqrt(descriptor['histogram']))**2, axis=1) / 2.0)
+    # Angle between principal axes, which have no sign
+    cosines = np.abs(np.array([atlas['axis'] for atlas in atlases]).dot(descriptor['axis']))
+    angle = np.arccos(np.clip(cosines, 0.0, 1.0))
+    return names, np.stack([np.abs(volume), np.abs(length), histogram, angle], axis=1)
+
+def rank(index, descriptor, weights=(1.0, 1.0, 1.0, 1.0)):
+    '''Return [(name, score)] sorted from most to least similar'''
+    names, terms = distances(index, descriptor)
+    spread = np.array(index['spread'])
+    scores = (terms / spread).dot(np.array(weights, dtype=float))
+    order = np.argsort(scores)
+    return [(names[i], float(scores[i])) for i in order]
+
+def spreads(index):
+    '''Typical distance of each descriptor over the index, used to standardize'''
+    names = sorted(index['atlases'].keys())
+    terms = np.zeros((len(names), 4))
+    for i, name in enumerate(names):
+        terms[i] = distances(index, index['atlases'][name])[1].mean(axis=0)
+    spread = terms.mean(axis=0) * len(names) / max(len(names) - 1, 1)
+    # Floor the spread so near identical atlases do not amplify noise
+    return [max(float(x), minimumSpread) for x in spread]
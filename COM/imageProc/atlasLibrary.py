@@ -0,0 +1,159 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   A directory of atlases with precomputed pyramids, a manifest and checksums
+#
+# Notes:
+#   - Layout is <library>/manifest.json plus one directory per atlas holding
+#       image.nii, mask.nii (always short, for Elastix), optionally
+#       boneRegion.nii and segmentation.nii, and pyramid/R<level>.nii.
+#       Compressed (*.nii.gz) inputs keep their extension.
+#   - Pyramid levels follow the default Elastix schedule for
+#       NumberOfResolutions levels: level r is shrunk by 2^(levels-1-r) after
+#       a recursive Gaussian with sigma of half the shrink factor in voxels,
+#       the same smoothing FixedRecursiveImagePyramid uses. The last level is
+#       the image itself and is not stored twice.
+#   - QCT_AtlasPrefilter.py describes atlases on a coarse level, and targets
+#       are shrunk with pyramidLevel to match.
+#   - Every file has a SHA-1 in the manifest. Files are checked when read
+#       unless verify=False is given.
+#   - The manifest is written to a temporary file and renamed, so readers
+#       never see a partial manifest.
+#
+# Usage:
+#   import atlasLibrary
+#   atlasLibrary.addAtlas('atlases', 'QCTCAL_0001_R', 'image.nii', 'mask.nii')
+#   files = atlasLibrary.atlasFiles('atlases', 'QCTCAL_0001_R')
+#   coarse = atlasLibrary.readPyramidLevel('atlases', 'QCTCAL_0001_R', 0)
+#   halved = atlasLibrary.readShrunkImage('atlases', 'QCTCAL_0001_R', 2)
+
+import os
+import json
+import shutil
+import tempfile
+import SimpleITK as sitk
+import registrationCache
+import niftiIO
+
+manifestName = 'manifest.json'
+manifestVersion = 1
+
+def readManifest(library):
+    '''Read the manifest of a library, or an empty one if there is none'''
+    fileName = os.path.join(library, manifestName)
+    if not os.path.isfile(fileName):
+        return {'version': manifestVersion, 'atlases': {}}
+    with open(fileName, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != manifestVersion:
+        raise ValueError('Unsupported atlas library version {} in \"{}\"'.format(manifest.get('version'), library))
+    return manifest
+
+def writeManifest(library, manifest):
+    '''Atomically replace the manifest of a library'''
+    handle, temporary = tempfile.mkstemp(prefix='.manifest', dir=library)
+    with os.fdopen(handle, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.rename(temporary, os.path.join(library, manifestName))
+
+def shrinkFactors(levels):
+    '''Shrink factor of each level, coarsest first'''
+    return [2 ** (levels - 1 - level) for level in range(levels)]
+
+def pyramidLevel(image, factor):
+    '''Smooth and shrink an image like FixedRecursiveImagePyramid'''
+    if factor == 1:
+        return image
+    sigma = [0.5 * factor * spacing for spacing in image.GetSpacing()]
+    smoothed = sitk.SmoothingRecursiveGaussian(sitk.Cast(image, sitk.sitkFloat32), sigma)
+    shrunk = sitk.Shrink(smoothed, [factor] * image.GetDimension())
+    return sitk.Cast(shrunk, image.GetPixelID())
+
+def addAtlas(library, name, image, mask, boneRegion=None, segmentation=None, levels=6):
+    '''Copy an atlas into the library and build its pyramid'''
+    if not os.path.isdir(library):
+        os.makedirs(library)
+    manifest = readManifest(library)
+    directory = os.path.join(library, name)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(os.path.join(directory, 'pyramid'))
+
+    files = {}
+    files['image'] = os.path.join(name, 'image' + niftiIO.niftiExtension(image))
+    shutil.copyfile(image, os.path.join(library, files['image']))
+
+    # Masks must be short for Elastix
+    maskImage = sitk.ReadImage(mask)
+    if maskImage.GetPixelID() != sitk.sitkInt16:
+        maskImage = sitk.Cast(maskImage, sitk.sitkInt16)
+    files['mask'] = os.path.join(name, 'mask' + niftiIO.niftiExtension(mask))
+    sitk.WriteImage(maskImage, os.path.join(library, files['mask']))
+
+    for key, fileName in [('boneRegion', boneRegion), ('segmentation', segmentation)]:
+        if fileName is not None:
+            files[key] = os.path.join(name, key + niftiIO.niftiExtension(fileName))
+            shutil.copyfile(fileName, os.path.join(library, files[key]))
+
+    # Build the pyramid, coarsest level first
+    intensity = sitk.ReadImage(image)
+    pyramid = []
+    for level, factor in enumerate(shrinkFactors(levels)):
+        if factor == 1:
+            pyramid.append(files['image'])
+            continue
+        levelName = os.path.join(name, 'pyramid', 'R{}.nii'.format(level))
+        sitk.WriteImage(pyramidLevel(intensity, factor), os.path.join(library, levelName))
+        pyramid.append(levelName)
+
+    checksums = {}
+    for relative in list(files.values()) + pyramid:
+        checksums[relative] = registrationCache.fileHash(os.path.join(library, relative))
+    manifest['atlases'][name] = {
+        'files': files,
+        'pyramid': pyramid,
+        'shrinkFactors': shrinkFactors(levels),
+        'checksums': checksums}
+    writeManifest(library, manifest)
+    return manifest['atlases'][name]
+
+def verifyAtlas(library, name, manifest=None):
+    '''Return the files of an atlas whose checksum does not match'''
+    if manifest is None:
+        manifest = readManifest(library)
+    bad = []
+    for relative, checksum in manifest['atlases'][name]['checksums'].items():
+        fileName = os.path.join(library, relative)
+        if not os.path.isfile(fileName) or registrationCache.fileHash(fileName) != checksum:
+            bad.append(relative)
+    return sorted(bad)
+
+def checkedPath(library, entry, relative, verify):
+    '''Absolute path of a library file, checking its checksum if asked'''
+    fileName = os.path.join(library, relative)
+    if verify and registrationCache.fileHash(fileName) != entry['checksums'][relative]:
+        raise ValueError('Checksum mismatch for \"{}\"'.format(fileName))
+    return fileName
+
+def atlasFiles(library, name, verify=True):
+    '''Return a dict of the image, mask, boneRegion and segmentation paths of an atlas'''
+    manifest = readManifest(library)
+    if name not in manifest['atlases']:
+        raise KeyError('No atlas \"{}\" in \"{}\"'.format(name, library))
+    entry = manifest['atlases'][name]
+    return dict([(key, checkedPath(library, entry, relative, verify)) for key, relative in entry['files'].items()])
+
+def readPyramidLevel(library, name, level, verify=True):
+    '''Read one pyramid level of an atlas, 0 being the coarsest'''
+    manifest = readManifest(library)
+    entry = manifest['atlases'][name]
+    return sitk.ReadImage(checkedPath(library, entry, entry['pyramid'][level], verify))
+
+def readShrunkImage(library, name, factor, verify=True):
+    '''Read the pyramid level of an atlas shrunk by factor'''
+    manifest = readManifest(library)
+    entry = manifest['atlases'][name]
+    if factor not in entry['shrinkFactors']:
+        raise ValueError('Atlas "{}" has no pyramid level shrunk by {}'.format(name, factor))
+    return readPyramidLevel(library, name, entry['shrinkFactors'].index(factor), verify)
@@ -0,0 +1,239 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Chunked, compressed storage for intermediate volumes
+#
+# Notes:
+#   - A store is a directory (named *.chunks by convention) holding
+#       header.json and one zlib compressed file per chunk. The header
+#       carries the dimensions, chunk size, dtype, spacing and origin.
+#   - Chunk files are named k.j.i, the chunk index along z, y and x. Chunks
+#       on the upper edges are smaller than the chunk size. Chunks that are
+#       all fillValue are not stored, which keeps masks small.
+#   - Regions are given as inclusive [x,y,z] lower and upper bounds, like
+#       QCT_Subget.py. Arrays are indexed [z,y,x].
+#   - Only the chunks overlapping a region are read. Chunks are compressed
+#       and decompressed on a thread pool.
+#   - Each chunk is written to a temporary file and renamed, so a reader
+#       never sees half a chunk. Writing different regions from different
+#       processes is only safe if they do not share chunks.
+#   - The extent of a vtkImageData is folded into the origin when written,
+#       so stores always start at index zero.
+#
+# Usage:
+#   import chunkedStore
+#   chunkedStore.writeImage(reader.GetOutput(), 'image.chunks', nThreads=4)
+#   slab = chunkedStore.readRegion('image.chunks', [0, 0, 100], [511, 511, 131])
+#   image = chunkedStore.readImage('image.chunks', [0, 0, 100], [511, 511, 131])
+
+import os
+import json
+import zlib
+import shutil
+import tempfile
+import itertools
+from multiprocessing.pool import ThreadPool
+import numpy
+from vtk.util import numpy_support
+import niftiIO
+
+headerName = 'header.json'
+storeVersion = 1
+defaultChunkSize = (64, 64, 64)
+
+def isChunked(fileName):
+    '''True if fileName names a chunked (*.chunks) store'''
+    return fileName.rstrip('/').lower().endswith('.chunks')
+
+def readHeader(directory):
+    '''Read the header of a store'''
+    fileName = os.path.join(directory, headerName)
+    if not os.path.isfile(fileName):
+        raise ValueError('\"{}\" is not a chunked store'.format(directory))
+    with open(fileName, 'r') as f:
+        header = json.load(f)
+    if header.get('version') != storeVersion:
+        raise ValueError('Unsupported chunked store version {} in \"{}\"'.format(header.get('version'), directory))
+    return header
+
+def createStore(directory, dimensions, dtype, spacing, origin, chunkSize=defaultChunkSize, level=1, fillValue=0):
+    '''Create an empty store, replacing any store already in directory'''
+    if os.path.isdir(directory):
+        if not os.path.isfile(os.path.join(directory, headerName)):
+            raise ValueError('\"{}\" exists and is not a chunked store'.format(directory))
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    header = {
+        'version': storeVersion,
+        'dimensions': [int(x) for x in dimensions],
+        'chunkSize': [int(x) for x in chunkSize],
+        'dtype': numpy.dtype(dtype).str,
+        'spacing': [float(x) for x in spacing],
+        'origin': [float(x) for x in origin],
+        'compression': 'zlib',
+        'level': int(level),
+        'fillValue': fillValue}
+    with open(os.path.join(directory, headerName), 'w') as f:
+        json.dump(header, f, indent=2, sort_keys=True)
+    return header
+
+def chunkBounds(header, index):
+    '''Return ([x,y,z] lower, [x,y,z] upper) voxel bounds of a chunk, inclusive'''
+    lower = [index[i] * header['chunkSize'][i] for i in range(3)]
+    upper = [min(lower[i] + header['chunkSize'][i], header['dimensions'][i]) - 1 for i in range(3)]
+    return lower, upper
+
+def chunkIndices(header, lower, upper):
+    '''Every [x,y,z] chunk index overlapping a region'''
+    ranges = [range(lower[i] // header['chunkSize'][i], upper[i] // header['chunkSize'][i] + 1) for i in range(3)]
+    return [list(index) for index in itertools.product(*ranges)]
+
+def chunkFileName(directory, index):
+    '''File name of the chunk with [x,y,z] index'''
+    return os.path.join(directory, '{}.{}.{}'.format(index[2], index[1], index[0]))
+
+def checkRegion(header, lower, upper):
+    '''Raise ValueError if a region is not inside the store'''
+    for i in range(3):
+        if lower[i] < 0 or upper[i] >= header['dimensions'][i] or lower[i] > upper[i]:
+            raise ValueError('Region {l} to {u} is outside of dimensions {d}'.format(
+                l=list(lower), u=list(upper), d=header['dimensions']))
+
+def readChunk(directory, header, index):
+    '''Read one chunk as a [z,y,x] array'''
+    lower, upper = chunkBounds(header, index)
+    shape = [upper[i] - lower[i] + 1 for i in (2, 1, 0)]
+    fileName = chunkFileName(directory, index)
+    if not os.path.isfile(fileName):
+        return numpy.full(shape, header['fillValue'], dtype=header['dtype'])
+    with open(fileName, 'rb') as f:
+        data = zlib.decompress(f.read())
+    return numpy.frombuffer(data, dtype=header['dtype']).reshape(shape)
+
+def writeChunk(directory, header, index, chunk):
+    '''Write one chunk, dropping it if it is all fill value'''
+    fileName = chunkFileName(directory, index)
+    if numpy.all(chunk == header['fillValue']):
+        if os.path.isfile(fileName):
+            os.remove(fileName)
+        return
+    data = zlib.compress(numpy.ascontiguousarray(chunk, dtype=header['dtype']).tobytes(), header['level'])
+    handle, temporary = tempfile.mkstemp(prefix='.chunk', dir=directory)
+    with os.fdopen(handle, 'wb') as f:
+        f.write(data)
+    os.rename(temporary, fileName)
+
+def overlap(lower, upper, chunkLower, chunkUpper):
+    '''Return (region slices, chunk slices) of the overlap, both [z,y,x]'''
+    start = [max(lower[i], chunkLower[i]) for i in range(3)]
+    stop = [min(upper[i], chunkUpper[i]) + 1 for i in range(3)]
+    region = tuple(slice(start[i] - lower[i], stop[i] - lower[i]) for i in (2, 1, 0))
+    chunk = tuple(slice(start[i] - chunkLower[i], stop[i] - chunkLower[i]) for i in (2, 1, 0))
+    return region, chunk
+
+def readRegion(directory, lower, upper, header=None, nThreads=1):
+    '''Read the inclusive [x,y,z] region lower to upper as a [z,y,x] array'''
+    if header is None:
+        header = readHeader(directory)
+    checkRegion(header, lower, upper)
+    region = numpy.empty([upper[i] - lower[i] + 1 for i in (2, 1, 0)], dtype=header['dtype'])
+
+    def readInto(index):
+        chunkLower, chunkUpper = chunkBounds(header, index)
+        regionSlices, chunkSlices = overlap(lower, upper, chunkLower, chunkUpper)
+        region[regionSlices] = readChunk(directory, header, index)[chunkSlices]
+
+    pool = ThreadPool(nThreads)
+    pool.map(readInto, chunkIndices(header, lower, upper))
+    pool.close()
+    pool.join()
+    return region
+
+def writeRegion(directory, array, lower, header=None, nThreads=1):
+    '''Write a [z,y,x] array with its first voxel at [x,y,z] lower'''
+    if header is None:
+        header = readHeader(directory)
+    upper = [lower[i] + array.shape[2 - i] - 1 for i in range(3)]
+    checkRegion(header, lower, upper)
+
+    def writeFrom(index):
+        chunkLower, chunkUpper = chunkBounds(header, index)
+        regionSlices, chunkSlices = overlap(lower, upper, chunkLower, chunkUpper)
+        if all(chunkLower[i] >= lower[i] and chunkUpper[i] <= upper[i] for i in range(3)):
+            chunk = array[regionSlices]
+        else:
+            # Partly covered, so merge with what is already stored
+            chunk = readChunk(directory, header, index).copy()
+            chunk[chunkSlices] = array[regionSlices]
+        writeChunk(directory, header, index, chunk)
+
+    pool = ThreadPool(nThreads)
+    pool.map(writeFrom, chunkIndices(header, lower, upper))
+    pool.close()
+    pool.join()
+
+def writeArray(array, directory, spacing, origin, chunkSize=defaultChunkSize, level=1, nThreads=1):
+    '''Write a whole [z,y,x] array as a new store'''
+    dimensions = [array.shape[2], array.shape[1], array.shape[0]]
+    header = createStore(directory, dimensions, array.dtype, spacing, origin, chunkSize, level)
+    # Write a slab of chunks at a time so views of memory maps are read once
+    step = header['chunkSize'][2]
+    for z in range(0, dimensions[2], step):
+        writeRegion(directory, array[z:z+step], [0, 0, z], header, nThreads)
+    return header
+
+def writeImage(image, directory, chunkSize=defaultChunkSize, level=1, nThreads=1):
+    '''Write a single component vtkImageData as a new store'''
+    if image.GetNumberOfScalarComponents() != 1:
+        raise ValueError('Cannot store multi-component images')
+    dimensions = image.GetDimensions()
+    extent = image.GetExtent()
+    spacing = image.GetSpacing()
+    origin = [image.GetOrigin()[i] + extent[2*i] * spacing[i] for i in range(3)]
+    array = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars()).reshape(dimensions[::-1])
+    return writeArray(array, directory, spacing, origin, chunkSize, level, nThreads)
+
+def readImage(directory, lower=None, upper=None, nThreads=1):
+    '''Read a region (default everything) as vtkImageData.
+
+    The extent is the region, like vtkExtractVOI, so the physical position
+    of every voxel is kept.'''
+    header = readHeader(directory)
+    if lower is None:
+        lower = [0, 0, 0]
+    if upper is None:
+        upper = [x - 1 for x in header['dimensions']]
+    array = readRegion(directory, lower, upper, header, nThreads)
+    extent = [lower[0], upper[0], lower[1], upper[1], lower[2], upper[2]]
+    return niftiIO.arrayToImage(array, extent, header['spacing'], header['origin'])
+
+class ChunkedArray(object):
+    '''Read-only [z,y,x] array over a store that reads chunks when sliced.
+
+    Only slices (with positive steps) are supported.'''
+    def __init__(self, directory, nThreads=1):
+        self.directory = directory
+        self.header = readHeader(directory)
+        self.nThreads = nThreads
+        self.shape = tuple(self.header['dimensions'][::-1])
+        self.dtype = numpy.dtype(self.header['dtype'])
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = index + (slice(None),) * (3 - len(index))
+        ranges = []
+        for axisIndex, length in zip(index, self.shape):
+            if not isinstance(axisIndex, slice):
+                raise TypeError('ChunkedArray only supports slicing')
+            start, stop, step = axisIndex.indices(length)
+            if step < 1:
+                raise TypeError('ChunkedArray only supports positive steps')
+            ranges.append((start, stop, step))
+        if any(start >= stop for start, stop, step in ranges):
+            return numpy.empty([0, 0, 0], dtype=self.dtype)
+        lower = [ranges[i][0] for i in (2, 1, 0)]
+        upper = [ranges[i][1] - 1 for i in (2, 1, 0)]
+        region = readRegion(self.directory, lower, upper, self.header, self.nThreads)
+        return region[::ranges[0][2], ::ranges[1][2], ::ranges[2][2]]
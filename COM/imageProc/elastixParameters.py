@@ -0,0 +1,118 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Read and write Elastix parameter and transform parameter files
+#
+# Notes:
+#   - Parameters are kept in an OrderedDict of name to a list of values so a
+#       file can be read, edited and written back in the same order.
+#   - Quoted values become strings, everything else becomes an int or float.
+#       Comments are dropped.
+#   - Presets change the cost of a registration. 'draft' is for quick
+#       previews on large cohorts, 'standard' is the shipped Affine.txt and
+#       BSpline.txt, 'high' is for final results. A preset only changes
+#       parameters that are already in the base file.
+#   - parameterHash() is the SHA-1 of the rendered text, so two parameter sets
+#       that render the same share a hash.
+#
+# Usage:
+#   import elastixParameters
+#   parameters = elastixParameters.readParameterFile('TransformParameters.0.txt')
+#   parameters['Size'] = [512, 512, 300]
+#   elastixParameters.writeParameterFile(parameters, 'TransformParameters.0.txt')
+#   draft = elastixParameters.renderParameters('BSpline.txt', 'draft')
+
+import re
+import hashlib
+from collections import OrderedDict
+
+entryPattern = re.compile(r'^\s*\(\s*(\w+)\s*(.*?)\s*\)\s*$')
+valuePattern = re.compile(r'"[^"]*"|[^\s"]+')
+codePattern = re.compile(r'^((?:[^"/]|"[^"]*"|/(?!/))*)')
+
+presets = OrderedDict([
+    ('draft', OrderedDict([
+        ('NumberOfResolutions', [4]),
+        ('MaximumNumberOfIterations', [250]),
+        ('NumberOfSpatialSamples', [2000]),
+        ('FinalGridSpacingInVoxels', [16])])),
+    ('standard', OrderedDict()),
+    ('high', OrderedDict([
+        ('MaximumNumberOfIterations', [4000]),
+        ('NumberOfSpatialSamples', [8000]),
+        ('FinalGridSpacingInVoxels', [4]),
+        ('BSplineInterpolationOrder', [3])]))])
+
+def parseValue(token):
+    '''Turn one token into a str, int or float'''
+    if token.startswith('"'):
+        return token.strip('"')
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+def formatValue(value):
+    '''Turn one value into an Elastix token'''
+    if isinstance(value, bool):
+        return '"{}"'.format(str(value).lower())
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    return '"{}"'.format(value)
+
+def parseParameters(text):
+    '''Parse the text of a parameter file into an OrderedDict'''
+    parameters = OrderedDict()
+    for line in text.splitlines():
+        # Drop comments, leaving any // inside quotes alone
+        line = codePattern.match(line).group(1)
+        match = entryPattern.match(line)
+        if match is None:
+            continue
+        parameters[match.group(1)] = [parseValue(token) for token in valuePattern.findall(match.group(2))]
+    return parameters
+
+def formatParameters(parameters):
+    '''Render an OrderedDict of parameters as parameter file text'''
+    lines = []
+    for name, values in parameters.items():
+        lines.append('({name} {values})'.format(
+            name=name, values=' '.join([formatValue(value) for value in values])))
+    return '\n'.join(lines) + '\n'
+
+def readParameterFile(fileName):
+    '''Read a parameter file into an OrderedDict'''
+    with open(fileName, 'r') as f:
+        return parseParameters(f.read())
+
+def writeParameterFile(parameters, fileName):
+    '''Write an OrderedDict of parameters to fileName'''
+    with open(fileName, 'w') as f:
+        f.write(formatParameters(parameters))
+
+def renderParameters(fileName, preset='standard', overrides=None):
+    '''Read a base parameter file and apply a preset, then any overrides.
+
+    overrides is a dict of name to list of values. Unlike presets, overrides
+    are added even if they are not in the base file.'''
+    if preset not in presets:
+        raise ValueError('Unknown preset \"{}\", choose from {}'.format(preset, list(presets.keys())))
+    parameters = readParameterFile(fileName)
+    for name, values in presets[preset].items():
+        if name in parameters:
+            parameters[name] = list(values)
+    if overrides is not None:
+        for name, values in overrides.items():
+            parameters[name] = list(values)
+    return parameters
+
+def parameterHash(parameters):
+    '''SHA-1 of the rendered parameters'''
+    return hashlib.sha1(formatParameters(parameters).encode('utf-8')).hexdigest()
@@ -0,0 +1,142 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Build SimpleITK transforms from Elastix transform parameter files
+#
+# Notes:
+#   - Follows InitialTransformParametersFileName, so reading the last file
+#       written by elastix gives the whole chain. Elastix composes the chain
+#       as T(x) = Tn(...T1(T0(x))), which is the order CompositeTransform
+#       applies its transforms in when Tn is added first.
+#   - Supports TranslationTransform, EulerTransform, SimilarityTransform,
+#       AffineTransform and BSplineTransform combined with "Compose".
+#   - Elastix writes Direction and GridDirection column by column, while
+#       SimpleITK wants them row by row.
+#
+# Usage:
+#   import elastixTransforms
+#   transform, grid = elastixTransforms.readTransform('TransformParameters.1.txt')
+#   result = elastixTransforms.resample(image, transform, grid, sitk.sitkNearestNeighbor)
+
+import os
+import SimpleITK as sitk
+import elastixParameters
+
+def transposeDirection(direction, dimension):
+    '''Swap between column and row ordered direction cosines'''
+    return [float(direction[j*dimension + i]) for i in range(dimension) for j in range(dimension)]
+
+def buildTransform(parameters):
+    '''Build one SimpleITK transform from an OrderedDict of parameters'''
+    name = parameters['Transform'][0]
+    dimension = int(parameters.get('FixedImageDimension', [3])[0])
+    values = [float(x) for x in parameters.get('TransformParameters', [])]
+    center = [float(x) for x in parameters.get('CenterOfRotationPoint', [0.0]*dimension)]
+
+    if name == 'TranslationTransform':
+        return sitk.TranslationTransform(dimension, values)
+    if name == 'AffineTransform':
+        transform = sitk.AffineTransform(dimension)
+        transform.SetMatrix(values[:dimension*dimension])
+        transform.SetTranslation(values[dimension*dimension:])
+        transform.SetCenter(center)
+        return transform
+    if name == 'EulerTransform' and dimension == 3:
+        transform = sitk.Euler3DTransform()
+        transform.SetCenter(center)
+        transform.SetComputeZYX(parameters.get('ComputeZYX', ['false'])[0] == 'true')
+        transform.SetParameters(values)
+        return transform
+    if name == 'SimilarityTransform' and dimension == 3:
+        transform = sitk.Similarity3DTransform()
+        transform.SetCenter(center)
+        transform.SetParameters(values)
+        return transform
+    if name == 'BSplineTransform':
+        order = int(parameters.get('BSplineTransformSplineOrder', [3])[0])
+        size = [int(x) for x in parameters['GridSize']]
+        index = [int(x) for x in parameters.get('GridIndex', [0]*dimension)]
+        spacing = [float(x) for x in parameters['GridSpacing']]
+        origin = [float(x) for x in parameters['GridOrigin']]
+        direction = transposeDirection(parameters.get('GridDirection',
+            [float(i == j) for i in range(dimension) for j in range(dimension)]), dimension)
+
+        # Move the origin to the first control point if the grid is offset
+        for i in range(dimension):
+            for j in range(dimension):
+                origin[i] += direction[i*dimension + j] * spacing[j] * index[j]
+
+        transform = sitk.BSplineTransform(dimension, order)
+        transform.SetFixedParameters(size + origin + spacing + direction)
+        transform.SetParameters(values)
+        return transform
+    raise ValueError('Unsupported elastix transform \"{}\"'.format(name))
+
+def readTransformChain(fileName):
+    '''Return the list of parameter OrderedDicts from fileName back to the first transform'''
+    chain = []
+    while fileName is not None:
+        parameters = elastixParameters.readParameterFile(fileName)
+        if parameters.get('HowToCombineTransforms', ['Compose'])[0] != 'Compose':
+            raise ValueError('Only \"Compose\" is supported for combining transforms in \"{}\"'.format(fileName))
+        chain.append(parameters)
+
+        initial = parameters.get('InitialTransformParametersFileName', ['NoInitialTransform'])[0]
+        if initial == 'NoInitialTransform':
+            fileName = None
+        elif os.path.isfile(initial):
+            fileName = initial
+        else:
+            # Elastix writes the path it was given, so try next to this file
+            fileName = os.path.join(os.path.dirname(fileName), os.path.basename(initial))
+    return chain
+
+def outputGrid(parameters):
+    '''Return a dict of the output grid (Size, Spacing, Origin, Direction) of a transform file'''
+    dimension = int(parameters.get('FixedImageDimension', [3])[0])
+    size = [int(x) for x in parameters['Size']]
+    index = [int(x) for x in parameters.get('Index', [0]*dimension)]
+    spacing = [float(x) for x in parameters['Spacing']]
+    origin = [float(x) for x in parameters['Origin']]
+    direction = transposeDirection(parameters.get('Direction',
+        [float(i == j) for i in range(dimension) for j in range(dimension)]), dimension)
+    for i in range(dimension):
+        for j in range(dimension):
+            origin[i] += direction[i*dimension + j] * spacing[j] * index[j]
+    return {'Size': size, 'Spacing': spacing, 'Origin': origin, 'Direction': direction,
+        'DefaultPixelValue': float(parameters.get('DefaultPixelValue', [0])[0])}
+
+def resample(image, transform, grid, interpolator, outputPixelType=None):
+    '''Resample image onto grid through transform, like transformix'''
+    if outputPixelType is None:
+        outputPixelType = image.GetPixelID()
+    resampler = sitk.ResampleImageFilter()
+    resampler.SetSize(grid['Size'])
+    resampler.SetOutputSpacing(grid['Spacing'])
+    resampler.SetOutputOrigin(grid['Origin'])
+    resampler.SetOutputDirection(grid['Direction'])
+    resampler.SetDefaultPixelValue(grid['DefaultPixelValue'])
+    resampler.SetTransform(transform)
+    resampler.SetInterpolator(interpolator)
+    if interpolator == sitk.sitkNearestNeighbor:
+        resampler.SetOutputPixelType(outputPixelType)
+        return resampler.Execute(image)
+
+    # Higher order interpolators overshoot, so clamp before casting
+    resampler.SetOutputPixelType(sitk.sitkFloat32)
+    return sitk.Clamp(resampler.Execute(image), outputPixelType)
+
+def chainTransform(chain):
+    '''Return (transform, grid) for a chain from readTransformChain().
+
+    transform is a CompositeTransform of the whole chain and grid is the
+    output geometry from outputGrid().'''
+    transform = sitk.CompositeTransform(int(chain[0].get('FixedImageDimension', [3])[0]))
+    for parameters in chain:
+        transform.AddTransform(buildTransform(parameters))
+    return transform, outputGrid(chain[0])
+
+def readTransform(fileName):
+    '''Return (transform, grid) for an elastix transform parameter file'''
+    return chainTransform(readTransformChain(fileName))
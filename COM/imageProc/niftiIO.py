@@ -0,0 +1,211 @@
+# History:
+#   2026.10.19  agent       Created
+#   2026.10.19  agent       Inflate *.nii.gz without holding the GIL
+#
+# Description:
+#   Shared NIfTI helpers for the QCT scripts
+#
+# Notes:
+#   - memmapNIFTI only reads the header with vtkNIFTIImageReader. The voxels
+#       are mapped straight from disk, so slicing the returned array only
+#       pages in the bytes that are touched.
+#   - Only uncompressed single file NIfTI (*.nii) can be memory mapped.
+#       readNIFTI memory maps *.nii and reads *.nii.gz into memory.
+#   - readNIFTI inflates *.nii.gz with zlib instead of vtkNIFTIImageReader.
+#       zlib releases the GIL while it inflates, so several images can be
+#       read at once on threads.
+#   - Arrays are indexed [z,y,x], matching vtkImageData scalar ordering.
+#   - writeNIFTI compresses *.nii.gz in blocks on a thread pool. Each block
+#       is its own gzip member, which zlib, VTK, ITK and the gzip tool all read
+#       as one stream. Masks use the zlib run-length strategy, which is much
+#       faster and about as small for a few long runs of labels.
+#   - writeNIFTI writes the uncompressed image next to the output before
+#       compressing it, so the system temporary directory does not need to
+#       hold the whole volume.
+#
+# Usage:
+#   import niftiIO
+#   array, reader = niftiIO.memmapNIFTI('image.nii')
+#   niftiIO.writeNIFTI(writer, 'mask.nii.gz', nThreads=8, mask=True)
+
+import os
+import zlib
+import tempfile
+from multiprocessing.pool import ThreadPool
+import numpy
+import vtk
+from vtk.util import numpy_support
+
+niftiExtensions = ('.nii', '.nii.gz')
+
+def isNIFTI(fileName):
+    '''True if fileName is a NIfTI (*.nii or *.nii.gz) file name'''
+    return fileName.lower().endswith(niftiExtensions)
+
+def isCompressed(fileName):
+    '''True if fileName is a compressed NIfTI (*.nii.gz) file name'''
+    return fileName.lower().endswith('.gz')
+
+def niftiExtension(fileName):
+    '''The NIfTI extension of fileName, either .nii or .nii.gz'''
+    return '.nii.gz' if isCompressed(fileName) else '.nii'
+
+def readLayout(fileName):
+    '''Return (reader, shape, dtype) of a single component NIfTI file.
+
+    The reader has only had UpdateInformation() called.'''
+    reader = vtk.vtkNIFTIImageReader()
+    reader.SetFileName(fileName)
+    reader.UpdateInformation()
+
+    if reader.GetNumberOfScalarComponents() != 1 or reader.GetTimeDimension() != 1:
+        raise ValueError('Cannot map multi-component image \"{}\" to an array'.format(fileName))
+
+    extent = reader.GetDataExtent()
+    shape = (extent[5]-extent[4]+1, extent[3]-extent[2]+1, extent[1]-extent[0]+1)
+    dtype = numpy.dtype(numpy_support.get_numpy_array_type(reader.GetDataScalarType()))
+    if reader.GetSwapBytes():
+        dtype = dtype.newbyteorder()
+    return reader, shape, dtype
+
+def memmapNIFTI(fileName):
+    '''Return (array, reader) with array a read-only memory map of fileName.
+
+    The reader has had UpdateInformation() called, so the spacing, origin,
+    extent and scalar type are available through the usual Get*() calls.'''
+    if isCompressed(fileName):
+        raise ValueError('Cannot memory map compressed image \"{}\"'.format(fileName))
+    reader, shape, dtype = readLayout(fileName)
+    array = numpy.memmap(fileName, dtype=dtype, mode='r',
+        offset=int(reader.GetNIFTIHeader().GetVoxOffset()), shape=shape)
+
+    # vtkNIFTIImageReader reverses the slices when qfac is negative
+    if reader.GetQFac() < 0:
+        array = array[::-1]
+    return array, reader
+
+def inflateNIFTI(fileName, progress=None, blockSize=4 << 20):
+    '''Return (array, reader) of a compressed NIfTI, read into memory.
+
+    The file is read blockSize compressed bytes at a time and inflated at most
+    blockSize bytes at a time straight into the array, so besides the array
+    only a block or two is held, however well the image compressed. progress,
+    if given, is called with the fraction read.'''
+    reader, shape, dtype = readLayout(fileName)
+    array = numpy.empty(shape, dtype=dtype)
+    voxels = array.reshape(-1).view(numpy.uint8)
+    skip = int(reader.GetNIFTIHeader().GetVoxOffset())
+    filled = 0
+    fileSize = max(os.path.getsize(fileName), 1)
+
+    with open(fileName, 'rb') as f:
+        position = 0
+        pending = b''
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        newMember = False
+        while filled < voxels.size:
+            if len(pending) < 2:
+                data = f.read(blockSize)
+                position += len(data)
+                if len(data) == 0 and len(pending) == 0:
+                    break
+                pending += data
+            if newMember:
+                # Start on the next gzip member, if there is one
+                if pending[:2] != b'\x1f\x8b':
+                    break
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                newMember = False
+
+            block = memoryview(decompressor.decompress(pending, blockSize))
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                newMember = True
+            else:
+                pending = decompressor.unconsumed_tail
+
+            start = min(skip, len(block))
+            skip -= start
+            count = min(len(block) - start, voxels.size - filled)
+            voxels[filled:filled+count] = numpy.frombuffer(block[start:start+count], dtype=numpy.uint8)
+            filled += count
+            if progress is not None:
+                progress(float(position - len(pending)) / fileSize)
+    if filled < voxels.size:
+        raise ValueError('Compressed image \"{}\" is truncated'.format(fileName))
+
+    if reader.GetQFac() < 0:
+        array = array[::-1]
+    return array, reader
+
+def readNIFTI(fileName, progress=None):
+    '''Return (array, reader) like memmapNIFTI, reading *.nii.gz into memory'''
+    if not isCompressed(fileName):
+        return memmapNIFTI(fileName)
+    return inflateNIFTI(fileName, progress)
+
+def compressBlock(block, level, strategy):
+    '''Compress one block as a complete gzip member'''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS, 9, strategy)
+    return compressor.compress(block) + compressor.flush()
+
+def gzipFile(source, destination, nThreads=1, mask=False, level=6, blockSize=4 << 20):
+    '''Gzip source into destination, compressing blocks on nThreads threads'''
+    strategy = zlib.Z_RLE if mask else zlib.Z_DEFAULT_STRATEGY
+    pool = ThreadPool(nThreads)
+    try:
+        with open(source, 'rb') as fin:
+            with open(destination, 'wb') as fout:
+                # Only hold a few blocks per thread in memory at once
+                while True:
+                    blocks = []
+                    for i in range(2 * nThreads):
+                        block = fin.read(blockSize)
+                        if len(block) == 0:
+                            break
+                        blocks.append(block)
+                    if len(blocks) == 0:
+                        break
+                    for member in pool.map(lambda block: compressBlock(block, level, strategy), blocks):
+                        fout.write(member)
+    finally:
+        pool.close()
+        pool.join()
+
+def writeNIFTI(writer, fileName, nThreads=1, mask=False):
+    '''Write with a connected vtkNIFTIImageWriter, compressing *.nii.gz on nThreads threads.
+
+    The uncompressed image is written to a temporary file next to fileName
+    first, which the output file system must have room for, and removed once
+    it is compressed.'''
+    if not isCompressed(fileName):
+        writer.SetFileName(fileName)
+        writer.Write()
+        return
+    handle, temporary = tempfile.mkstemp(suffix='.nii', dir=os.path.dirname(os.path.abspath(fileName)))
+    os.close(handle)
+    try:
+        writer.SetFileName(temporary)
+        writer.Write()
+        gzipFile(temporary, fileName, nThreads, mask)
+    finally:
+        os.remove(temporary)
+
+def arrayToImage(array, extent, spacing, origin, scalarType=None):
+    '''Wrap a [z,y,x] array as vtkImageData, copying only if not contiguous.
+
+    The scalars reference the array memory (numpy_to_vtk keeps the array
+    alive for as long as the scalars exist).'''
+    array = numpy.ascontiguousarray(array)
+    if not array.dtype.isnative:
+        array = array.astype(array.dtype.newbyteorder('='))
+    if scalarType is None:
+        scalarType = numpy_support.get_vtk_array_type(array.dtype)
+    scalars = numpy_support.numpy_to_vtk(array.reshape(-1), deep=0, array_type=scalarType)
+
+    image = vtk.vtkImageData()
+    image.SetExtent(extent)
+    image.SetSpacing(spacing)
+    image.SetOrigin(origin)
+    image.GetPointData().SetScalars(scalars)
+    return image
@@ -0,0 +1,338 @@
+# History:
+#   2026.10.19  agent       Created
+#   2026.10.19  agent       Read *.nii.gz through niftiIO.readNIFTI
+#   2026.10.19  agent       Keep the labels present in label proxies
+#
+# Description:
+#   Low resolution proxies so viewers can show an image before it is read
+#
+# Notes:
+#   - Proxies of image.nii are kept in image.nii.proxy/<method>/, with
+#       proxy.json and one chunked store (see chunkedStore.py) per level.
+#       Level f is shrunk by f along every axis, f = 2, 4, 8, ... until the
+#       largest dimension is under minimumProxySize.
+#   - 'mean' averages each block of voxels like vtkImageShrink3D with
+#       averaging on. 'sample' keeps every f-th voxel, which is what label
+#       images need. The first level is built from slabs of the full image,
+#       so an uncompressed NIfTI or a chunked store is never fully read.
+#   - 'sample' proxies of integer images also keep the labels present in
+#       the full image, found while building the first level.
+#   - proxy.json keeps the size and modification time of the source. A
+#       proxy whose source has changed is rebuilt. If the proxy cannot be
+#       written next to the image it is only kept in memory.
+#   - StreamedImage shows the proxy, then loads full resolution slabs
+#       around the viewed slice on a background thread. Call update() from
+#       an interactor timer to swap them in. Only uncompressed NIfTI and
+#       chunked stores can be read a slab at a time. Other images are read
+#       whole on the background thread and then cut into slabs.
+#
+# Usage:
+#   import proxyPyramid
+#   streamed = proxyPyramid.StreamedImage('image.nii')
+#   mapper.SetInputConnection(streamed.GetOutputPort())
+#   interactor.AddObserver('TimerEvent', lambda obj, event: streamed.update(camera) and interactor.Render())
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import numpy
+import vtk
+from vtk.util import numpy_support
+import niftiIO
+import chunkedStore
+import sparseLabels
+
+headerName = 'proxy.json'
+proxyVersion = 2
+proxyMethods = ('mean', 'sample')
+defaultProxyVoxels = 1 << 22
+minimumProxySize = 32
+
+def proxyDirectory(fileName, method='mean'):
+    '''Directory holding the proxy levels of fileName'''
+    return os.path.join(fileName.rstrip('/') + '.proxy', method)
+
+def levelName(directory, factor):
+    '''Chunked store of one level'''
+    return os.path.join(directory, 'x{}.chunks'.format(factor))
+
+def sourceStamp(fileName):
+    '''Size and modification time identifying the contents of fileName'''
+    # Chunks are renamed into place, which also updates the time of a store
+    status = os.stat(fileName)
+    return {'size': int(status.st_size), 'mtime': float(status.st_mtime)}
+
+def openVolume(fileName, reader=None, progress=None):
+    '''Return (array, spacing, origin) with array a [z,y,x] array that can be sliced.
+
+    Chunked stores and uncompressed NIfTI are only read when sliced.
+    Compressed NIfTI is read whole with niftiIO.readNIFTI, calling progress
+    with the fraction read. Anything else is read whole with reader.'''
+    if chunkedStore.isChunked(fileName):
+        array = chunkedStore.ChunkedArray(fileName)
+        return array, array.header['spacing'], array.header['origin']
+    if niftiIO.isNIFTI(fileName):
+        try:
+            array, niftiReader = niftiIO.readNIFTI(fileName, progress)
+            return array, niftiReader.GetDataSpacing(), niftiReader.GetDataOrigin()
+        except ValueError:
+            # Multi-component images go through the reader
+            if reader is None:
+                raise
+
+    if reader is None:
+        raise ValueError('No reader given for \"{}\"'.format(fileName))
+    reader.Update()
+    image = reader.GetOutput()
+    if image.GetNumberOfScalarComponents() != 1:
+        raise ValueError('Cannot stream multi-component image \"{}\"'.format(fileName))
+    dimensions = image.GetDimensions()
+    extent = image.GetExtent()
+    spacing = image.GetSpacing()
+    origin = [image.GetOrigin()[i] + extent[2*i] * spacing[i] for i in range(3)]
+    array = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars()).reshape(dimensions[::-1])
+    return array, spacing, origin
+
+def shrinkFactors(shape):
+    '''Shrink factors of the levels of a [z,y,x] shape'''
+    factors = []
+    factor = 2
+    while max(shape) // factor >= minimumProxySize:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+def shrink(array, factor, method='mean'):
+    '''Shrink a [z,y,x] array by factor, padding the upper edges'''
+    if method == 'sample':
+        return numpy.ascontiguousarray(array[::factor, ::factor, ::factor])
+    padded = numpy.pad(array, [(0, -n % factor) for n in array.shape], mode='edge')
+    nz, ny, nx = padded.shape
+    blocks = padded.reshape(nz // factor, factor, ny // factor, factor, nx // factor, factor)
+    shrunk = blocks.mean(axis=(1, 3, 5))
+    if numpy.issubdtype(array.dtype, numpy.integer):
+        shrunk = numpy.rint(shrunk)
+    return shrunk.astype(array.dtype)
+
+def levelGeometry(spacing, origin, factor, method='mean'):
+    '''Return (spacing, origin) of a level. Means sit at the block centres.'''
+    offset = 0.5 * (factor - 1) if method == 'mean' else 0.0
+    return [s * factor for s in spacing], [origin[i] + offset * spacing[i] for i in range(3)]
+
+def buildProxy(array, spacing, origin, method='mean', slabSize=64):
+    '''Return (header, {factor: array}) of every level of a [z,y,x] array'''
+    if method not in proxyMethods:
+        raise ValueError('Unknown proxy method \"{}\"'.format(method))
+    factors = shrinkFactors(array.shape)
+    if len(factors) == 0:
+        raise ValueError('Image of dimensions {} is too small for a proxy'.format(list(array.shape[::-1])))
+
+    # Build the first level a slab at a time, noting the scalar range (and labels) on the way
+    step = factors[0] * max(1, slabSize // factors[0])
+    slabs = []
+    scalarRange = [None, None]
+    labels = None
+    if method == 'sample' and numpy.issubdtype(array.dtype, numpy.integer):
+        labels = set()
+    for z in range(0, array.shape[0], step):
+        slab = numpy.asarray(array[z:z+step])
+        low, high = slab.min().item(), slab.max().item()
+        scalarRange = [low if scalarRange[0] is None else min(scalarRange[0], low),
+                       high if scalarRange[1] is None else max(scalarRange[1], high)]
+        if labels is not None:
+            labels.update(sparseLabels.arrayLabels(slab))
+        slabs.append(shrink(slab, factors[0], method))
+    levels = {factors[0]: numpy.concatenate(slabs)}
+    for previous, factor in zip(factors[:-1], factors[1:]):
+        levels[factor] = shrink(levels[previous], factor // previous, method)
+
+    header = {
+        'version': proxyVersion,
+        'method': method,
+        'dimensions': [int(x) for x in array.shape[::-1]],
+        'spacing': [float(x) for x in spacing],
+        'origin': [float(x) for x in origin],
+        'scalarRange': scalarRange,
+        'factors': factors}
+    if labels is not None:
+        header['labels'] = sorted(labels)
+    return header, levels
+
+def writeProxy(fileName, header, levels):
+    '''Store the levels of a proxy next to fileName, replacing any old proxy'''
+    directory = proxyDirectory(fileName, header['method'])
+    parent = os.path.dirname(directory)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    temporary = tempfile.mkdtemp(prefix='.' + header['method'], dir=parent)
+    try:
+        for factor in header['factors']:
+            spacing, origin = levelGeometry(header['spacing'], header['origin'], factor, header['method'])
+            chunkedStore.writeArray(levels[factor], levelName(temporary, factor), spacing, origin)
+        with open(os.path.join(temporary, headerName), 'w') as f:
+            json.dump(header, f, indent=2, sort_keys=True)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.rename(temporary, directory)
+    except:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+
+def readProxy(fileName, method='mean'):
+    '''Read the proxy header of fileName, or None if there is none or it is stale'''
+    headerFile = os.path.join(proxyDirectory(fileName, method), headerName)
+    if not os.path.isfile(headerFile):
+        return None
+    try:
+        with open(headerFile, 'r') as f:
+            header = json.load(f)
+    except ValueError:
+        return None
+    if header.get('version') != proxyVersion or header.get('source') != sourceStamp(fileName):
+        return None
+    return header
+
+def pickFactor(header, maxVoxels):
+    '''The finest level with at most maxVoxels, or the coarsest level'''
+    for factor in header['factors']:
+        if numpy.prod([-(-n // factor) for n in header['dimensions']]) <= maxVoxels:
+            return factor
+    return header['factors'][-1]
+
+def slabBounds(dimensions, axis, index, slabSize):
+    '''Return ([x,y,z] lower, [x,y,z] upper) of the slab along axis centred on index'''
+    lower = [0, 0, 0]
+    upper = [n - 1 for n in dimensions]
+    lower[axis] = max(0, min(index - slabSize // 2, dimensions[axis] - slabSize))
+    upper[axis] = min(dimensions[axis] - 1, lower[axis] + slabSize - 1)
+    return lower, upper
+
+class StreamedImage(object):
+    '''Proxy of an image that is replaced by full resolution slabs around the viewed slice.
+
+    Connect GetOutputPort() to a mapper and call update(camera) from an
+    interactor timer. Images with at most maxVoxels are shown whole.
+    labels lists the values of an integer image opened with 'sample'.'''
+    def __init__(self, fileName, reader=None, method='mean', maxVoxels=defaultProxyVoxels, slabSize=64, progress=None):
+        self.fileName = fileName
+        self.reader = reader
+        self.slabSize = slabSize
+        self.producer = vtk.vtkTrivialProducer()
+        self.volume = None
+        self.shown = None
+        self.wanted = None
+        self.loaded = None
+        self.error = None
+        self.condition = threading.Condition()
+
+        self.header = readProxy(fileName, method)
+        if self.header is None:
+            self.volume = openVolume(fileName, reader, progress)
+            array, spacing, origin = self.volume
+            if numpy.prod(array.shape) <= maxVoxels:
+                # Small enough to show as is. Slicing reads a chunked store too.
+                self.header = {'dimensions': list(array.shape[::-1]), 'spacing': list(spacing), 'origin': list(origin)}
+                whole = numpy.array(array[:, :, :])
+                image = niftiIO.arrayToImage(whole, self.fullExtent(), spacing, origin)
+                self.scalarRange = list(image.GetScalarRange())
+                self.labels = None
+                if method == 'sample' and numpy.issubdtype(whole.dtype, numpy.integer):
+                    self.labels = sparseLabels.arrayLabels(whole)
+                self.producer.SetOutput(image)
+                self.thread = None
+                return
+            print('Building {m} proxy of \"{f}\"'.format(m=method, f=fileName))
+            self.header, levels = buildProxy(array, spacing, origin, method, slabSize)
+            self.header['source'] = sourceStamp(fileName)
+            try:
+                writeProxy(fileName, self.header, levels)
+            except (IOError, OSError) as e:
+                print('Unable to store proxy of \"{f}\" ({e}), keeping it in memory'.format(f=fileName, e=e))
+            factor = pickFactor(self.header, maxVoxels)
+            spacing, origin = levelGeometry(self.header['spacing'], self.header['origin'], factor, method)
+            shape = levels[factor].shape
+            self.proxy = niftiIO.arrayToImage(levels[factor], [0, shape[2]-1, 0, shape[1]-1, 0, shape[0]-1], spacing, origin)
+        else:
+            factor = pickFactor(self.header, maxVoxels)
+            self.proxy = chunkedStore.readImage(levelName(proxyDirectory(fileName, method), factor))
+        self.scalarRange = self.header['scalarRange']
+        self.labels = self.header.get('labels')
+        self.producer.SetOutput(self.proxy)
+
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def GetOutputPort(self):
+        return self.producer.GetOutputPort()
+
+    def GetOutput(self):
+        return self.producer.GetOutputDataObject(0)
+
+    def fullExtent(self):
+        dimensions = self.header['dimensions']
+        return [0, dimensions[0]-1, 0, dimensions[1]-1, 0, dimensions[2]-1]
+
+    def viewedSlice(self, camera):
+        '''Return (axis, index) of the full resolution slice at the camera focal point'''
+        direction = camera.GetDirectionOfProjection()
+        axis = int(numpy.argmax(numpy.abs(direction)))
+        position = camera.GetFocalPoint()[axis]
+        index = int(round((position - self.header['origin'][axis]) / self.header['spacing'][axis]))
+        return axis, min(max(index, 0), self.header['dimensions'][axis] - 1)
+
+    def run(self):
+        '''Background thread: read the latest slab asked for'''
+        try:
+            if self.volume is None:
+                self.volume = openVolume(self.fileName, self.reader)
+            array, spacing, origin = self.volume
+            while True:
+                with self.condition:
+                    while self.wanted is None or (self.loaded is not None and self.loaded[0] == self.wanted):
+                        self.condition.wait()
+                    wanted = self.wanted
+                lower, upper = wanted[1], wanted[2]
+                slab = numpy.array(array[tuple(slice(lower[i], upper[i]+1) for i in (2, 1, 0))])
+                image = niftiIO.arrayToImage(slab, [lower[0], upper[0], lower[1], upper[1], lower[2], upper[2]], spacing, origin)
+                with self.condition:
+                    self.loaded = (wanted, image)
+        except Exception as e:
+            self.error = e
+            print('Unable to stream \"{f}\": {e}'.format(f=self.fileName, e=e))
+
+    def update(self, camera):
+        '''Swap in a loaded slab or fall back to the proxy. Returns True if the output changed.'''
+        if self.thread is None or self.error is not None:
+            return False
+        axis, index = self.viewedSlice(camera)
+        changed = False
+        with self.condition:
+            if self.loaded is not None and self.loaded[0] == self.wanted and self.shown != self.wanted:
+                self.producer.SetOutput(self.loaded[1])
+                self.shown = self.wanted
+                changed = True
+
+            # Keep the slab while the slice is inside it, asking for the next one near its edges
+            margin = self.slabSize // 4
+            if self.shown is not None and self.shown[0] == axis and \
+                    self.shown[1][axis] <= index <= self.shown[2][axis]:
+                dimensions = self.header['dimensions']
+                nearEdge = (index - self.shown[1][axis] < margin and self.shown[1][axis] > 0) or \
+                    (self.shown[2][axis] - index < margin and self.shown[2][axis] < dimensions[axis] - 1)
+                if not nearEdge:
+                    return changed
+            elif self.shown is not None:
+                self.producer.SetOutput(self.proxy)
+                self.shown = None
+                changed = True
+
+            # Ask for a slab centred on the slice unless one already covers it
+            if self.wanted is None or self.wanted[0] != axis or \
+                    abs(index - (self.wanted[1][axis] + self.wanted[2][axis]) // 2) >= margin:
+                lower, upper = slabBounds(self.header['dimensions'], axis, index, self.slabSize)
+                self.wanted = (axis, lower, upper)
+                self.condition.notify()
+        return changed
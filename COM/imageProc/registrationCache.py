@@ -0,0 +1,85 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Cache registration results keyed on parameters and inputs
+#
+# Notes:
+#   - The key is the SHA-1 of the rendered parameter files, the contents of
+#       every input image and any extra settings (e.g. crop margin).
+#   - Each entry is a directory named by its key holding the elastix output
+#       files. Entries are written to a temporary directory and renamed into
+#       place, so a half written entry is never used.
+#   - Restoring an entry points InitialTransformParametersFileName at the new
+#       output directory so the transform chain still resolves.
+#
+# Usage:
+#   import registrationCache
+#   key = registrationCache.cacheKey(parameterTexts, inputFiles, [margin])
+#   if not registrationCache.restore(cacheDirectory, key, outputDirectory):
+#       ... run elastix ...
+#       registrationCache.store(cacheDirectory, key, outputDirectory)
+
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+import elastixParameters
+
+cachedPatterns = ['TransformParameters.*.txt', 'IterationInfo.*.txt', 'elastix.log', 'result.*']
+
+def fileHash(fileName, blockSize=1 << 20):
+    '''SHA-1 of the contents of a file'''
+    sha = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        block = f.read(blockSize)
+        while len(block) > 0:
+            sha.update(block)
+            block = f.read(blockSize)
+    return sha.hexdigest()
+
+def cacheKey(parameterTexts, inputFiles, extra=None):
+    '''Key for a registration of inputFiles with the rendered parameter files'''
+    sha = hashlib.sha1()
+    for text in parameterTexts:
+        sha.update(text.encode('utf-8'))
+    for fileName in inputFiles:
+        sha.update(fileHash(fileName).encode('utf-8'))
+    if extra is not None:
+        sha.update(repr(list(extra)).encode('utf-8'))
+    return sha.hexdigest()
+
+def restore(cacheDirectory, key, outputDirectory):
+    '''Copy a cache entry into outputDirectory, returning False on a miss'''
+    entry = os.path.join(cacheDirectory, key)
+    if not os.path.isdir(entry):
+        return False
+    for fileName in os.listdir(entry):
+        shutil.copy2(os.path.join(entry, fileName), outputDirectory)
+
+    # Re-point the transform chain at the output directory
+    for fileName in glob.glob(os.path.join(outputDirectory, 'TransformParameters.*.txt')):
+        parameters = elastixParameters.readParameterFile(fileName)
+        initial = parameters.get('InitialTransformParametersFileName', ['NoInitialTransform'])[0]
+        if initial != 'NoInitialTransform':
+            parameters['InitialTransformParametersFileName'] = [os.path.join(outputDirectory, os.path.basename(initial))]
+            elastixParameters.writeParameterFile(parameters, fileName)
+    return True
+
+def store(cacheDirectory, key, outputDirectory):
+    '''Copy the elastix output in outputDirectory into the cache'''
+    if not os.path.isdir(cacheDirectory):
+        os.makedirs(cacheDirectory)
+    entry = os.path.join(cacheDirectory, key)
+    if os.path.isdir(entry):
+        return
+    temporary = tempfile.mkdtemp(prefix='.' + key, dir=cacheDirectory)
+    for pattern in cachedPatterns:
+        for fileName in glob.glob(os.path.join(outputDirectory, pattern)):
+            shutil.copy2(fileName, temporary)
+    try:
+        os.rename(temporary, entry)
+    except OSError:
+        # Another process stored the same entry first
+        shutil.rmtree(temporary)
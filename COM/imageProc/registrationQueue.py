@@ -0,0 +1,226 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   A SQLite backed job queue for long running registrations
+#
+# Notes:
+#   - Jobs are command lines stored as JSON. Workers claim the queued job
+#       with the highest priority (oldest first) inside an immediate
+#       transaction, so any number of worker processes can share one file.
+#   - A failed job is put back in the queue until it has been tried
+#       maxAttempts times, then it is marked failed.
+#   - The output of every attempt is appended to the job log file.
+#   - Each job runs in its own process group. When a worker is terminated
+#       (SIGTERM) or interrupted (SIGINT) it kills the group of its job, so an
+#       elastix started by the job does not outlive it, and exits. The job
+#       stays claimed until recover() requeues it.
+#   - SQLite locking is not reliable on some network file systems, so keep the
+#       queue file on a local disk.
+#
+# Usage:
+#   import registrationQueue
+#   connection = registrationQueue.openQueue('queue.db')
+#   registrationQueue.submit(connection, ['python', 'QCT_RegisterROI.py', ...])
+
+import os
+import json
+import errno
+import time
+import signal
+import socket
+import sqlite3
+import subprocess
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+schema = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command TEXT NOT NULL,
+    workingDirectory TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    maxAttempts INTEGER NOT NULL DEFAULT 1,
+    log TEXT NOT NULL,
+    worker TEXT,
+    returnCode INTEGER,
+    submitted REAL,
+    started REAL,
+    finished REAL
+)'''
+
+columns = ['id', 'command', 'workingDirectory', 'priority', 'state', 'attempts',
+    'maxAttempts', 'log', 'worker', 'returnCode', 'submitted', 'started', 'finished']
+
+def openQueue(fileName):
+    '''Open (and create if needed) a queue file'''
+    connection = sqlite3.connect(fileName, timeout=60, isolation_level=None)
+    connection.execute(schema)
+    connection.execute('CREATE INDEX IF NOT EXISTS jobsByState ON jobs (state, priority)')
+    return connection
+
+def logDirectory(fileName):
+    '''The directory job logs are written to for a queue file'''
+    return os.path.abspath(fileName) + '.logs'
+
+def toJob(row):
+    '''Turn a row into a dict, decoding the command'''
+    job = dict(zip(columns, row))
+    job['command'] = json.loads(job['command'])
+    return job
+
+def submit(connection, command, priority=0, maxAttempts=1, workingDirectory=None, logFileName=None):
+    '''Queue a command (a list of arguments) and return its job id'''
+    if workingDirectory is None:
+        workingDirectory = os.getcwd()
+    cursor = connection.execute(
+        'INSERT INTO jobs (command, workingDirectory, priority, state, maxAttempts, log, submitted) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (json.dumps(command), workingDirectory, priority, QUEUED, maxAttempts, '', time.time()))
+    jobId = cursor.lastrowid
+    if logFileName is None:
+        fileName = connection.execute('PRAGMA database_list').fetchone()[2]
+        logFileName = os.path.join(logDirectory(fileName), 'job{:06d}.log'.format(jobId))
+    connection.execute('UPDATE jobs SET log = ? WHERE id = ?', (logFileName, jobId))
+    return jobId
+
+def claim(connection, worker):
+    '''Mark the next job as running for worker and return it, or None if the queue is empty'''
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        row = connection.execute(
+            'SELECT {} FROM jobs WHERE state = ? ORDER BY priority DESC, id ASC LIMIT 1'.format(', '.join(columns)),
+            (QUEUED,)).fetchone()
+        if row is None:
+            connection.execute('COMMIT')
+            return None
+        job = toJob(row)
+        connection.execute(
+            'UPDATE jobs SET state = ?, attempts = attempts + 1, worker = ?, started = ?, finished = NULL WHERE id = ?',
+            (RUNNING, worker, time.time(), job['id']))
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+    job['attempts'] += 1
+    job['state'] = RUNNING
+    job['worker'] = worker
+    return job
+
+def finish(connection, job, returnCode):
+    '''Record the result of a job, requeueing it if it has attempts left'''
+    if returnCode == 0:
+        state = DONE
+    elif job['attempts'] < job['maxAttempts']:
+        state = QUEUED
+    else:
+        state = FAILED
+    connection.execute(
+        'UPDATE jobs SET state = ?, returnCode = ?, finished = ? WHERE id = ?',
+        (state, returnCode, time.time(), job['id']))
+    return state
+
+# The job being run by this worker process
+running = {'process': None}
+
+def stopWorker(signum, frame):
+    '''Kill the process group of the running job, then exit'''
+    process = running['process']
+    if process is not None:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            pass
+    os.sys.exit('Worker {w} stopped by signal {s}'.format(w=workerName(), s=signum))
+
+def run(job):
+    '''Run a job, appending its output to the job log, and return the exit code'''
+    directory = os.path.dirname(job['log'])
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+    with open(job['log'], 'a') as log:
+        log.write('# Attempt {a} of {m} on {w} at {t}\n# {c}\n'.format(
+            a=job['attempts'], m=job['maxAttempts'], w=job['worker'],
+            t=time.strftime('%Y.%m.%d %H:%M:%S'), c=' '.join(job['command'])))
+        log.flush()
+        try:
+            # A new session, so the job and everything it starts can be killed at once
+            process = subprocess.Popen(job['command'], cwd=job['workingDirectory'],
+                stdout=log, stderr=subprocess.STDOUT, preexec_fn=os.setsid)
+        except OSError as e:
+            log.write('# Unable to run command: {}\n'.format(e))
+            returnCode = -1
+        else:
+            running['process'] = process
+            try:
+                returnCode = process.wait()
+            finally:
+                running['process'] = None
+        log.write('# Exited with {}\n'.format(returnCode))
+    return returnCode
+
+def workerName():
+    '''A name for this worker process that recover() can check'''
+    return '{h}:{p}'.format(h=socket.gethostname(), p=os.getpid())
+
+def work(fileName, poll=10.0, exitWhenEmpty=False):
+    '''Run jobs from the queue until it is empty (if exitWhenEmpty) or forever.
+
+    Must be called from the main thread, which receives the signals.'''
+    signal.signal(signal.SIGTERM, stopWorker)
+    signal.signal(signal.SIGINT, stopWorker)
+    connection = openQueue(fileName)
+    worker = workerName()
+    while True:
+        job = claim(connection, worker)
+        if job is None:
+            if exitWhenEmpty:
+                return
+            time.sleep(poll)
+            continue
+        print('{w} running job {i} (attempt {a})'.format(w=worker, i=job['id'], a=job['attempts']))
+        state = finish(connection, job, run(job))
+        print('{w} finished job {i}: {s}'.format(w=worker, i=job['id'], s=state))
+
+def jobs(connection, state=None):
+    '''Return all jobs, or only those in state'''
+    query = 'SELECT {} FROM jobs'.format(', '.join(columns))
+    if state is None:
+        rows = connection.execute(query + ' ORDER BY id')
+    else:
+        rows = connection.execute(query + ' WHERE state = ? ORDER BY id', (state,))
+    return [toJob(row) for row in rows]
+
+def retry(connection, jobIds=None):
+    '''Put failed jobs (all of them, or those in jobIds) back in the queue'''
+    failed = [job['id'] for job in jobs(connection, FAILED)]
+    if jobIds is not None:
+        failed = [jobId for jobId in failed if jobId in set(jobIds)]
+    for jobId in failed:
+        connection.execute(
+            'UPDATE jobs SET state = ?, maxAttempts = attempts + 1 WHERE id = ?', (QUEUED, jobId))
+    return failed
+
+def recover(connection):
+    '''Requeue jobs left running by workers on this host that no longer exist'''
+    host = socket.gethostname()
+    recovered = []
+    for job in jobs(connection, RUNNING):
+        workerHost, pid = job['worker'].rsplit(':', 1)
+        if workerHost != host:
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                continue
+            connection.execute('UPDATE jobs SET state = ? WHERE id = ?', (QUEUED, job['id']))
+            recovered.append(job['id'])
+    return recovered
@@ -0,0 +1,308 @@
+# History:
+#   2026.10.19  agent       Created
+#
+# Description:
+#   Run-length encoded label images
+#
+# Notes:
+#   - A label image is stored as runs along x: one entry per run giving z, y,
+#       the start x, the length and the label. Runs are sorted by z, y and x.
+#       Only foreground (non-zero) runs are kept, so memory and the cost of
+#       every operation here scale with the foreground, not the volume.
+#   - Runs are kept in a dict with the numpy arrays z, y, start, length and
+#       label plus dimensions [x,y,z], spacing, origin and dtype.
+#   - Encoding reads the dense image one slab of slices at a time, so an
+#       uncompressed NIfTI is paged through its memory map once.
+#   - Files are saved as *.rle.npz (numpy savez_compressed).
+#   - Overlap measures follow itk::LabelOverlapMeasuresImageFilter, with
+#       every non-zero label summed. Components are 6-connected runs of the
+#       same label.
+#
+# Usage:
+#   import sparseLabels
+#   labels = sparseLabels.readLabels('segmentation.nii')
+#   sparseLabels.save(labels, 'segmentation.rle.npz')
+#   measures = sparseLabels.overlapMeasures(labels, sparseLabels.load('other.rle.npz'))
+
+import numpy
+from vtk.util import numpy_support
+import niftiIO
+
+runKeys = ['z', 'y', 'start', 'length', 'label']
+
+def isSparse(fileName):
+    '''True if fileName names a run-length (*.rle.npz) label file'''
+    return fileName.lower().endswith('.rle.npz')
+
+def fromArray(array, spacing, origin, slabSize=16):
+    '''Encode a [z,y,x] label array'''
+    nz, ny, nx = array.shape
+    dtype = array.dtype.newbyteorder('=')
+    runs = dict([(key, []) for key in runKeys])
+    for z0 in range(0, nz, slabSize):
+        rows = numpy.asarray(array[z0:z0+slabSize], dtype=dtype).reshape(-1, nx)
+        rowIndices = numpy.flatnonzero(rows.any(axis=1))
+        if len(rowIndices) == 0:
+            continue
+
+        # Pad each row with background so every run has a start and an end
+        padded = numpy.zeros((len(rowIndices), nx + 2), dtype=dtype)
+        padded[:, 1:-1] = rows[rowIndices]
+        r, c = numpy.nonzero(padded[:, 1:] != padded[:, :-1])
+        values = padded[r, c + 1]
+        keep = numpy.flatnonzero(values != 0)
+
+        # The next change is always in the same row, since rows end in background
+        runs['z'].append(z0 + rowIndices[r[keep]] // ny)
+        runs['y'].append(rowIndices[r[keep]] % ny)
+        runs['start'].append(c[keep])
+        runs['length'].append(c[keep + 1] - c[keep])
+        runs['label'].append(values[keep])
+
+    labels = {
+        'dimensions': [nx, ny, nz],
+        'spacing': [float(x) for x in spacing],
+        'origin': [float(x) for x in origin],
+        'dtype': dtype.str}
+    for key in runKeys:
+        if len(runs[key]) == 0:
+            labels[key] = numpy.zeros(0, dtype=dtype if key == 'label' else numpy.int32)
+        else:
+            labels[key] = numpy.concatenate(runs[key]).astype(dtype if key == 'label' else numpy.int32)
+    return labels
+
+def fromImage(image):
+    '''Encode a single component vtkImageData'''
+    if image.GetNumberOfScalarComponents() != 1:
+        raise ValueError('Cannot encode multi-component images')
+    dimensions = image.GetDimensions()
+    extent = image.GetExtent()
+    spacing = image.GetSpacing()
+    origin = [image.GetOrigin()[i] + extent[2*i] * spacing[i] for i in range(3)]
+    array = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars()).reshape(dimensions[::-1])
+    return fromArray(array, spacing, origin)
+
+def readLabels(fileName):
+    '''Read a *.rle.npz file, or encode a NIfTI image'''
+    if isSparse(fileName):
+        return load(fileName)
+    array, reader = niftiIO.readNIFTI(fileName)
+    return fromArray(array, reader.GetDataSpacing(), reader.GetDataOrigin())
+
+def save(labels, fileName):
+    '''Save runs to a *.rle.npz file'''
+    arrays = dict([(key, labels[key]) for key in runKeys])
+    numpy.savez_compressed(fileName,
+        dimensions=numpy.array(labels['dimensions']),
+        spacing=numpy.array(labels['spacing']),
+        origin=numpy.array(labels['origin']),
+        dtype=numpy.array(labels['dtype']),
+        **arrays)
+
+def load(fileName):
+    '''Load runs from a *.rle.npz file'''
+    data = numpy.load(fileName)
+    labels = dict([(key, data[key]) for key in runKeys])
+    labels['dimensions'] = [int(x) for x in data['dimensions']]
+    labels['spacing'] = [float(x) for x in data['spacing']]
+    labels['origin'] = [float(x) for x in data['origin']]
+    labels['dtype'] = str(data['dtype'])
+    return labels
+
+def bounds(labels):
+    '''Return ([x,y,z] lower, [x,y,z] upper) inclusive bounds of the foreground, or None'''
+    if len(labels['label']) == 0:
+        return None
+    lower = [int(labels['start'].min()), int(labels['y'].min()), int(labels['z'].min())]
+    upper = [int((labels['start'] + labels['length']).max()) - 1, int(labels['y'].max()), int(labels['z'].max())]
+    return lower, upper
+
+def presentLabels(labels):
+    '''Sorted label values that have at least one voxel'''
+    return [x.item() for x in numpy.unique(labels['label'])]
+
+def arrayLabels(array):
+    '''Sorted values of an array, from one histogram pass if it is of small non-negative integers'''
+    array = numpy.asarray(array).ravel()
+    if array.dtype.kind == 'f':
+        array = array[~numpy.isnan(array)]
+    if array.size == 0:
+        return []
+    if array.dtype.kind not in 'biu':
+        return [x.item() for x in numpy.unique(array)]
+    low, high = array.min().item(), array.max().item()
+    if low < 0 or high >= 1 << 24:
+        return [x.item() for x in numpy.unique(array)]
+    return [int(x) for x in numpy.flatnonzero(numpy.bincount(array, minlength=high + 1))]
+
+def labelVolumes(labels):
+    '''Return {label: number of voxels}'''
+    return dict([(label, int(labels['length'][labels['label'] == label].sum())) for label in presentLabels(labels)])
+
+def centroid(labels, label=None):
+    '''Physical [x,y,z] centroid of label (default every non-zero label), or None if it is absent'''
+    keep = numpy.ones(len(labels['label']), dtype=bool) if label is None else labels['label'] == label
+    lengths = labels['length'][keep].astype(numpy.float64)
+    total = lengths.sum()
+    if total == 0:
+        return None
+    # The x centre of a run is start + (length - 1) / 2
+    index = [
+        (lengths * (labels['start'][keep] + (lengths - 1) / 2.0)).sum() / total,
+        (lengths * labels['y'][keep]).sum() / total,
+        (lengths * labels['z'][keep]).sum() / total]
+    return [labels['origin'][i] + index[i] * labels['spacing'][i] for i in range(3)]
+
+def toArray(labels, lower=None, upper=None):
+    '''Decode the inclusive [x,y,z] region lower to upper (default everything) as a [z,y,x] array'''
+    if lower is None:
+        lower = [0, 0, 0]
+    if upper is None:
+        upper = [x - 1 for x in labels['dimensions']]
+    shape = [upper[i] - lower[i] + 1 for i in (2, 1, 0)]
+    array = numpy.zeros(shape, dtype=labels['dtype'])
+
+    # Clip the runs to the region
+    start = numpy.maximum(labels['start'], lower[0])
+    end = numpy.minimum(labels['start'] + labels['length'], upper[0] + 1)
+    keep = (end > start) & \
+        (labels['y'] >= lower[1]) & (labels['y'] <= upper[1]) & \
+        (labels['z'] >= lower[2]) & (labels['z'] <= upper[2])
+    start, end = start[keep], end[keep]
+    lengths = end - start
+    if len(lengths) == 0:
+        return array
+
+    # Flat index of every voxel in every run
+    base = ((labels['z'][keep] - lower[2]) * shape[1] + (labels['y'][keep] - lower[1])) * shape[2] + (start - lower[0])
+    offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    array.reshape(-1)[numpy.repeat(base, lengths) + offsets] = numpy.repeat(labels['label'][keep], lengths)
+    return array
+
+def toImage(labels, lower=None, upper=None):
+    '''Decode a region (default everything) as vtkImageData, with the region as extent'''
+    if lower is None:
+        lower = [0, 0, 0]
+    if upper is None:
+        upper = [x - 1 for x in labels['dimensions']]
+    extent = [lower[0], upper[0], lower[1], upper[1], lower[2], upper[2]]
+    return niftiIO.arrayToImage(toArray(labels, lower, upper), extent, labels['spacing'], labels['origin'])
+
+def linearIntervals(labels, mask=None):
+    '''Runs as [begin, end) intervals of a line with a gap between every row'''
+    rowLength = labels['dimensions'][0] + 1
+    rows = labels['z'].astype(numpy.int64) * labels['dimensions'][1] + labels['y']
+    begin = rows * rowLength + labels['start']
+    end = begin + labels['length']
+    if mask is not None:
+        begin, end = begin[mask], end[mask]
+    return begin, end
+
+def intersectionLength(beginA, endA, beginB, endB):
+    '''Total length covered by both of two sets of disjoint intervals'''
+    positions = numpy.concatenate([beginA, endA, beginB, endB])
+    steps = numpy.concatenate([numpy.ones(len(beginA)), -numpy.ones(len(endA)),
+                               numpy.ones(len(beginB)), -numpy.ones(len(endB))])
+    # Close intervals before opening new ones at the same position
+    order = numpy.lexsort((steps, positions))
+    positions, coverage = positions[order], numpy.cumsum(steps[order])
+    widths = numpy.diff(positions)
+    return int(widths[coverage[:-1] == 2].sum())
+
+def checkGeometry(a, b):
+    '''Raise ValueError if two label images are not on the same grid'''
+    if list(a['dimensions']) != list(b['dimensions']):
+        raise ValueError('Dimensions {a} and {b} do not match'.format(a=a['dimensions'], b=b['dimensions']))
+
+def overlapMeasures(source, target):
+    '''Overlap measures of two label images summed over every non-zero label.
+
+    Keys match the LabelOverlapMeasuresImageFilter getters. As in ITK 5, the
+    false positive error is relative to the background of the target.'''
+    checkGeometry(source, target)
+    sourceTotal = int(source['length'].sum())
+    targetTotal = int(target['length'].sum())
+    targetVolumes = labelVolumes(target)
+    volume = int(numpy.prod(source['dimensions']))
+    intersection = 0
+    targetBackground = 0
+    for label in sorted(set(presentLabels(source)) | set(targetVolumes)):
+        targetBackground += volume - targetVolumes.get(label, 0)
+        if label not in targetVolumes:
+            continue
+        beginA, endA = linearIntervals(source, source['label'] == label)
+        beginB, endB = linearIntervals(target, target['label'] == label)
+        intersection += intersectionLength(beginA, endA, beginB, endB)
+    union = sourceTotal + targetTotal - intersection
+    total = float(sourceTotal + targetTotal)
+
+    def ratio(numerator, denominator):
+        return numerator / float(denominator) if denominator > 0 else 0.0
+
+    return {
+        'FalseNegativeError': ratio(targetTotal - intersection, targetTotal),
+        'FalsePositiveError': ratio(sourceTotal - intersection, targetBackground),
+        'VolumeSimilarity': ratio(2.0 * (sourceTotal - targetTotal), total),
+        'JaccardCoefficient': ratio(intersection, union),
+        'DiceCoefficient': ratio(2.0 * intersection, total),
+        'MeanOverlap': ratio(2.0 * intersection, total),
+        'UnionOverlap': ratio(intersection, union)}
+
+def neighbourPairs(labels, begin, end, rowShift, valid):
+    '''Pairs (i, j) of runs where run i shifted by rowShift rows overlaps run j'''
+    rowLength = labels['dimensions'][0] + 1
+    shift = rowShift * rowLength
+    index = numpy.flatnonzero(valid)
+    shiftedBegin, shiftedEnd = begin[index] + shift, end[index] + shift
+    # Runs are disjoint and sorted, so the overlapping runs are a contiguous range
+    first = numpy.searchsorted(end, shiftedBegin, side='right')
+    last = numpy.searchsorted(begin, shiftedEnd, side='left')
+    counts = numpy.maximum(last - first, 0)
+    i = numpy.repeat(index, counts)
+    j = numpy.repeat(first, counts) + numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    same = labels['label'][i] == labels['label'][j]
+    return i[same], j[same]
+
+def components(labels):
+    '''Return a list of dicts (label, voxels, lower, upper) of 6-connected components, largest first'''
+    n = len(labels['label'])
+    if n == 0:
+        return []
+    begin, end = linearIntervals(labels)
+    ny = labels['dimensions'][1]
+
+    # Runs touch runs in the next row (y+1, same z) and the next slice (z+1)
+    pairs = [
+        neighbourPairs(labels, begin, end, 1, labels['y'] < ny - 1),
+        neighbourPairs(labels, begin, end, ny, numpy.ones(n, dtype=bool))]
+    i = numpy.concatenate([p[0] for p in pairs])
+    j = numpy.concatenate([p[1] for p in pairs])
+
+    # Propagate the smallest run index through each component
+    parent = numpy.arange(n)
+    while True:
+        previous = parent.copy()
+        low = numpy.minimum(parent[i], parent[j])
+        numpy.minimum.at(parent, i, low)
+        numpy.minimum.at(parent, j, low)
+        parent = parent[parent]
+        if numpy.array_equal(parent, previous):
+            break
+
+    roots, component = numpy.unique(parent, return_inverse=True)
+    voxels = numpy.bincount(component, weights=labels['length'])
+    lower = numpy.full((len(roots), 3), numpy.iinfo(numpy.int64).max, dtype=numpy.int64)
+    upper = numpy.full((len(roots), 3), -1, dtype=numpy.int64)
+    for axis, low, high in [(0, labels['start'], labels['start'] + labels['length'] - 1),
+                            (1, labels['y'], labels['y']), (2, labels['z'], labels['z'])]:
+        numpy.minimum.at(lower[:, axis], component, low)
+        numpy.maximum.at(upper[:, axis], component, high)
+
+    results = []
+    for c in numpy.argsort(-voxels, kind='mergesort'):
+        results.append({
+            'label': labels['label'][roots[c]].item(),
+            'voxels': int(voxels[c]),
+            'lower': [int(x) for x in lower[c]],
+            'upper': [int(x) for x in upper[c]]})
+    return results